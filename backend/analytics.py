@@ -3,114 +3,422 @@ Analytics and Charts Module for Hackfinity
 Provides modern charts, graphs, and analytics capabilities
 """
 
-import plotly.graph_objects as go
-import plotly.express as px
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import io
 import base64
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-import json
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Any, Tuple
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool as BrokenExecutor
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import numpy as np
+from analytics_store import SummarySpec, create_analytics_store, naive_utc, DAY_NAMES, GRANULARITY_FORMATS, TIME_FIELD
+from chart_cache import ChartCache, DataVersions, chart_cache, data_versions
+
+logger = logging.getLogger(__name__)
+
+
+class _LazyModule:
+    """Module imported on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str) -> Any:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# Plotly takes about a second to import, so it loads with the first chart instead of with every worker
+go = _LazyModule("plotly.graph_objects")
+px = _LazyModule("plotly.express")
+pio = _LazyModule("plotly.io")
+
+# Chart building runs in bounded pools so pandas/Plotly work never blocks the event loop
+CHART_THREAD_WORKERS = int(os.environ.get('ANALYTICS_THREAD_WORKERS', '4'))
+CHART_PROCESS_WORKERS = int(os.environ.get('ANALYTICS_PROCESS_WORKERS', '2'))
+
+# Seconds a request waits for charts before returning what is ready
+ANALYTICS_TIME_BUDGET = float(os.environ.get('ANALYTICS_TIME_BUDGET', '10'))
+
+# Aggregates needed by the sponsor dashboard
+SPONSOR_SUMMARY = SummarySpec(
+    count_fields=['status', 'email_status', 'sponsor_type'],
+    top_fields={'country': 10, 'location': 10},
+    date_field=TIME_FIELD
+)
+
+# Fields each advanced chart reads; an empty list means only the row count is used
+ADVANCED_CHART_COLUMNS = {
+    "3d_scatter": [],
+    "treemap": [],
+    "sunburst": [],
+    "sankey": [],
+    "radar": [],
+    "waterfall": [],
+    "gauge": [],
+    "violin": ['engagement_score'],
+    "heatmap_calendar": [TIME_FIELD],
+    "funnel": [],
+    "candlestick": ['date', 'value'],
+    "parallel_coordinates": [],
+    "density_contour": ['x_value', 'y_value', 'z_value'],
+    "animated_bar": [],
+    "choropleth": ['location']
+}
+
+# Engine method building each advanced chart
+ADVANCED_CHART_METHODS = {
+    "3d_scatter": "_create_3d_scatter_plot",
+    "treemap": "_create_treemap_chart",
+    "sunburst": "_create_sunburst_chart",
+    "sankey": "_create_sankey_diagram",
+    "radar": "_create_radar_chart",
+    "waterfall": "_create_waterfall_chart",
+    "gauge": "_create_gauge_chart",
+    "violin": "_create_violin_plot",
+    "heatmap_calendar": "_create_calendar_heatmap",
+    "funnel": "_create_funnel_chart",
+    "candlestick": "_create_candlestick_chart",
+    "parallel_coordinates": "_create_parallel_coordinates",
+    "density_contour": "_create_density_contour",
+    "animated_bar": "_create_animated_bar_chart",
+    "choropleth": "_create_choropleth_map"
+}
+
+# Advanced charts whose cost grows with the number of rows; built in worker processes
+HEAVY_CHARTS = {"3d_scatter", "violin", "heatmap_calendar", "candlestick", "density_contour", "choropleth"}
+
+# Plotly templates sent once by reference instead of inside every chart
+CHART_TEMPLATES = ["plotly", "plotly_dark"]
+
+# numpy dtypes Plotly.js decodes from base64 typed arrays
+TYPED_ARRAY_DTYPES = {'float64': 'f8', 'float32': 'f4', 'int32': 'i4', 'uint32': 'u4',
+                      'int16': 'i2', 'uint16': 'u2', 'int8': 'i1', 'uint8': 'u1'}
+
+_template_json: Dict[str, Dict[str, Any]] = {}
+
+
+def chart_template(name: str) -> Optional[Dict[str, Any]]:
+    """Layout template referenced by compact chart payloads"""
+    if name not in CHART_TEMPLATES:
+        return None
+    if name not in _template_json:
+        _template_json[name] = pio.templates[name].to_plotly_json()
+    return _template_json[name]
+
+
+def _encode_values(value: Any) -> Any:
+    """Convert numpy/pandas values to JSON-native ones, numeric arrays to base64 typed arrays"""
+    if isinstance(value, dict):
+        return {key: _encode_values(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_values(item) for item in value]
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in 'iu' and value.dtype.name not in TYPED_ARRAY_DTYPES:
+            # Plotly.js has no 64-bit integer arrays
+            in_range = not value.size or (value.min() >= -2 ** 31 and value.max() < 2 ** 31)
+            value = value.astype('int32' if in_range else 'float64')
+        if value.dtype.name in TYPED_ARRAY_DTYPES and value.ndim in (1, 2):
+            encoded = {
+                "dtype": TYPED_ARRAY_DTYPES[value.dtype.name],
+                "bdata": base64.b64encode(np.ascontiguousarray(value, dtype=value.dtype.newbyteorder('<')).tobytes()).decode('ascii')
+            }
+            if value.ndim == 2:
+                encoded["shape"] = f"{value.shape[0]}, {value.shape[1]}"
+            return encoded
+        if value.dtype.kind == 'M':
+            return np.datetime_as_string(value).tolist()
+        return _encode_values(value.tolist())
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def figure_payload(fig: "go.Figure") -> Dict[str, Any]:
+    """Compact chart wire format: data-only traces, typed arrays and a shared template reference"""
+    layout = fig.layout.to_plotly_json()
+    payload: Dict[str, Any] = {"data": _encode_values([trace.to_plotly_json() for trace in fig.data])}
+
+    template = layout.pop("template", None)
+    if template is not None:
+        name = next((name for name in CHART_TEMPLATES if chart_template(name) == template), None)
+        if name:
+            payload["layout_ref"] = name
+        else:
+            layout["template"] = template
+    payload["layout"] = _encode_values(layout)
+
+    if fig.frames:
+        payload["frames"] = _encode_values([frame.to_plotly_json() for frame in fig.frames])
+    return payload
+
+
+_chart_executors: Dict[bool, Executor] = {}
+_chart_executor_lock = threading.Lock()
+
+
+def get_chart_executor(heavy: bool = False) -> Executor:
+    """Shared process pool for heavy charts, thread pool for everything else"""
+    heavy = heavy and CHART_PROCESS_WORKERS > 0
+    with _chart_executor_lock:
+        executor = _chart_executors.get(heavy)
+        if executor is None:
+            if heavy:
+                # Spawned workers do not inherit the server's threads and client connections
+                executor = ProcessPoolExecutor(max_workers=CHART_PROCESS_WORKERS,
+                                               mp_context=multiprocessing.get_context("spawn"))
+            else:
+                executor = ThreadPoolExecutor(max_workers=CHART_THREAD_WORKERS, thread_name_prefix="analytics-chart")
+            _chart_executors[heavy] = executor
+        return executor
+
+
+def reset_chart_executor(heavy: bool = False):
+    """Drop a broken pool so the next chart creates a fresh one"""
+    with _chart_executor_lock:
+        executor = _chart_executors.pop(heavy and CHART_PROCESS_WORKERS > 0, None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def _render_chart(method: str, *args) -> Dict[str, Any]:
+    """Worker process entry point: chart methods only need an engine without a database"""
+    return getattr(AnalyticsEngine(None), method)(*args)
+
+
+# Aggregates needed by the certificate dashboard
+CERTIFICATE_SUMMARY = SummarySpec(
+    count_fields=['certificate_status', 'status', 'skills', 'age_group'],
+    top_fields={'institution': 10},
+    distinct_fields=['institution'],
+    split_fields={'skills': 10},
+    date_field=TIME_FIELD
+)
+
+# All-time certificate dashboard when distinct institutions come from the ingest sketch
+CERTIFICATE_SKETCH_SUMMARY = SummarySpec(
+    count_fields=CERTIFICATE_SUMMARY.count_fields,
+    top_fields=CERTIFICATE_SUMMARY.top_fields,
+    split_fields=CERTIFICATE_SUMMARY.split_fields,
+    date_field=CERTIFICATE_SUMMARY.date_field
+)
 
 class AnalyticsEngine:
     """Advanced analytics engine for generating insights and visualizations"""
     
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: Optional[AsyncIOMotorDatabase], memory_storage: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                 cache: Optional[ChartCache] = None, versions: Optional[DataVersions] = None,
+                 time_budget: float = ANALYTICS_TIME_BUDGET, sketches=None):
         self.db = db
+        self.store = create_analytics_store(db, memory_storage)
+        # In-memory stores are per engine, so they must not share cached charts
+        self.cache = cache or (chart_cache if db is not None else ChartCache())
+        self.versions = versions or data_versions
+        self.time_budget = time_budget
+        # Optional AnalyticsSketches maintained on ingest
+        self.sketches = sketches
+    
+    async def ensure_indexes(self):
+        """Create the indexes time-windowed analytics rely on"""
+        if hasattr(self.store, "ensure_indexes"):
+            await self.store.ensure_indexes()
+    
+    @staticmethod
+    def _window(since: Optional[datetime], until: Optional[datetime], granularity: Optional[str] = None) -> Dict[str, Any]:
+        """Validated window parameters, normalized to naive UTC; raises ValueError"""
+        since, until = naive_utc(since), naive_utc(until)
+        if since is not None and until is not None and since >= until:
+            raise ValueError("since must be earlier than until")
+        window = {"since": since, "until": until}
+        if granularity is not None:
+            if granularity not in GRANULARITY_FORMATS:
+                raise ValueError(f"Granularity must be one of: {', '.join(GRANULARITY_FORMATS)}")
+            window["granularity"] = granularity
+        return window
+        
+    async def _cache_key(self, chart_type: str, data_source: str, params: Optional[Dict[str, Any]] = None):
+        """Cache key tied to the current data version of the source collection"""
+        version = await self.versions.get(self.db, data_source)
+        return self.cache.make_key(chart_type, data_source, version, params)
+    
+    def _submit(self, method: str, args: tuple, heavy: bool = False) -> Future:
+        """Run a chart method in the worker pools instead of on the event loop"""
+        if heavy:
+            try:
+                return get_chart_executor(heavy=True).submit(_render_chart, method, *args)
+            except BrokenExecutor:
+                logger.warning("Chart process pool unavailable, building in threads")
+                reset_chart_executor(heavy=True)
+        return get_chart_executor().submit(getattr(self, method), *args)
+    
+    def _cache_when_done(self, future: Future, cache_key, wrap: Callable[[Any], Any] = lambda chart: chart):
+        """Cache a chart when it finishes, even if the request stopped waiting for it"""
+        def store(done: Future):
+            if not done.cancelled() and done.exception() is None:
+                self.cache.store(cache_key, wrap(done.result()))
+        future.add_done_callback(store)
+    
+    async def _build_charts(self, builders: Dict[str, str], data_source: str, version: int, *args,
+                            params: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """Build independent charts concurrently within the time budget; returns charts and unfinished names
+        
+        Every chart is keyed by the data version the caller read once for the request.
+        """
+        charts: Dict[str, Dict[str, Any]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        
+        for name, method in builders.items():
+            cache_key = self.cache.make_key(name, data_source, version, params)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                charts[name] = cached
+                continue
+            future = self._submit(method, args)
+            self._cache_when_done(future, cache_key)
+            waiting[name] = asyncio.wrap_future(future)
+            # A chart finishing after the budget must not log an unretrieved exception
+            waiting[name].add_done_callback(lambda f: f.cancelled() or f.exception())
+        
+        if waiting:
+            await asyncio.wait(waiting.values(), timeout=self.time_budget)
+        
+        pending = []
+        for name, future in waiting.items():
+            if not future.done():
+                pending.append(name)
+                charts[name] = self._create_empty_chart("Chart is still being generated")
+            elif future.exception() is not None:
+                charts[name] = self._create_empty_chart(f"Failed to generate chart: {future.exception()}")
+            else:
+                charts[name] = future.result()
         
-    async def get_sponsor_analytics(self) -> Dict[str, Any]:
-        """Generate comprehensive sponsor analytics"""
+        return charts, pending
         
-        # Fetch sponsor data
-        sponsors = await self.db.sponsors.find({}).to_list(length=None)
+    async def get_sponsor_analytics(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                                    granularity: str = "day") -> Dict[str, Any]:
+        """Generate comprehensive sponsor analytics for sponsors created in [since, until)"""
+        try:
+            window = self._window(since, until, granularity)
+        except ValueError as e:
+            return {"error": str(e)}
+        
+        version = await self.versions.get(self.db, "sponsors")
+        cache_key = self.cache.make_key("sponsor_dashboard", "sponsors", version, window)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Aggregate sponsor data in the database
+        summary = await self.store.summarize("sponsors", SPONSOR_SUMMARY, **window)
         
-        if not sponsors:
+        if not summary["total"]:
             return {"error": "No sponsor data available"}
-            
-        df = pd.DataFrame(sponsors)
+        
+        charts, pending = await self._build_charts({
+            "status_distribution": "_create_status_pie_chart",
+            "engagement_timeline": "_create_engagement_timeline",
+            "response_rates": "_create_response_rate_chart",
+            "sponsor_types": "_create_sponsor_type_distribution",
+            "geographic_distribution": "_create_geographic_chart",
+            "engagement_heatmap": "_create_engagement_heatmap"
+        }, "sponsors", version, summary, params=window)
         
         analytics = {
-            "overview": self._get_sponsor_overview(df),
-            "charts": {
-                "status_distribution": self._create_status_pie_chart(df),
-                "engagement_timeline": self._create_engagement_timeline(df),
-                "response_rates": self._create_response_rate_chart(df),
-                "sponsor_types": self._create_sponsor_type_distribution(df),
-                "geographic_distribution": self._create_geographic_chart(df),
-                "engagement_heatmap": self._create_engagement_heatmap(df)
-            },
-            "insights": self._generate_sponsor_insights(df)
+            "overview": self._get_sponsor_overview(summary),
+            "charts": charts,
+            "insights": self._generate_sponsor_insights(summary)
         }
         
+        if pending:
+            # Partial result; the missing charts are cached once they finish
+            analytics["pending_charts"] = pending
+        else:
+            self.cache.store(cache_key, analytics)
         return analytics
     
-    async def get_certificate_analytics(self) -> Dict[str, Any]:
-        """Generate comprehensive certificate analytics"""
-        
-        participants = await self.db.participants.find({}).to_list(length=None)
-        
-        if not participants:
+    async def get_certificate_analytics(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                                        granularity: str = "day") -> Dict[str, Any]:
+        """Generate comprehensive certificate analytics for participants created in [since, until)"""
+        try:
+            window = self._window(since, until, granularity)
+        except ValueError as e:
+            return {"error": str(e)}
+        
+        version = await self.versions.get(self.db, "participants")
+        cache_key = self.cache.make_key("certificate_dashboard", "participants", version, window)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        spec, estimates = CERTIFICATE_SUMMARY, None
+        if self.sketches is not None and since is None and until is None:
+            # All-time distinct institutions are read from the sketch instead of grouping every document
+            spec = CERTIFICATE_SKETCH_SUMMARY
+            estimates = await self.sketches.estimates(self.db, "participants")
+        
+        summary = await self.store.summarize("participants", spec, **window)
+        if estimates is not None:
+            summary["distinct"]["institution"] = estimates["distinct"]["institution"]
+        
+        if not summary["total"]:
             return {"error": "No participant data available"}
-            
-        df = pd.DataFrame(participants)
+        
+        charts, pending = await self._build_charts({
+            "completion_rates": "_create_completion_chart",
+            "skill_distribution": "_create_skill_distribution",
+            "institution_analysis": "_create_institution_chart",
+            "timeline_progress": "_create_timeline_chart",
+            "performance_metrics": "_create_performance_chart",
+            "demographic_breakdown": "_create_demographic_chart"
+        }, "participants", version, summary, params=window)
         
         analytics = {
-            "overview": self._get_certificate_overview(df),
-            "charts": {
-                "completion_rates": self._create_completion_chart(df),
-                "skill_distribution": self._create_skill_distribution(df),
-                "institution_analysis": self._create_institution_chart(df),
-                "timeline_progress": self._create_timeline_chart(df),
-                "performance_metrics": self._create_performance_chart(df),
-                "demographic_breakdown": self._create_demographic_chart(df)
-            },
-            "insights": self._generate_certificate_insights(df)
+            "overview": self._get_certificate_overview(summary),
+            "charts": charts,
+            "insights": self._generate_certificate_insights(summary)
         }
         
+        if pending:
+            analytics["pending_charts"] = pending
+        else:
+            self.cache.store(cache_key, analytics)
         return analytics
     
-    async def get_advanced_charts(self, chart_type: str, data_source: str) -> Dict[str, Any]:
+    async def get_advanced_charts(self, chart_type: str, data_source: str, since: Optional[datetime] = None,
+                                  until: Optional[datetime] = None) -> Dict[str, Any]:
         """Generate advanced modern charts with multiple visualization options"""
         
-        if data_source == "sponsors":
-            sponsors = await self.db.sponsors.find({}).to_list(length=None)
-            df = pd.DataFrame(sponsors) if sponsors else pd.DataFrame()
-        elif data_source == "participants":
-            participants = await self.db.participants.find({}).to_list(length=None)
-            df = pd.DataFrame(participants) if participants else pd.DataFrame()
-        else:
+        if data_source not in ("sponsors", "participants"):
             return {"error": "Invalid data source"}
+        if chart_type not in ADVANCED_CHART_COLUMNS:
+            return {"error": f"Unknown chart type: {chart_type}"}
+        try:
+            window = self._window(since, until)
+        except ValueError as e:
+            return {"error": str(e)}
             
-        if df.empty:
-            return {"error": f"No {data_source} data available"}
+        cache_key = await self._cache_key(chart_type, data_source, window)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
             
-        chart_generators = {
-            "3d_scatter": self._create_3d_scatter_plot,
-            "treemap": self._create_treemap_chart,
-            "sunburst": self._create_sunburst_chart,
-            "sankey": self._create_sankey_diagram,
-            "radar": self._create_radar_chart,
-            "waterfall": self._create_waterfall_chart,
-            "gauge": self._create_gauge_chart,
-            "violin": self._create_violin_plot,
-            "heatmap_calendar": self._create_calendar_heatmap,
-            "funnel": self._create_funnel_chart,
-            "candlestick": self._create_candlestick_chart,
-            "parallel_coordinates": self._create_parallel_coordinates,
-            "density_contour": self._create_density_contour,
-            "animated_bar": self._create_animated_bar_chart,
-            "choropleth": self._create_choropleth_map
-        }
-        
-        if chart_type not in chart_generators:
-            return {"error": f"Unknown chart type: {chart_type}"}
+        # Load only the fields this chart reads, for documents in the window
+        df = await self.store.load_frame(data_source, ADVANCED_CHART_COLUMNS[chart_type], **window)
             
-        try:
-            chart_data = chart_generators[chart_type](df)
+        if len(df) == 0:
+            return {"error": f"No {data_source} data available"}
+            
+        def wrap(chart_data: Dict[str, Any]) -> Dict[str, Any]:
             return {
                 "chart": chart_data,
                 "metadata": {
@@ -120,37 +428,63 @@ class AnalyticsEngine:
                     "data_points": len(df)
                 }
             }
+        
+        # Charts whose cost grows with the data are built in worker processes
+        future = self._submit(ADVANCED_CHART_METHODS[chart_type], (df,), heavy=chart_type in HEAVY_CHARTS)
+        self._cache_when_done(future, cache_key, wrap)
+        waiting = asyncio.wrap_future(future)
+        waiting.add_done_callback(lambda f: f.cancelled() or f.exception())
+        
+        try:
+            chart_data = await asyncio.wait_for(asyncio.shield(waiting), timeout=self.time_budget)
+            return wrap(chart_data)
+        except BrokenExecutor:
+            # A worker process died; rebuild the pool and fall back to a thread for this chart
+            reset_chart_executor(heavy=True)
+            try:
+                result = wrap(await asyncio.wrap_future(self._submit(ADVANCED_CHART_METHODS[chart_type], (df,))))
+            except Exception as e:
+                return {"error": f"Failed to generate {chart_type}: {str(e)}"}
+            self.cache.store(cache_key, result)
+            return result
+        except asyncio.TimeoutError:
+            return {"error": f"{chart_type} is still being generated, retry shortly", "pending": True}
         except Exception as e:
             return {"error": f"Failed to generate {chart_type}: {str(e)}"}
 
-    def _get_sponsor_overview(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def _get_sponsor_overview(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Generate sponsor overview statistics"""
+        total = summary["total"]
+        status = summary["counts"]["status"]
+        email_status = summary["counts"]["email_status"]
         return {
-            "total_sponsors": len(df),
-            "active_sponsors": len(df[df.get('status', '') == 'active']),
-            "pending_responses": len(df[df.get('email_status', '') == 'pending']),
-            "successful_contacts": len(df[df.get('email_status', '') == 'sent']),
-            "conversion_rate": round(len(df[df.get('status', '') == 'confirmed']) / len(df) * 100, 2) if len(df) > 0 else 0,
-            "average_response_time": self._calculate_avg_response_time(df)
+            "total_sponsors": total,
+            "active_sponsors": status.get('active', 0),
+            "pending_responses": email_status.get('pending', 0),
+            "successful_contacts": email_status.get('sent', 0),
+            "conversion_rate": round(status.get('confirmed', 0) / total * 100, 2) if total > 0 else 0,
+            "average_response_time": self._calculate_avg_response_time(summary)
         }
     
-    def _get_certificate_overview(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def _get_certificate_overview(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Generate certificate overview statistics"""
+        total = summary["total"]
+        certificate_status = summary["counts"]["certificate_status"]
         return {
-            "total_participants": len(df),
-            "certificates_issued": len(df[df.get('certificate_status', '') == 'issued']),
-            "pending_certificates": len(df[df.get('certificate_status', '') == 'pending']),
-            "completion_rate": round(len(df[df.get('status', '') == 'completed']) / len(df) * 100, 2) if len(df) > 0 else 0,
-            "skill_categories": df['skills'].value_counts().to_dict() if 'skills' in df.columns else {},
-            "institution_diversity": df['institution'].nunique() if 'institution' in df.columns else 0
+            "total_participants": total,
+            "certificates_issued": certificate_status.get('issued', 0),
+            "pending_certificates": certificate_status.get('pending', 0),
+            "completion_rate": round(summary["counts"]["status"].get('completed', 0) / total * 100, 2) if total > 0 else 0,
+            "skill_categories": summary["counts"]["skills"],
+            "institution_diversity": summary["distinct"]["institution"]
         }
     
-    def _create_status_pie_chart(self, df: pd.DataFrame) -> str:
+    def _create_status_pie_chart(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create interactive pie chart for sponsor status distribution"""
-        if 'status' not in df.columns:
+        if not summary["present"]["status"]:
             return self._create_empty_chart("No status data available")
             
-        status_counts = df['status'].value_counts()
+        status_counts = pd.Series(summary["counts"]["status"])
         
         fig = go.Figure(data=[go.Pie(
             labels=status_counts.index,
@@ -169,19 +503,15 @@ class AnalyticsEngine:
             margin=dict(t=50, b=50, l=50, r=50)
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_engagement_timeline(self, df: pd.DataFrame) -> str:
+    def _create_engagement_timeline(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create timeline chart for engagement activities"""
-        if 'created_at' not in df.columns:
+        if not summary["timeline"]:
             return self._create_empty_chart("No timeline data available")
             
-        # Convert to datetime if needed
-        df['created_at'] = pd.to_datetime(df['created_at'])
-        
-        # Group by date
-        daily_engagement = df.groupby(df['created_at'].dt.date).size().reset_index()
-        daily_engagement.columns = ['date', 'count']
+        # Hourly or daily counts are grouped by the database
+        daily_engagement = pd.DataFrame(summary["timeline"], columns=['date', 'count'])
         
         fig = go.Figure()
         
@@ -204,14 +534,14 @@ class AnalyticsEngine:
             showlegend=False
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_response_rate_chart(self, df: pd.DataFrame) -> str:
+    def _create_response_rate_chart(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create response rate analysis chart"""
-        if 'email_status' not in df.columns:
+        if not summary["present"]["email_status"]:
             return self._create_empty_chart("No email status data available")
             
-        response_data = df['email_status'].value_counts()
+        response_data = pd.Series(summary["counts"]["email_status"])
         
         fig = go.Figure(data=[go.Bar(
             x=response_data.index,
@@ -230,14 +560,14 @@ class AnalyticsEngine:
             margin=dict(t=50, b=50, l=50, r=50)
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_sponsor_type_distribution(self, df: pd.DataFrame) -> str:
+    def _create_sponsor_type_distribution(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create sponsor type distribution chart"""
-        if 'sponsor_type' not in df.columns:
+        if not summary["present"]["sponsor_type"]:
             return self._create_empty_chart("No sponsor type data available")
             
-        type_counts = df['sponsor_type'].value_counts()
+        type_counts = pd.Series(summary["counts"]["sponsor_type"])
         
         fig = go.Figure(data=[go.Bar(
             x=type_counts.values,
@@ -257,15 +587,15 @@ class AnalyticsEngine:
             margin=dict(t=50, b=50, l=50, r=50)
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_geographic_chart(self, df: pd.DataFrame) -> str:
+    def _create_geographic_chart(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create geographic distribution chart"""
-        if 'location' not in df.columns and 'country' not in df.columns:
+        if not summary["present"]["location"] and not summary["present"]["country"]:
             return self._create_empty_chart("No location data available")
             
-        location_col = 'country' if 'country' in df.columns else 'location'
-        location_counts = df[location_col].value_counts().head(10)
+        location_col = 'country' if summary["present"]["country"] else 'location'
+        location_counts = pd.Series(dict(summary["top"][location_col]))
         
         fig = go.Figure(data=[go.Bar(
             x=location_counts.index,
@@ -285,28 +615,18 @@ class AnalyticsEngine:
             xaxis_tickangle=45
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_engagement_heatmap(self, df: pd.DataFrame) -> str:
+    def _create_engagement_heatmap(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create engagement heatmap"""
-        if 'created_at' not in df.columns:
+        if not summary["present"][TIME_FIELD]:
             return self._create_empty_chart("No engagement data available")
             
-        df['created_at'] = pd.to_datetime(df['created_at'])
-        df['hour'] = df['created_at'].dt.hour
-        df['day_of_week'] = df['created_at'].dt.day_name()
-        
-        # Create heatmap data
-        heatmap_data = df.groupby(['day_of_week', 'hour']).size().unstack(fill_value=0)
-        
-        # Reorder days
-        day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        heatmap_data = heatmap_data.reindex(day_order)
-        
+        # Day of week x hour counts, Monday first
         fig = go.Figure(data=go.Heatmap(
-            z=heatmap_data.values,
+            z=summary["heatmap"],
             x=list(range(24)),
-            y=day_order,
+            y=DAY_NAMES,
             colorscale='Blues',
             showscale=True
         ))
@@ -320,14 +640,14 @@ class AnalyticsEngine:
             margin=dict(t=50, b=50, l=50, r=50)
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_completion_chart(self, df: pd.DataFrame) -> str:
+    def _create_completion_chart(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create certificate completion chart"""
-        if 'certificate_status' not in df.columns:
+        if not summary["present"]["certificate_status"]:
             return self._create_empty_chart("No certificate status data available")
             
-        completion_data = df['certificate_status'].value_counts()
+        completion_data = pd.Series(summary["counts"]["certificate_status"])
         
         fig = go.Figure(data=[go.Pie(
             labels=completion_data.index,
@@ -343,20 +663,15 @@ class AnalyticsEngine:
             margin=dict(t=50, b=50, l=50, r=50)
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_skill_distribution(self, df: pd.DataFrame) -> str:
+    def _create_skill_distribution(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create skill distribution chart"""
-        if 'skills' not in df.columns:
+        if not summary["present"]["skills"]:
             return self._create_empty_chart("No skills data available")
             
-        # Handle comma-separated skills
-        all_skills = []
-        for skills in df['skills'].dropna():
-            if isinstance(skills, str):
-                all_skills.extend([skill.strip() for skill in skills.split(',')])
-        
-        skill_counts = pd.Series(all_skills).value_counts().head(10)
+        # Comma-separated skills are split and counted by the database
+        skill_counts = pd.Series(dict(summary["split"]["skills"]["top"]))
         
         fig = go.Figure(data=[go.Bar(
             x=skill_counts.values,
@@ -374,14 +689,14 @@ class AnalyticsEngine:
             margin=dict(t=50, b=50, l=50, r=50)
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_institution_chart(self, df: pd.DataFrame) -> str:
+    def _create_institution_chart(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create institution analysis chart"""
-        if 'institution' not in df.columns:
+        if not summary["present"]["institution"]:
             return self._create_empty_chart("No institution data available")
             
-        institution_counts = df['institution'].value_counts().head(10)
+        institution_counts = pd.Series(dict(summary["top"]["institution"]))
         
         fig = go.Figure(data=[go.Bar(
             x=institution_counts.index,
@@ -399,15 +714,14 @@ class AnalyticsEngine:
             xaxis_tickangle=45
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_timeline_chart(self, df: pd.DataFrame) -> str:
+    def _create_timeline_chart(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create timeline progress chart"""
-        if 'created_at' not in df.columns:
+        if not summary["timeline"]:
             return self._create_empty_chart("No timeline data available")
             
-        df['created_at'] = pd.to_datetime(df['created_at'])
-        daily_registrations = df.groupby(df['created_at'].dt.date).size().cumsum()
+        daily_registrations = pd.Series(dict(summary["timeline"])).cumsum()
         
         fig = go.Figure()
         
@@ -429,16 +743,17 @@ class AnalyticsEngine:
             margin=dict(t=50, b=50, l=50, r=50)
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_performance_chart(self, df: pd.DataFrame) -> str:
+    def _create_performance_chart(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create performance metrics chart"""
+        total = summary["total"]
         # Mock performance data - in real scenario, this would come from actual performance metrics
         performance_metrics = {
-            'Excellent': len(df) * 0.2,
-            'Good': len(df) * 0.4,
-            'Average': len(df) * 0.3,
-            'Needs Improvement': len(df) * 0.1
+            'Excellent': total * 0.2,
+            'Good': total * 0.4,
+            'Average': total * 0.3,
+            'Needs Improvement': total * 0.1
         }
         
         fig = go.Figure(data=[go.Bar(
@@ -456,20 +771,21 @@ class AnalyticsEngine:
             margin=dict(t=50, b=50, l=50, r=50)
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_demographic_chart(self, df: pd.DataFrame) -> str:
+    def _create_demographic_chart(self, summary: Dict[str, Any]) -> Dict[str, Any]:
         """Create demographic breakdown chart"""
-        if 'age_group' not in df.columns:
+        total = summary["total"]
+        if not summary["present"]["age_group"]:
             # Create mock age groups based on participant data
             age_groups = {
-                '18-22': len(df) * 0.4,
-                '23-26': len(df) * 0.35,
-                '27-30': len(df) * 0.15,
-                '31+': len(df) * 0.1
+                '18-22': total * 0.4,
+                '23-26': total * 0.35,
+                '27-30': total * 0.15,
+                '31+': total * 0.1
             }
         else:
-            age_groups = df['age_group'].value_counts().to_dict()
+            age_groups = summary["counts"]["age_group"]
         
         fig = go.Figure(data=[go.Pie(
             labels=list(age_groups.keys()),
@@ -485,9 +801,9 @@ class AnalyticsEngine:
             margin=dict(t=50, b=50, l=50, r=50)
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _create_empty_chart(self, message: str) -> str:
+    def _create_empty_chart(self, message: str) -> Dict[str, Any]:
         """Create empty chart with message"""
         fig = go.Figure()
         fig.add_annotation(
@@ -501,19 +817,20 @@ class AnalyticsEngine:
             height=400,
             margin=dict(t=50, b=50, l=50, r=50)
         )
-        return fig.to_json()
+        return figure_payload(fig)
     
-    def _calculate_avg_response_time(self, df: pd.DataFrame) -> float:
+    def _calculate_avg_response_time(self, summary: Dict[str, Any]) -> float:
         """Calculate average response time"""
         # Mock calculation - in real scenario, this would be calculated from actual response times
         return 2.5
     
-    def _generate_sponsor_insights(self, df: pd.DataFrame) -> List[str]:
+    def _generate_sponsor_insights(self, summary: Dict[str, Any]) -> List[str]:
         """Generate AI-powered insights for sponsors"""
         insights = []
+        total = summary["total"]
         
-        if len(df) > 0:
-            conversion_rate = len(df[df.get('status', '') == 'confirmed']) / len(df) * 100
+        if total > 0:
+            conversion_rate = summary["counts"]["status"].get('confirmed', 0) / total * 100
             
             if conversion_rate > 80:
                 insights.append("🎉 Excellent sponsor conversion rate! Your outreach strategy is highly effective.")
@@ -523,22 +840,23 @@ class AnalyticsEngine:
                 insights.append("⚠️ Low sponsor conversion rate. Review your outreach strategy and timing.")
             
             # Add more insights based on data patterns
-            if 'email_status' in df.columns:
-                pending_ratio = len(df[df['email_status'] == 'pending']) / len(df)
+            if summary["present"]["email_status"]:
+                pending_ratio = summary["counts"]["email_status"].get('pending', 0) / total
                 if pending_ratio > 0.3:
                     insights.append("📧 High number of pending emails. Follow up with personalized messages.")
             
-            insights.append(f"📊 Total sponsors contacted: {len(df)}")
+            insights.append(f"📊 Total sponsors contacted: {total}")
             insights.append(f"🎯 Recommended next action: Focus on high-potential prospects")
         
         return insights
     
-    def _generate_certificate_insights(self, df: pd.DataFrame) -> List[str]:
+    def _generate_certificate_insights(self, summary: Dict[str, Any]) -> List[str]:
         """Generate AI-powered insights for certificates"""
         insights = []
+        total = summary["total"]
         
-        if len(df) > 0:
-            completion_rate = len(df[df.get('status', '') == 'completed']) / len(df) * 100
+        if total > 0:
+            completion_rate = summary["counts"]["status"].get('completed', 0) / total * 100
             
             if completion_rate > 90:
                 insights.append("🏆 Outstanding completion rate! Participants are highly engaged.")
@@ -548,23 +866,20 @@ class AnalyticsEngine:
                 insights.append("⚠️ Low completion rate. Consider improving participant experience.")
             
             # Skill diversity insight
-            if 'skills' in df.columns:
-                unique_skills = set()
-                for skills in df['skills'].dropna():
-                    if isinstance(skills, str):
-                        unique_skills.update([skill.strip() for skill in skills.split(',')])
+            if summary["present"]["skills"]:
+                unique_skills = summary["split"]["skills"]["distinct"]
                 
-                insights.append(f"🛠️ {len(unique_skills)} unique skills represented")
+                insights.append(f"🛠️ {unique_skills} unique skills represented")
                 
-                if len(unique_skills) > 20:
+                if unique_skills > 20:
                     insights.append("🌟 Great skill diversity! Strong cross-functional participation.")
             
-            insights.append(f"🎓 Certificates to be issued: {len(df)}")
+            insights.append(f"🎓 Certificates to be issued: {total}")
             insights.append(f"🚀 Recommended: Showcase participant achievements on social media")
         
         return insights
     
-    def _create_3d_scatter_plot(self, df: pd.DataFrame) -> str:
+    def _create_3d_scatter_plot(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create 3D scatter plot with engagement metrics"""
         if len(df) < 3:
             return self._create_empty_chart("Insufficient data for 3D visualization")
@@ -600,9 +915,9 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_treemap_chart(self, df: pd.DataFrame) -> str:
+    def _create_treemap_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create treemap visualization for hierarchical data"""
         # Create sample hierarchical data
         categories = ['Technology', 'Finance', 'Healthcare', 'Education', 'Retail']
@@ -614,19 +929,14 @@ class AnalyticsEngine:
             'Retail': ['E-commerce', 'Fashion', 'Food & Beverage', 'Electronics']
         }
         
-        parents = []
-        labels = []
-        values = []
+        # Subcategories indexed by their category; each category totals its subcategories
+        children = pd.Series(subcategories).reindex(categories).explode()
+        child_values = np.random.randint(10, 50, len(children))
+        totals = pd.Series(child_values, index=children.index).groupby(level=0, sort=False).sum()
         
-        for category in categories:
-            labels.append(category)
-            parents.append("")
-            values.append(np.random.randint(50, 200))
-            
-            for subcategory in subcategories[category]:
-                labels.append(subcategory)
-                parents.append(category)
-                values.append(np.random.randint(10, 50))
+        labels = np.concatenate([totals.index.to_numpy(), children.to_numpy()])
+        parents = np.concatenate([np.full(len(totals), ""), children.index.to_numpy()])
+        values = np.concatenate([totals.to_numpy(), child_values])
         
         fig = go.Figure(go.Treemap(
             labels=labels,
@@ -643,9 +953,9 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_sunburst_chart(self, df: pd.DataFrame) -> str:
+    def _create_sunburst_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create sunburst chart for multi-level categorization"""
         # Sample data for sunburst chart
         data = {
@@ -670,9 +980,9 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_sankey_diagram(self, df: pd.DataFrame) -> str:
+    def _create_sankey_diagram(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create Sankey diagram for flow visualization"""
         # Sample flow data
         fig = go.Figure(data=[go.Sankey(
@@ -696,9 +1006,9 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_radar_chart(self, df: pd.DataFrame) -> str:
+    def _create_radar_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create radar chart for multi-dimensional analysis"""
         categories = ['Response Rate', 'Engagement', 'Conversion', 'ROI', 'Satisfaction', 'Retention']
         
@@ -730,9 +1040,9 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_waterfall_chart(self, df: pd.DataFrame) -> str:
+    def _create_waterfall_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create waterfall chart for cumulative analysis"""
         x = ['Initial Leads', 'Email Bounces', 'No Response', 'Interested', 'Meeting Set', 'Proposals', 'Signed']
         y = [1000, -50, -400, 150, -100, 80, -30]
@@ -754,9 +1064,9 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_gauge_chart(self, df: pd.DataFrame) -> str:
+    def _create_gauge_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create gauge chart for KPI visualization"""
         conversion_rate = np.random.uniform(65, 85)
         
@@ -786,9 +1096,9 @@ class AnalyticsEngine:
             height=400
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_parallel_coordinates(self, df: pd.DataFrame) -> str:
+    def _create_parallel_coordinates(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create parallel coordinates plot for multi-dimensional data"""
         # Generate sample multi-dimensional data
         n_samples = min(len(df), 50)
@@ -814,38 +1124,24 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_animated_bar_chart(self, df: pd.DataFrame) -> str:
+    def _create_animated_bar_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create animated bar chart showing progress over time"""
         # Sample time-series data
         months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun']
         categories = ['Email Sent', 'Responses', 'Meetings', 'Signed']
         
-        frames = []
-        for i, month in enumerate(months):
-            frame_data = []
-            for category in categories:
-                values = np.random.randint(10, 100, i + 1)
-                frame_data.append(go.Bar(
-                    x=months[:i+1],
-                    y=values,
-                    name=category,
-                    visible=True
-                ))
-            frames.append(go.Frame(data=frame_data, name=month))
-        
-        # Initial frame
-        initial_data = []
-        for category in categories:
-            initial_data.append(go.Bar(
-                x=[months[0]],
-                y=[np.random.randint(10, 100)],
-                name=category
-            ))
+        # One series per category; frame i reveals the first i + 1 months
+        values = np.random.randint(10, 100, (len(categories), len(months)))
+        frames = [
+            go.Frame(data=[go.Bar(x=months[:i + 1], y=values[row, :i + 1], name=category)
+                           for row, category in enumerate(categories)], name=month)
+            for i, month in enumerate(months)
+        ]
         
         fig = go.Figure(
-            data=initial_data,
+            data=frames[0].data,
             frames=frames
         )
         
@@ -879,15 +1175,15 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_choropleth_map(self, df: pd.DataFrame) -> str:
+    def _create_choropleth_map(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create choropleth map for geographic data visualization"""
         if 'location' not in df.columns:
             return self._create_empty_chart("No location data available")
         
         # Aggregate data by location
-        location_data = df.groupby('location').size().reset_index(name='count')
+        location_data = df.groupby('location', observed=True).size().reset_index(name='count')
         
         fig = go.Figure(data=go.Choropleth(
             locations=location_data['location'],
@@ -911,9 +1207,9 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_violin_plot(self, df: pd.DataFrame) -> str:
+    def _create_violin_plot(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create violin plot for distribution analysis"""
         if 'engagement_score' not in df.columns:
             return self._create_empty_chart("No engagement score data available")
@@ -932,25 +1228,20 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_calendar_heatmap(self, df: pd.DataFrame) -> str:
+    def _create_calendar_heatmap(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create calendar heatmap for time-based activity visualization"""
-        if 'created_at' not in df.columns:
+        if TIME_FIELD not in df.columns:
             return self._create_empty_chart("No activity data available")
         
-        # Extract date parts
-        df['date'] = pd.to_datetime(df['created_at']).dt.date
-        df['year'] = pd.to_datetime(df['created_at']).dt.year
-        df['month'] = pd.to_datetime(df['created_at']).dt.month
-        df['day'] = pd.to_datetime(df['created_at']).dt.day
-        
-        # Aggregate data by day
-        daily_activity = df.groupby('date').size().reset_index(name='count')
+        # Parse timestamps once and count per day
+        dates = pd.to_datetime(df[TIME_FIELD], errors='coerce').dt.normalize()
+        daily_activity = dates.value_counts().sort_index()
         
         # Create a complete date range
-        all_dates = pd.date_range(start=daily_activity['date'].min(), end=daily_activity['date'].max())
-        daily_activity = daily_activity.set_index('date').reindex(all_dates, fill_value=0).reset_index()
+        all_dates = pd.date_range(start=daily_activity.index.min(), end=daily_activity.index.max())
+        daily_activity = daily_activity.reindex(all_dates, fill_value=0).reset_index()
         daily_activity.columns = ['date', 'count']
         
         # Create calendar heatmap
@@ -968,9 +1259,9 @@ class AnalyticsEngine:
             hovertemplate="<b>Date: %{x|%Y-%m-%d}</b><br>Activity Count: %{y}<extra></extra>"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_funnel_chart(self, df: pd.DataFrame) -> str:
+    def _create_funnel_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create funnel chart for conversion analysis"""
         stages = ["Contacted", "Interested", "Proposed", "Negotiation", "Closed"]
         values = [len(df), int(len(df) * 0.8), int(len(df) * 0.6), int(len(df) * 0.4), int(len(df) * 0.2)]
@@ -991,9 +1282,9 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_candlestick_chart(self, df: pd.DataFrame) -> str:
+    def _create_candlestick_chart(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create candlestick chart for time series analysis"""
         if 'date' not in df.columns or 'value' not in df.columns:
             return self._create_empty_chart("No date or value data available")
@@ -1024,9 +1315,9 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
 
-    def _create_density_contour(self, df: pd.DataFrame) -> str:
+    def _create_density_contour(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Create density contour plot for bivariate distribution"""
         if 'x_value' not in df.columns or 'y_value' not in df.columns:
             return self._create_empty_chart("No x or y value data available")
@@ -1052,4 +1343,4 @@ class AnalyticsEngine:
             template="plotly_dark"
         )
         
-        return fig.to_json()
+        return figure_payload(fig)
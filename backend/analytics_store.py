@@ -0,0 +1,460 @@
+"""
+Analytics Data Access for Hackfinity
+Computes analytics summaries inside MongoDB aggregation pipelines, with an
+in-memory equivalent for the memory storage backend
+"""
+
+from typing import Callable, Dict, List, Optional, Any, Tuple
+from datetime import datetime, timezone
+import asyncio
+import numpy as np
+import pandas as pd
+from rollups import INSTITUTION_KEYS, lookup_field
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Low-cardinality text fields stored as pandas categoricals
+CATEGORICAL_FIELDS = {'status', 'email_status', 'certificate_status', 'sponsor_type', 'country', 'location',
+                      'institution', 'age_group'}
+
+# Timestamp fields parsed to datetime64
+DATETIME_FIELDS = {'timestamp', 'created_at', 'updated_at', 'date'}
+
+# Numeric fields downcast to the smallest float dtype
+NUMERIC_FIELDS = {'engagement_score', 'value', 'x_value', 'y_value', 'z_value'}
+
+# Timestamp that since/until windows select on, indexed in every analytics collection;
+# SponsorData and ParticipantData set it when a record is stored
+TIME_FIELD = 'timestamp'
+TIME_INDEXED_COLLECTIONS = ['sponsors', 'participants']
+
+# Fields read the way the ingest rollups and sketches read them: the first non-empty of
+# these keys, case-insensitively, on the document or its uploaded CSV row (additional_info)
+LOOKUP_FIELDS = {'institution': INSTITUTION_KEYS}
+
+# Timeline bucket label formats, shared by strftime and $dateToString
+GRANULARITY_FORMATS = {'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d'}
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timezone-aware datetimes converted to the naive UTC values stored in the collections"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def window_query(field: str, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, Any]:
+    """MongoDB filter selecting documents with since <= field < until"""
+    since, until = naive_utc(since), naive_utc(until)
+    bounds = {}
+    if since is not None:
+        bounds["$gte"] = since
+    if until is not None:
+        bounds["$lt"] = until
+    return {field: bounds} if bounds else {}
+
+
+def window_frame(df: pd.DataFrame, field: str, since: Optional[datetime] = None,
+                 until: Optional[datetime] = None) -> pd.DataFrame:
+    """Rows with since <= field < until"""
+    if since is None and until is None:
+        return df
+    if field not in df.columns:
+        return df.iloc[:0]
+    since, until = naive_utc(since), naive_utc(until)
+    timestamps = pd.to_datetime(df[field], errors='coerce', utc=True).dt.tz_localize(None)
+    mask = timestamps.notna()
+    if since is not None:
+        mask &= timestamps >= since
+    if until is not None:
+        mask &= timestamps < until
+    return df[mask.to_numpy()].reset_index(drop=True)
+
+
+def document_fields(doc: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """The given fields of a document, with LOOKUP_FIELDS resolved like the ingest rollups"""
+    row = {}
+    for field in fields:
+        if field in LOOKUP_FIELDS:
+            value = lookup_field(doc, LOOKUP_FIELDS[field])
+            if value is not None:
+                row[field] = value
+        elif field in doc:
+            row[field] = doc[field]
+    return row
+
+
+def lookup_expression(keys: List[str]) -> Dict[str, Any]:
+    """Aggregation expression computing what rollups.lookup_field returns for these keys"""
+    csv_row = {"$cond": [{"$eq": [{"$type": "$additional_info"}, "object"]}, "$additional_info", {}]}
+    candidates = []
+    for source in ("$$ROOT", csv_row):
+        for key in keys:
+            matches = {"$filter": {
+                "input": {"$objectToArray": source},
+                "as": "pair",
+                "cond": {"$and": [{"$eq": [{"$toLower": "$$pair.k"}, key]},
+                                  {"$not": [{"$in": ["$$pair.v", [None, ""]]}]}]}
+            }}
+            candidates.append({"$arrayElemAt": [{"$map": {"input": matches, "as": "pair", "in": "$$pair.v"}}, 0]})
+    value = None
+    for candidate in reversed(candidates):
+        value = {"$ifNull": [candidate, value]}
+    # Values that are not scalars become null instead of failing the whole aggregation
+    return {"$trim": {"input": {"$convert": {"input": value, "to": "string", "onError": None, "onNull": None}}}}
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert known columns to compact dtypes"""
+    for column in df.columns:
+        if column in CATEGORICAL_FIELDS:
+            df[column] = df[column].astype('category')
+        elif column in DATETIME_FIELDS:
+            df[column] = pd.to_datetime(df[column], errors='coerce', utc=True).dt.tz_localize(None)
+        elif column in NUMERIC_FIELDS:
+            df[column] = pd.to_numeric(df[column], errors='coerce', downcast='float')
+    return df
+
+
+class SummarySpec:
+    """Describes which aggregates a dashboard needs from a collection"""
+
+    def __init__(self, count_fields: Optional[List[str]] = None, top_fields: Optional[Dict[str, int]] = None,
+                 distinct_fields: Optional[List[str]] = None, split_fields: Optional[Dict[str, int]] = None,
+                 date_field: Optional[str] = None):
+        # field -> full value counts
+        self.count_fields = count_fields or []
+        # field -> number of most common values
+        self.top_fields = top_fields or {}
+        # fields whose number of distinct values is needed
+        self.distinct_fields = distinct_fields or []
+        # comma-separated field -> number of most common items after splitting
+        self.split_fields = split_fields or {}
+        # timestamp field for the timeline and hour x weekday heatmap
+        self.date_field = date_field
+
+    @property
+    def fields(self) -> List[str]:
+        fields = list(self.count_fields) + list(self.top_fields) + list(self.distinct_fields) + list(self.split_fields)
+        if self.date_field:
+            fields.append(self.date_field)
+        return list(dict.fromkeys(fields))
+
+
+def empty_summary(spec: SummarySpec) -> Dict[str, Any]:
+    """Summary shape shared by every backend"""
+    return {
+        "total": 0,
+        "present": {field: 0 for field in spec.fields},
+        "counts": {field: {} for field in spec.count_fields},
+        "top": {field: [] for field in spec.top_fields},
+        "distinct": {field: 0 for field in spec.distinct_fields},
+        "split": {field: {"top": [], "distinct": 0} for field in spec.split_fields},
+        "timeline": [],
+        "heatmap": [[0] * 24 for _ in DAY_NAMES],
+    }
+
+
+class MongoAnalyticsStore:
+    """Runs analytics as $group/$facet pipelines so only small results leave MongoDB"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def ensure_indexes(self):
+        """Range index on the window timestamp so time-windowed queries skip historical documents"""
+        for collection in TIME_INDEXED_COLLECTIONS:
+            await getattr(self.db, collection).create_index([(TIME_FIELD, 1)])
+
+    def build_summary_pipeline(self, spec: SummarySpec, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                               granularity: str = "day") -> List[Dict[str, Any]]:
+        """Single $facet pipeline computing every aggregate in the spec over the documents in the window"""
+        facets: Dict[str, List[Dict[str, Any]]] = {
+            "totals": [{"$group": dict(
+                {"_id": None, "total": {"$sum": 1}},
+                **{f"present_{i}": {"$sum": {"$cond": [{"$ne": [{"$ifNull": [f"${field}", None]}, None]}, 1, 0]}}
+                   for i, field in enumerate(spec.fields)}
+            )}]
+        }
+
+        for i, field in enumerate(spec.count_fields):
+            facets[f"counts_{i}"] = [
+                {"$match": {field: {"$ne": None}}},
+                {"$group": {"_id": f"${field}", "n": {"$sum": 1}}},
+                {"$sort": {"n": -1}},
+            ]
+
+        for i, (field, limit) in enumerate(spec.top_fields.items()):
+            facets[f"top_{i}"] = [
+                {"$match": {field: {"$ne": None}}},
+                {"$group": {"_id": f"${field}", "n": {"$sum": 1}}},
+                {"$sort": {"n": -1}},
+                {"$limit": limit},
+            ]
+
+        for i, field in enumerate(spec.distinct_fields):
+            facets[f"distinct_{i}"] = [
+                {"$match": {field: {"$ne": None}}},
+                {"$group": {"_id": f"${field}"}},
+                {"$count": "n"},
+            ]
+
+        for i, (field, limit) in enumerate(spec.split_fields.items()):
+            exploded = [
+                {"$match": {field: {"$type": "string"}}},
+                {"$project": {"item": {"$split": [f"${field}", ","]}}},
+                {"$unwind": "$item"},
+                {"$group": {"_id": {"$trim": {"input": "$item"}}, "n": {"$sum": 1}}},
+            ]
+            facets[f"split_top_{i}"] = exploded + [{"$sort": {"n": -1}}, {"$limit": limit}]
+            facets[f"split_distinct_{i}"] = exploded + [{"$count": "n"}]
+
+        if spec.date_field:
+            dated = [
+                {"$match": {spec.date_field: {"$ne": None}}},
+                {"$project": {"ts": {"$toDate": f"${spec.date_field}"}}},
+            ]
+            facets["timeline"] = dated + [
+                {"$group": {"_id": {"$dateToString": {"format": GRANULARITY_FORMATS[granularity], "date": "$ts"}},
+                            "n": {"$sum": 1}}},
+                {"$sort": {"_id": 1}},
+            ]
+            facets["heatmap"] = dated + [
+                {"$group": {"_id": {"dow": {"$isoDayOfWeek": "$ts"}, "hour": {"$hour": "$ts"}}, "n": {"$sum": 1}}},
+            ]
+
+        # The window match runs first so it can use the TIME_FIELD index
+        window = window_query(TIME_FIELD, since, until)
+        lookups = {field: lookup_expression(LOOKUP_FIELDS[field]) for field in spec.fields if field in LOOKUP_FIELDS}
+        return (([{"$match": window}] if window else []) + ([{"$addFields": lookups}] if lookups else [])
+                + [{"$facet": facets}])
+
+    async def load_frame(self, collection: str, fields: List[str], since: Optional[datetime] = None,
+                         until: Optional[datetime] = None) -> pd.DataFrame:
+        """Load only the given fields of every document in the window into a compact DataFrame"""
+        query = window_query(TIME_FIELD, since, until)
+        if not fields:
+            # Nothing but the row count is needed
+            count = await getattr(self.db, collection).count_documents(query)
+            return pd.DataFrame(index=pd.RangeIndex(count))
+
+        projection = dict({"_id": 0}, **{field: 1 for field in fields})
+        for field in fields:
+            if field in LOOKUP_FIELDS:
+                projection.update({key: 1 for key in LOOKUP_FIELDS[field]}, additional_info=1)
+        documents = await getattr(self.db, collection).find(query, projection).to_list(length=None)
+
+        def build() -> pd.DataFrame:
+            return compact_frame(pd.DataFrame([document_fields(doc, fields) for doc in documents]))
+
+        return await asyncio.get_running_loop().run_in_executor(None, build)
+
+    async def summarize(self, collection: str, spec: SummarySpec, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None, granularity: str = "day") -> Dict[str, Any]:
+        """Run the summary pipeline and reshape the facet output"""
+        pipeline = self.build_summary_pipeline(spec, since, until, granularity)
+        results = await getattr(self.db, collection).aggregate(pipeline).to_list(length=1)
+        facets = results[0] if results else {}
+        summary = empty_summary(spec)
+
+        totals = facets.get("totals") or [{}]
+        summary["total"] = totals[0].get("total", 0)
+        for i, field in enumerate(spec.fields):
+            summary["present"][field] = totals[0].get(f"present_{i}", 0)
+
+        for i, field in enumerate(spec.count_fields):
+            summary["counts"][field] = {row["_id"]: row["n"] for row in facets.get(f"counts_{i}", [])}
+        for i, field in enumerate(spec.top_fields):
+            summary["top"][field] = [(row["_id"], row["n"]) for row in facets.get(f"top_{i}", [])]
+        for i, field in enumerate(spec.distinct_fields):
+            rows = facets.get(f"distinct_{i}", [])
+            summary["distinct"][field] = rows[0]["n"] if rows else 0
+        for i, field in enumerate(spec.split_fields):
+            rows = facets.get(f"split_distinct_{i}", [])
+            summary["split"][field] = {
+                "top": [(row["_id"], row["n"]) for row in facets.get(f"split_top_{i}", [])],
+                "distinct": rows[0]["n"] if rows else 0,
+            }
+
+        if spec.date_field:
+            summary["timeline"] = [(row["_id"], row["n"]) for row in facets.get("timeline", [])]
+            for row in facets.get("heatmap", []):
+                summary["heatmap"][int(row["_id"]["dow"]) - 1][int(row["_id"]["hour"])] = row["n"]
+
+        return summary
+
+
+class MemoryAnalyticsStore:
+    """Same summaries computed over the in-memory storage fallback"""
+
+    def __init__(self, storage: Dict[str, List[Dict[str, Any]]]):
+        self.storage = storage
+
+    def _rows(self, collection: str, fields: List[str], since: Optional[datetime],
+              until: Optional[datetime]) -> pd.DataFrame:
+        """DataFrame of the given fields of the stored documents in the window"""
+        # The window timestamp is read for filtering even when the caller did not ask for it
+        extra = (since is not None or until is not None) and TIME_FIELD not in fields
+        columns = fields + [TIME_FIELD] if extra else fields
+        df = pd.DataFrame([document_fields(doc, columns) for doc in self.storage.get(collection, [])])
+        df = window_frame(df, TIME_FIELD, since, until)
+        return df.drop(columns=TIME_FIELD, errors='ignore') if extra else df
+
+    async def load_frame(self, collection: str, fields: List[str], since: Optional[datetime] = None,
+                         until: Optional[datetime] = None) -> pd.DataFrame:
+        """Load only the given fields of every stored document in the window into a compact DataFrame"""
+        documents = self.storage.get(collection, [])
+        if not fields and since is None and until is None:
+            return pd.DataFrame(index=pd.RangeIndex(len(documents)))
+
+        def build() -> pd.DataFrame:
+            return compact_frame(self._rows(collection, fields, since, until))
+
+        return await asyncio.get_running_loop().run_in_executor(None, build)
+
+    async def summarize(self, collection: str, spec: SummarySpec, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None, granularity: str = "day") -> Dict[str, Any]:
+        documents = self.storage.get(collection, [])
+        summary = empty_summary(spec)
+        summary["total"] = len(documents)
+        if not documents:
+            return summary
+
+        def compute() -> Dict[str, Any]:
+            frame = PreparedFrame(self._rows(collection, spec.fields, since, until))
+            return summarize_frame(frame, spec, summary, granularity)
+
+        # pandas work runs in the default executor, off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, compute)
+
+
+class PreparedFrame:
+    """Derived columns computed once per request and shared by every aggregate
+
+    Every full pass over a column is counted in `passes`, so callers and
+    benchmarks can check that each column is scanned at most once per purpose.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.passes = 0
+        self._derived: Dict[Tuple[str, str], Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def has(self, field: str) -> bool:
+        return field in self.df.columns
+
+    def _once(self, kind: str, field: str, compute: Callable[[], Any], scan: bool = True) -> Any:
+        """Compute a derived value once; scan marks a full pass over the column"""
+        key = (kind, field)
+        if key not in self._derived:
+            if scan and self.has(field):
+                self.passes += 1
+            self._derived[key] = compute()
+        return self._derived[key]
+
+    def codes(self, field: str) -> Tuple[np.ndarray, pd.Index, np.ndarray]:
+        """Integer codes (-1 for missing), distinct values and their counts, in one pass"""
+        def compute():
+            if not self.has(field):
+                return np.full(len(self.df), -1, dtype=np.intp), pd.Index([], dtype=object), np.zeros(0, dtype=np.intp)
+            codes, uniques = pd.factorize(self.df[field], use_na_sentinel=True)
+            return codes, uniques, np.bincount(codes[codes >= 0], minlength=len(uniques))
+        return self._once("codes", field, compute)
+
+    def value_counts(self, field: str) -> pd.Series:
+        """Counts of each distinct value, most common first"""
+        def compute():
+            _, uniques, counts = self.codes(field)
+            return pd.Series(counts, index=uniques).sort_values(ascending=False, kind="stable")
+        # Derived from the per-value counts, not from the column
+        return self._once("value_counts", field, compute, scan=False)
+
+    def present(self, field: str) -> int:
+        """Number of rows with a value for the field"""
+        if field in DATETIME_FIELDS or ("timestamps", field) in self._derived:
+            return int(self.timestamps(field).notna().sum())
+        return int(self.value_counts(field).sum())
+
+    def timestamps(self, field: str) -> pd.Series:
+        """Column parsed to naive UTC datetime64"""
+        def compute():
+            if not self.has(field):
+                return pd.Series(pd.NaT, index=self.df.index, dtype="datetime64[ns]")
+            return pd.to_datetime(self.df[field], errors='coerce', utc=True).dt.tz_localize(None)
+        return self._once("timestamps", field, compute)
+
+    def hourly_counts(self, field: str) -> pd.Series:
+        """Row counts per hour bucket; daily and weekday/hour views derive from this small series"""
+        def compute():
+            return self.timestamps(field).dt.floor('h').value_counts().sort_index()
+        return self._once("hourly_counts", field, compute)
+
+    def split_counts(self, field: str) -> pd.Series:
+        """Counts of comma-separated items, in no particular order"""
+        def compute():
+            _, uniques, counts = self.codes(field)
+            is_text = np.array([isinstance(value, str) for value in uniques], dtype=bool)
+            texts = np.asarray(uniques, dtype=object)[is_text].tolist()
+            if not texts:
+                return pd.Series(dtype="int64")
+            # Split every distinct value in one pass and weight its items by how often the value occurs
+            codes, items = pd.factorize(np.array(','.join(texts).split(','), dtype=object))
+            weights = np.repeat(counts[is_text], [text.count(',') + 1 for text in texts])
+            item_counts = pd.Series(np.bincount(codes, weights=weights).astype("int64"), index=items)
+            # Strip whitespace on the distinct items only
+            return item_counts.groupby(item_counts.index.str.strip(), sort=False).sum()
+        return self._once("split_counts", field, compute, scan=False)
+
+
+def top_k(counts: pd.Series, k: int) -> pd.Series:
+    """The k largest counts, most common first, without sorting the rest; ties keep their order"""
+    if k <= 0 or counts.empty:
+        return counts.iloc[:0]
+    if k >= len(counts):
+        return counts.sort_values(ascending=False, kind="stable")
+    values = counts.to_numpy()
+    threshold = np.partition(values, len(values) - k)[len(values) - k]
+    candidates = np.flatnonzero(values >= threshold)
+    return counts.iloc[candidates[np.argsort(-values[candidates], kind="stable")][:k]]
+
+
+def summarize_frame(frame: PreparedFrame, spec: SummarySpec, summary: Optional[Dict[str, Any]] = None,
+                    granularity: str = "day") -> Dict[str, Any]:
+    """Compute a summary from a prepared frame, scanning each column once"""
+    summary = summary or empty_summary(spec)
+    summary["total"] = len(frame)
+
+    for field in spec.fields:
+        summary["present"][field] = frame.present(field)
+    for field in spec.count_fields:
+        summary["counts"][field] = {value: int(n) for value, n in frame.value_counts(field).items()}
+    for field, limit in spec.top_fields.items():
+        summary["top"][field] = [(value, int(n)) for value, n in frame.value_counts(field).head(limit).items()]
+    for field in spec.distinct_fields:
+        summary["distinct"][field] = len(frame.value_counts(field))
+
+    for field, limit in spec.split_fields.items():
+        item_counts = frame.split_counts(field)
+        summary["split"][field] = {
+            "top": [(item, int(n)) for item, n in top_k(item_counts, limit).items()],
+            "distinct": len(item_counts),
+        }
+
+    if spec.date_field and summary["present"][spec.date_field]:
+        hourly = frame.hourly_counts(spec.date_field)
+        timeline = hourly.groupby(hourly.index.strftime(GRANULARITY_FORMATS[granularity])).sum()
+        summary["timeline"] = [(bucket, int(n)) for bucket, n in timeline.items()]
+        for bucket, n in hourly.items():
+            summary["heatmap"][bucket.dayofweek][bucket.hour] += int(n)
+
+    return summary
+
+
+def create_analytics_store(db=None, memory_storage: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+    """Pick the MongoDB store when a database is configured, else the memory store"""
+    if db is not None:
+        return MongoAnalyticsStore(db)
+    return MemoryAnalyticsStore(memory_storage if memory_storage is not None else {})
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Sponsor analytics benchmark for the Hackfinity platform
+Compares full-column passes and time of the per-chart DataFrame computation
+against the shared single-pass preparation used by the memory analytics store,
+and the per-participant skill loop against the vectorized skill split
+
+Usage (from the backend directory):
+    python benchmarks/bench_analytics.py --sizes 10000 100000 --output results.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from analytics import SPONSOR_SUMMARY
+from analytics_store import PreparedFrame, summarize_frame, top_k
+
+SIZES = [10000, 100000]
+SKILLS = ["Python", "JavaScript", "React", "Go", "Rust", "SQL", "Machine Learning", "Docker", "Figma", "Java"]
+
+
+def build_sponsors(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Synthetic sponsor documents with the fields the dashboard reads"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    return [{
+        "name": f"Sponsor {i}",
+        "status": rng.choice(["active", "confirmed", "pending", "declined"]),
+        "email_status": rng.choice(["generated", "sent", "pending"]),
+        "sponsor_type": rng.choice(["gold", "silver", "bronze", "community"]),
+        "country": rng.choice(["India", "United States", "Germany", "Brazil", "Japan", "Kenya"]),
+        "timestamp": start + timedelta(minutes=rng.randint(0, 60 * 24 * 180)),
+        "email_content": "x" * 500,
+    } for i in range(count)]
+
+
+def build_participants(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Synthetic participant documents with comma-separated skills"""
+    rng = random.Random(seed)
+    return [{"name": f"Participant {i}", "skills": ", ".join(rng.sample(SKILLS, rng.randint(1, 4)))}
+            for i in range(count)]
+
+
+class PassCounter:
+    """Counts full-column passes made by the per-chart computation"""
+
+    def __init__(self):
+        self.passes = 0
+
+    def scan(self, compute: Callable[[], Any]) -> Any:
+        self.passes += 1
+        return compute()
+
+
+def per_chart_dashboard(documents: List[Dict[str, Any]]) -> int:
+    """The dashboard as computed chart by chart over one DataFrame; returns the pass count"""
+    counter = PassCounter()
+    df = pd.DataFrame(documents)
+    total = len(df)
+
+    # Overview
+    counter.scan(lambda: len(df[df['status'] == 'active']))
+    counter.scan(lambda: len(df[df['email_status'] == 'pending']))
+    counter.scan(lambda: len(df[df['email_status'] == 'sent']))
+    counter.scan(lambda: len(df[df['status'] == 'confirmed']) / total)
+
+    # Status, response rate, sponsor type and geographic charts
+    counter.scan(lambda: df['status'].value_counts())
+    counter.scan(lambda: df['email_status'].value_counts())
+    counter.scan(lambda: df['sponsor_type'].value_counts())
+    counter.scan(lambda: df['country'].value_counts().head(10))
+
+    # Engagement timeline
+    created = counter.scan(lambda: pd.to_datetime(df['timestamp']))
+    dates = counter.scan(lambda: created.dt.date)
+    counter.scan(lambda: df.groupby(dates).size())
+
+    # Engagement heatmap
+    created = counter.scan(lambda: pd.to_datetime(df['timestamp']))
+    hours = counter.scan(lambda: created.dt.hour)
+    days = counter.scan(lambda: created.dt.day_name())
+    counter.scan(lambda: df.groupby([days, hours]).size().unstack(fill_value=0))
+
+    # Insights
+    counter.scan(lambda: len(df[df['status'] == 'confirmed']) / total)
+    counter.scan(lambda: len(df[df['email_status'] == 'pending']) / total)
+
+    return counter.passes
+
+
+def prepared_dashboard(documents: List[Dict[str, Any]]) -> int:
+    """The dashboard summary from one shared PreparedFrame; returns the pass count"""
+    fields = SPONSOR_SUMMARY.fields
+    frame = PreparedFrame(pd.DataFrame([{field: doc[field] for field in fields if field in doc} for doc in documents]))
+    summarize_frame(frame, SPONSOR_SUMMARY)
+    return frame.passes
+
+
+def skill_loop(documents: List[Dict[str, Any]]) -> int:
+    """Top skills by splitting every participant's skills in Python; returns the distinct skill count"""
+    df = pd.DataFrame(documents)
+    all_skills = []
+    for skills in df['skills'].dropna():
+        all_skills.extend([skill.strip() for skill in skills.split(',')])
+    counts = pd.Series(all_skills).value_counts()
+    counts.head(10)
+    return len(counts)
+
+
+def skill_vectorized(documents: List[Dict[str, Any]]) -> int:
+    """Top skills from the prepared frame's vectorized split; returns the distinct skill count"""
+    counts = PreparedFrame(pd.DataFrame(documents)).split_counts('skills')
+    top_k(counts, 10)
+    return len(counts)
+
+
+def run_case(name: str, compute: Callable[[List[Dict[str, Any]]], int], documents: List[Dict[str, Any]],
+             repeats: int) -> Dict[str, Any]:
+    timings = []
+    passes = 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        passes = compute(documents)
+        timings.append(time.perf_counter() - started)
+    return {
+        "variant": name,
+        "documents": len(documents),
+        "result": passes,
+        "best_ms": round(min(timings) * 1000, 2),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sponsor analytics computation")
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    cases = (
+        ("passes", build_sponsors, (("per_chart", per_chart_dashboard), ("prepared", prepared_dashboard))),
+        ("skills", build_participants, (("loop", skill_loop), ("vectorized", skill_vectorized))),
+    )
+    for label, build, variants in cases:
+        print(f"\n{'variant':<10} {'docs':>8} {label:>7} {'best ms':>9} {'mean ms':>9}")
+        for size in args.sizes:
+            documents = build(size)
+            for name, compute in variants:
+                result = run_case(name, compute, documents, args.repeats)
+                results.append(result)
+                print(f"{result['variant']:<10} {result['documents']:>8} {result['result']:>7} "
+                      f"{result['best_ms']:>9} {result['mean_ms']:>9}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"results": results}, indent=2))
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Certificate rendering benchmark for the Hackfinity platform
+Measures throughput, latency percentiles and peak RSS of certificate generation
+
+Usage (from the backend directory):
+    python benchmarks/bench_certificates.py --output results.json
+    python benchmarks/bench_certificates.py --compare results-previous.json
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+TARGETS = ["server_pdf", "customizer_pdf", "customizer_png", "customizer_jpg"]
+COMPLEXITIES = ["simple", "standard", "rich"]
+BATCH_SIZES = [1, 10, 100]
+
+FONTS = ["Helvetica", "Helvetica-Bold", "Times-Roman", "Courier"]
+
+
+def _sample_logo(size: int) -> str:
+    """Build a small PNG logo as a data URI"""
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGBA", (size, size), (99, 102, 241, 255))
+    ImageDraw.Draw(img).ellipse([size // 4, size // 4, size * 3 // 4, size * 3 // 4], fill=(16, 185, 129, 255))
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def build_template(complexity: str):
+    """Certificate template with a given number of elements, fonts and images"""
+    from certificate_customizer import CertificateTemplate, CertificateElement
+
+    elements = [
+        CertificateElement(type="text", content="Certificate of Achievement", x=0.3, y=0.1, font_size=36, font_family="Helvetica-Bold"),
+        CertificateElement(type="text", content="This is to certify that {{participant_name}}", x=0.2, y=0.4, font_size=24),
+        CertificateElement(type="text", content="has completed {{event_name}} on {{date}}", x=0.2, y=0.5, font_size=16),
+    ]
+    watermark = None
+
+    if complexity in ("standard", "rich"):
+        for i in range(4):
+            elements.append(CertificateElement(type="shape", content="rectangle" if i % 2 else "circle",
+                                               x=40 + i * 120, y=600, width=80, height=40, background_color="#10b981"))
+        for i in range(3):
+            elements.append(CertificateElement(type="text", content=f"Static line {i + 1} of the certificate body",
+                                               x=0.1, y=0.6 + i * 0.05, font_size=12, font_family=FONTS[i % len(FONTS)]))
+
+    if complexity == "rich":
+        logo = _sample_logo(256)
+        elements.append(CertificateElement(type="logo", content=logo, x=40, y=40, width=120, height=120))
+        elements.append(CertificateElement(type="image", content=_sample_logo(512), x=900, y=40, width=150, height=150))
+        for i in range(16):
+            elements.append(CertificateElement(type="text", content=f"Sponsor {i + 1}", x=40 + (i % 8) * 130, y=700 + (i // 8) * 30,
+                                               font_size=10 + i % 4, font_family=FONTS[i % len(FONTS)]))
+        elements.append(CertificateElement(type="text", content="Signed by {{organization}}", x=0.6, y=0.85, font_size=14,
+                                           font_family="Times-Roman"))
+        watermark = "HACKFINITY"
+
+    return CertificateTemplate(
+        name=f"Benchmark {complexity}",
+        elements=elements,
+        variables=["participant_name", "event_name", "date", "organization"],
+        watermark=watermark,
+    )
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(int(round(percent / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(target: str, complexity: str, batch_size: int) -> Dict[str, Any]:
+    """Render one batch of certificates and collect timings"""
+    loop = asyncio.new_event_loop()
+    latencies: List[float] = []
+    output_bytes = 0
+
+    if target == "server_pdf":
+        import server
+
+        async def render(i: int):
+            return await server.generate_certificate(f"Participant {i}", as_base64=False)
+    else:
+        from certificate_customizer import CertificateCustomizer
+
+        customizer = CertificateCustomizer(None)
+        template = build_template(complexity)
+        fmt = target.split("_")[1]
+
+        async def render(i: int):
+            data = {"participant_name": f"Participant {i}", "event_name": "Hackfinity 2025",
+                    "date": "July 3, 2025", "organization": "Hackfinity Organization"}
+            if fmt == "pdf":
+                return await customizer._generate_pdf_certificate(template, data)
+            return await customizer._generate_image_certificate(template, data, "PNG" if fmt == "png" else "JPEG")
+
+    started = time.perf_counter()
+    for i in range(batch_size):
+        t0 = time.perf_counter()
+        output = loop.run_until_complete(render(i))
+        latencies.append(time.perf_counter() - t0)
+        output_bytes += len(output)
+    elapsed = time.perf_counter() - started
+    loop.close()
+
+    return {
+        "target": target,
+        "complexity": complexity,
+        "batch_size": batch_size,
+        "certs_per_sec": round(batch_size / elapsed, 2),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "first_ms": round(latencies[0] * 1000, 3),
+        "avg_output_kb": round(output_bytes / batch_size / 1024, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _run_isolated(args) -> Dict[str, Any]:
+    """Worker entry point: one case per fresh process so peak RSS is per case"""
+    return run_case(*args)
+
+
+def _environment() -> Dict[str, Any]:
+    """Metadata used to line up results across releases"""
+    versions = {}
+    for module in ("PIL", "reportlab", "pydantic"):
+        try:
+            versions[module] = __import__(module).__version__
+        except (ImportError, AttributeError):
+            versions[module] = None
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": versions,
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str):
+    """Print throughput and p99 changes against a previous results file"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    previous = {(r["target"], r["complexity"], r["batch_size"]): r for r in baseline["results"]}
+
+    print(f"\nComparison with {baseline_path} ({baseline['environment'].get('git_commit')})")
+    for result in results:
+        old = previous.get((result["target"], result["complexity"], result["batch_size"]))
+        if not old:
+            continue
+        throughput = (result["certs_per_sec"] / old["certs_per_sec"] - 1) * 100 if old["certs_per_sec"] else 0
+        p99 = (result["p99_ms"] / old["p99_ms"] - 1) * 100 if old["p99_ms"] else 0
+        print(f"{result['target']:<16} {result['complexity']:<9} {result['batch_size']:>5}  "
+              f"certs/sec {throughput:+7.1f}%  p99 {p99:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark certificate rendering")
+    parser.add_argument("--targets", nargs="+", default=TARGETS, choices=TARGETS)
+    parser.add_argument("--complexities", nargs="+", default=COMPLEXITIES, choices=COMPLEXITIES)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=BATCH_SIZES)
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="Previous results JSON file to compare against")
+    args = parser.parse_args()
+
+    cases = []
+    for target in args.targets:
+        # server.generate_certificate has a fixed layout, so complexity does not apply
+        complexities = ["fixed"] if target == "server_pdf" else args.complexities
+        for complexity in complexities:
+            for batch_size in args.batch_sizes:
+                cases.append((target, complexity, batch_size))
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    print(f"{'target':<16} {'complexity':<9} {'batch':>5} {'certs/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'rss MB':>7}")
+    for case in cases:
+        with context.Pool(1) as pool:
+            result = pool.apply(_run_isolated, (case,))
+        results.append(result)
+        print(f"{result['target']:<16} {result['complexity']:<9} {result['batch_size']:>5} {result['certs_per_sec']:>9} "
+              f"{result['p50_ms']:>8} {result['p99_ms']:>8} {result['peak_rss_mb']:>7}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"environment": _environment(), "results": results}, indent=2))
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
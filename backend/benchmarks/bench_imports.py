@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for the Hackfinity backend
+Imports each module in a fresh interpreter with `-X importtime` and reports the
+cumulative import time, peak RSS and whether heavy charting libraries were loaded
+
+Usage (from the backend directory):
+    python benchmarks/bench_imports.py --modules analytics server --max-ms 1500 --output results.json
+Exits with status 1 when a module exceeds --max-ms or loads a forbidden library.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+MODULES = ["analytics"]
+
+# Libraries that must only load when the first chart is built
+DEFERRED_LIBRARIES = ["plotly", "matplotlib", "seaborn"]
+
+PROBE = """
+import resource, sys, json
+import {module}
+print(json.dumps({{
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": sorted({{name.split('.')[0] for name in sys.modules}})
+}}))
+"""
+
+
+def measure(module: str) -> Dict[str, Any]:
+    """Import a module in a fresh interpreter and parse its -X importtime output"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    cumulative_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if line.startswith("import time:") and len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1])
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        "module": module,
+        "import_ms": round(cumulative_us / 1000, 1),
+        "max_rss_mb": round(probe["max_rss_mb"], 1),
+        "deferred_loaded": [name for name in DEFERRED_LIBRARIES if name in probe["loaded"]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend module import time")
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-ms", type=float, help="Fail when the best import time of a module exceeds this")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    failed = False
+    print(f"{'module':<12} {'best ms':>9} {'rss MB':>8}  deferred libraries loaded")
+    for module in args.modules:
+        runs = [measure(module) for _ in range(args.repeats)]
+        result = min(runs, key=lambda run: run["import_ms"])
+        results.append(result)
+        print(f"{module:<12} {result['import_ms']:>9} {result['max_rss_mb']:>8}  "
+              f"{', '.join(result['deferred_loaded']) or '-'}")
+        if result["deferred_loaded"] or (args.max_ms is not None and result["import_ms"] > args.max_ms):
+            failed = True
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"results": results}, indent=2))
+        print(f"\nResults written to {args.output}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Certificate Asset Cache for Hackfinity
+Process-wide cache of fonts, decoded images, static layers and previews used by certificate rendering
+"""
+
+from typing import Dict, List, Optional, Any, Tuple
+from collections import OrderedDict
+from pathlib import Path
+import base64
+import binascii
+import hashlib
+import io
+import os
+import threading
+from PIL import Image, ImageFont
+
+# Directories scanned once for TrueType/OpenType fonts
+FONT_DIRECTORIES = [
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    "~/.fonts",
+    "~/.local/share/fonts",
+    "/Library/Fonts",
+    "/System/Library/Fonts",
+    "~/Library/Fonts",
+    "C:/Windows/Fonts",
+]
+
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc")
+
+# Directories template images may be read from; any other path in template content is ignored
+IMAGE_DIRECTORIES = [
+    str(Path(__file__).resolve().parent / "assets"),
+]
+
+# Certificate/ReportLab font names mapped to common system font families
+FONT_ALIASES = {
+    "helvetica": ["arial", "helvetica", "liberationsans", "dejavusans"],
+    "arial": ["arial", "liberationsans", "helvetica", "dejavusans"],
+    "times": ["timesnewroman", "times", "liberationserif", "dejavuserif"],
+    "times-roman": ["timesnewroman", "times", "liberationserif", "dejavuserif"],
+    "courier": ["couriernew", "courier", "liberationmono", "dejavusansmono"],
+    "georgia": ["georgia", "liberationserif", "dejavuserif"],
+}
+
+DEFAULT_FONT_FAMILIES = ["arial", "helvetica", "liberationsans", "dejavusans"]
+
+WEIGHT_SUFFIXES = {
+    "bold": ["bold", "bd", "b"],
+    "light": ["light", "l"],
+    "normal": ["regular", "", "r", "book", "roman"],
+}
+
+
+def _normalize_font_name(name: str) -> str:
+    """Lower-case a font name and strip separators"""
+    return "".join(ch for ch in name.lower() if ch.isalnum())
+
+
+class CertificateAssetCache:
+    """LRU cache for fonts, decoded images and static layers shared by all certificate renders"""
+
+    def __init__(self, max_fonts: int = 256, max_images: int = 128, max_layers: int = 32, max_previews: int = 64, max_preview_layers: int = 8, font_directories: Optional[List[str]] = None,
+                 image_directories: Optional[List[str]] = None):
+        self.max_fonts = max_fonts
+        self.max_images = max_images
+        self.max_layers = max_layers
+        self.max_previews = max_previews
+        self.max_preview_layers = max_preview_layers
+        self.font_directories = font_directories or self._configured_font_directories()
+        self.image_directories = image_directories or self._configured_image_directories()
+
+        self._fonts: "OrderedDict[Tuple[str, int, str], Any]" = OrderedDict()
+        self._images: "OrderedDict[Tuple[str, Optional[Tuple[int, int]]], Image.Image]" = OrderedDict()
+        self._layers: "OrderedDict[str, Any]" = OrderedDict()
+        self._previews: "OrderedDict[str, bytes]" = OrderedDict()
+        # Reduced-scale static layers, kept apart so previews cannot evict full-size layers
+        self._preview_layers: "OrderedDict[str, Any]" = OrderedDict()
+        self._font_index: Optional[Dict[str, str]] = None
+        self._lock = threading.RLock()
+
+        self.stats = {"font_hits": 0, "font_misses": 0, "image_hits": 0, "image_misses": 0, "layer_hits": 0, "layer_misses": 0,
+                      "preview_hits": 0, "preview_misses": 0, "preview_layer_hits": 0, "preview_layer_misses": 0}
+
+    def _configured_font_directories(self) -> List[str]:
+        """Font directories, with CERTIFICATE_FONT_PATH entries taking priority"""
+        extra = os.environ.get("CERTIFICATE_FONT_PATH", "")
+        return [p for p in extra.split(os.pathsep) if p] + FONT_DIRECTORIES
+
+    def _configured_image_directories(self) -> List[str]:
+        """Image directories, CERTIFICATE_ASSET_PATH entries followed by the bundled assets"""
+        extra = os.environ.get("CERTIFICATE_ASSET_PATH", "")
+        return [p for p in extra.split(os.pathsep) if p] + IMAGE_DIRECTORIES
+
+    def build_font_index(self) -> Dict[str, str]:
+        """Scan the font directories once and index font files by normalized name"""
+        with self._lock:
+            if self._font_index is not None:
+                return self._font_index
+
+            index: Dict[str, str] = {}
+            for directory in self.font_directories:
+                root = Path(directory).expanduser()
+                if not root.is_dir():
+                    continue
+                for path in root.rglob("*"):
+                    if path.suffix.lower() in FONT_EXTENSIONS:
+                        # First match wins so CERTIFICATE_FONT_PATH overrides system fonts
+                        index.setdefault(_normalize_font_name(path.stem), str(path))
+
+            self._font_index = index
+            return index
+
+    def available_font_families(self) -> List[str]:
+        """List the indexed font file names"""
+        return sorted(self.build_font_index().keys())
+
+    def _resolve_font_path(self, family: str, weight: str) -> Optional[str]:
+        """Find the best font file for a family and weight"""
+        index = self.build_font_index()
+
+        # ReportLab names carry the weight in the family, e.g. "Helvetica-Bold"
+        base, _, style = family.partition("-")
+        if style and _normalize_font_name(style) in ("bold", "bolditalic", "boldoblique"):
+            weight = "bold"
+
+        candidates = FONT_ALIASES.get(base.lower(), [_normalize_font_name(base)]) + DEFAULT_FONT_FAMILIES
+        suffixes = WEIGHT_SUFFIXES.get(weight, WEIGHT_SUFFIXES["normal"])
+
+        for candidate in candidates:
+            for suffix in suffixes:
+                path = index.get(candidate + suffix)
+                if path:
+                    return path
+        return None
+
+    def get_font(self, family: Optional[str], size: int, weight: str = "normal") -> Any:
+        """Get a loaded font keyed by (family, size, weight)"""
+        key = ((family or "Helvetica").lower(), int(size), (weight or "normal").lower())
+
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.stats["font_hits"] += 1
+                return font
+            self.stats["font_misses"] += 1
+
+        path = self._resolve_font_path(key[0], key[2])
+        font = None
+        if path:
+            try:
+                font = ImageFont.truetype(path, key[1])
+            except OSError:
+                font = None
+        if font is None:
+            try:
+                font = ImageFont.load_default(size=key[1])
+            except TypeError:
+                # Pillow < 10.1 has no sized default font
+                font = ImageFont.load_default()
+
+        with self._lock:
+            self._fonts[key] = font
+            while len(self._fonts) > self.max_fonts:
+                self._fonts.popitem(last=False)
+        return font
+
+    def _read_image_source(self, source: Any) -> Optional[bytes]:
+        """Read raw image bytes from bytes, a data URI, base64 text or a file in the image directories"""
+        if isinstance(source, (bytes, bytearray)):
+            return bytes(source)
+        if not isinstance(source, str) or not source:
+            return None
+        try:
+            if source.startswith("data:"):
+                _, _, payload = source.partition(",")
+                return base64.b64decode(payload, validate=True)
+            return base64.b64decode(source, validate=True)
+        except (binascii.Error, ValueError):
+            pass
+        return self._read_asset_file(source)
+
+    def _read_asset_file(self, name: str) -> Optional[bytes]:
+        """Read a file only if it resolves inside one of the image directories"""
+        try:
+            for directory in self.image_directories:
+                root = Path(directory).expanduser().resolve()
+                path = (root / name).resolve()
+                # Absolute names and ../ segments must still land inside the directory
+                if path.is_relative_to(root) and path.is_file():
+                    return path.read_bytes()
+        except (OSError, ValueError):
+            # Names too long for the filesystem or containing NUL bytes
+            return None
+        return None
+
+    def get_image(self, source: Any, size: Optional[Tuple[int, int]] = None) -> Optional[Image.Image]:
+        """Get a decoded RGBA image keyed by content hash, optionally pre-scaled to size"""
+        raw = self._read_image_source(source)
+        if raw is None:
+            return None
+
+        digest = hashlib.sha256(raw).hexdigest()
+        key = (digest, tuple(int(v) for v in size) if size else None)
+
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.stats["image_hits"] += 1
+                return image
+            self.stats["image_misses"] += 1
+            original = self._images.get((digest, None))
+
+        if original is None:
+            try:
+                original = Image.open(io.BytesIO(raw))
+                original.load()
+            except (OSError, ValueError):
+                return None
+            original = original.convert("RGBA")
+
+        image = original.resize(key[1], Image.LANCZOS) if key[1] else original
+
+        with self._lock:
+            self._images[(digest, None)] = original
+            self._images[key] = image
+            while len(self._images) > self.max_images:
+                self._images.popitem(last=False)
+        return image
+
+    def get_layer(self, key: str, preview: bool = False) -> Optional[Any]:
+        """Get a cached static certificate layer (raster image or compiled PDF layout)"""
+        layers, stat = (self._preview_layers, "preview_layer") if preview else (self._layers, "layer")
+        with self._lock:
+            layer = layers.get(key)
+            if layer is None:
+                self.stats[f"{stat}_misses"] += 1
+                return None
+            layers.move_to_end(key)
+            self.stats[f"{stat}_hits"] += 1
+            return layer
+
+    def store_layer(self, key: str, layer: Any, preview: bool = False):
+        """Cache a static certificate layer; raster layers must be copied before drawing"""
+        layers, limit = (self._preview_layers, self.max_preview_layers) if preview else (self._layers, self.max_layers)
+        with self._lock:
+            layers[key] = layer
+            while len(layers) > limit:
+                layers.popitem(last=False)
+
+    def get_preview(self, etag: str) -> Optional[bytes]:
+        """Get encoded preview image bytes by ETag"""
+        with self._lock:
+            preview = self._previews.get(etag)
+            if preview is None:
+                self.stats["preview_misses"] += 1
+                return None
+            self._previews.move_to_end(etag)
+            self.stats["preview_hits"] += 1
+            return preview
+
+    def store_preview(self, etag: str, preview: bytes):
+        """Cache encoded preview image bytes by ETag"""
+        with self._lock:
+            self._previews[etag] = preview
+            while len(self._previews) > self.max_previews:
+                self._previews.popitem(last=False)
+
+    def clear(self):
+        """Drop cached fonts, images, layers and previews (the font index is kept)"""
+        with self._lock:
+            self._fonts.clear()
+            self._images.clear()
+            self._layers.clear()
+            self._previews.clear()
+            self._preview_layers.clear()
+
+
+# Shared by every CertificateCustomizer in the process
+asset_cache = CertificateAssetCache()
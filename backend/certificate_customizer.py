@@ -5,19 +5,29 @@ Supports dynamic layouts, styling, and certificate generation
 
 from typing import Dict, List, Optional, Any, Tuple
 from pydantic import BaseModel, Field
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 import uuid
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, features
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter, A4, A3
 from reportlab.lib.colors import Color, HexColor
 from reportlab.lib.units import inch
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as ReportLabImage
+from reportlab.platypus import Paragraph, Spacer, Image as ReportLabImage
+from reportlab.pdfbase import pdfmetrics
 import io
+import re
 import base64
+import hashlib
+import time
+from functools import lru_cache
+from xml.sax.saxutils import escape as escape_markup
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from certificate_assets import asset_cache
+from certificate_pdf import PdfCertificateLayout
+from metrics import certificate_metrics, SIZE_BUCKETS_BYTES
+from template_cache import PrecomputedConfig, TemplateCatalog
 
 class CertificateStyle(BaseModel):
     """Certificate styling configuration"""
@@ -114,32 +124,96 @@ class CertificateTemplate(BaseModel):
     downloads: int = 0
     rating: float = 0.0
 
+# Matches {{variable}} and {{ variable }} placeholders
+VARIABLE_PATTERN = re.compile(r"\{\{\s*([^{}]+?)\s*\}\}")
+
+MISSING_VARIABLE_POLICIES = ("keep", "blank", "error")
+
+# Encoder settings for builder previews
+PREVIEW_FORMATS = {
+    "WEBP": {"quality": 80, "method": 4},
+    "PNG": {"compress_level": 6},
+}
+
+class CompiledContent:
+    """Element content pre-split into literal and variable segments"""
+    
+    def __init__(self, content: str):
+        self.literals: List[str] = []
+        self.variables: List[str] = []
+        self.placeholders: List[str] = []
+        
+        position = 0
+        for match in VARIABLE_PATTERN.finditer(content):
+            self.literals.append(content[position:match.start()])
+            self.variables.append(match.group(1))
+            self.placeholders.append(match.group(0))
+            position = match.end()
+        self.literals.append(content[position:])
+    
+    @property
+    def has_variables(self) -> bool:
+        return bool(self.variables)
+    
+    def render(self, data: Dict[str, Any], missing: str = "keep", escape: bool = False) -> str:
+        """Substitute variables in a single pass; escape values for Paragraph markup if requested"""
+        if not self.variables:
+            return self.literals[0]
+        
+        parts = [self.literals[0]]
+        for name, placeholder, literal in zip(self.variables, self.placeholders, self.literals[1:]):
+            if name in data:
+                value = str(data[name])
+                parts.append(escape_markup(value) if escape else value)
+            elif missing == "blank":
+                pass
+            elif missing == "error":
+                raise ValueError(f"Missing value for certificate variable '{name}'")
+            else:
+                parts.append(placeholder)
+            parts.append(literal)
+        return "".join(parts)
+
+@lru_cache(maxsize=1024)
+def compile_content(content: str) -> CompiledContent:
+    """Parse element content once; repeated renders reuse the segments"""
+    return CompiledContent(content)
+
+# Active certificate templates, shared by every CertificateCustomizer in the process
+certificate_catalog = TemplateCatalog("certificate_templates", CertificateTemplate, ("category",))
+
 class CertificateCustomizer:
     """Advanced certificate customization engine"""
     
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, missing_variable_policy: str = "keep"):
+        if missing_variable_policy not in MISSING_VARIABLE_POLICIES:
+            raise ValueError(f"Unsupported missing variable policy: {missing_variable_policy}")
+        
         self.db = db
+        self.missing_variable_policy = missing_variable_policy
         self.page_sizes = {
             "A4": A4,
             "A3": A3,
             "Letter": letter,
         }
+        self.assets = asset_cache
+        self.metrics = certificate_metrics
+        self.catalog = certificate_catalog
+        # Built once; invalidate when the available fonts or presets change
+        self.builder_config = PrecomputedConfig(self.create_certificate_builder_config)
+        
+        # Font discovery runs once per process
+        self.assets.build_font_index()
     
     async def get_certificate_templates(self, category: Optional[str] = None) -> List[CertificateTemplate]:
         """Get available certificate templates"""
-        query = {"is_active": True}
-        if category:
-            query["category"] = category
-            
-        cursor = self.db.certificate_templates.find(query)
-        templates = await cursor.to_list(length=None)
-        
-        return [CertificateTemplate(**template) for template in templates]
+        return await self.catalog.find(self.db, category=category or None)
     
     async def create_template(self, template: CertificateTemplate) -> CertificateTemplate:
         """Create a new certificate template"""
         template_dict = template.dict()
         await self.db.certificate_templates.insert_one(template_dict)
+        await self.catalog.invalidate(self.db)
         return template
     
     async def update_template(self, template_id: str, updates: Dict[str, Any]) -> Optional[CertificateTemplate]:
@@ -152,6 +226,7 @@ class CertificateCustomizer:
         )
         
         if result.modified_count:
+            await self.catalog.invalidate(self.db)
             template_data = await self.db.certificate_templates.find_one({"id": template_id})
             return CertificateTemplate(**template_data)
         
@@ -174,45 +249,102 @@ class CertificateCustomizer:
         new_template.rating = 0.0
         
         await self.db.certificate_templates.insert_one(new_template.dict())
+        await self.catalog.invalidate(self.db)
         return new_template
     
     async def generate_certificate(self, template_id: str, data: Dict[str, Any], format: str = "pdf") -> bytes:
         """Generate certificate with custom data"""
+        started = time.perf_counter()
         template_data = await self.db.certificate_templates.find_one({"id": template_id})
         
         if not template_data:
             raise ValueError(f"Template {template_id} not found")
         
         template = CertificateTemplate(**template_data)
+        timings = {"compile": time.perf_counter() - started}
+        format = format.lower()
         
-        # Increment usage count
-        await self.db.certificate_templates.update_one(
-            {"id": template_id},
-            {"$inc": {"usage_count": 1}}
-        )
+        try:
+            if format == "pdf":
+                output = await self._generate_pdf_certificate(template, data, timings)
+            elif format == "png":
+                output = await self._generate_image_certificate(template, data, "PNG", timings)
+            elif format == "jpg":
+                output = await self._generate_image_certificate(template, data, "JPEG", timings)
+            else:
+                raise ValueError(f"Unsupported format: {format}")
+            
+            # Increment usage count
+            stored = time.perf_counter()
+            await self.db.certificate_templates.update_one(
+                {"id": template_id},
+                {"$inc": {"usage_count": 1}, "$set": {"last_used": datetime.utcnow()}}
+            )
+            timings["store"] = time.perf_counter() - stored
+        except Exception:
+            self.metrics.increment(template_id, "failure")
+            raise
         
-        if format.lower() == "pdf":
-            return await self._generate_pdf_certificate(template, data)
-        elif format.lower() == "png":
-            return await self._generate_image_certificate(template, data, "PNG")
-        elif format.lower() == "jpg":
-            return await self._generate_image_certificate(template, data, "JPEG")
-        else:
-            raise ValueError(f"Unsupported format: {format}")
+        timings["total"] = time.perf_counter() - started
+        self.metrics.record_timings(template_id, timings)
+        self.metrics.observe(template_id, "output_bytes", len(output), SIZE_BUCKETS_BYTES)
+        self.metrics.increment(template_id, "success")
+        self.metrics.increment(template_id, f"format_{format}")
+        return output
     
     async def preview_certificate(self, template: CertificateTemplate, sample_data: Optional[Dict[str, Any]] = None) -> str:
         """Generate certificate preview as base64 image"""
+        preview = await self.render_preview(template, sample_data, scale=1.0, format="PNG")
+        return base64.b64encode(preview["image"]).decode('utf-8')
+    
+    async def render_preview(self, template: CertificateTemplate, sample_data: Optional[Dict[str, Any]] = None,
+                             scale: float = 0.5, format: str = "WEBP") -> Dict[str, Any]:
+        """Render a reduced-scale preview, cached by template and sample data"""
         if not sample_data:
             sample_data = self._generate_sample_data(template.variables)
         
-        image_data = await self._generate_image_certificate(template, sample_data, "PNG")
-        return base64.b64encode(image_data).decode('utf-8')
+        format = format.upper()
+        if format not in PREVIEW_FORMATS or (format == "WEBP" and not features.check("webp")):
+            format = "PNG"
+        scale = min(max(scale, 0.1), 1.0)
+        
+        etag = self._preview_etag(template, sample_data, scale, format)
+        image_data = self.assets.get_preview(etag)
+        
+        if image_data is None:
+            # Drawn directly at the preview scale instead of rendering full size and resizing
+            img = await self._render_certificate_image(template, sample_data, scale=scale)
+            
+            buffer = io.BytesIO()
+            img.save(buffer, format=format, **PREVIEW_FORMATS[format])
+            image_data = buffer.getvalue()
+            self.assets.store_preview(etag, image_data)
+        
+        return {
+            "image": image_data,
+            "etag": etag,
+            "format": format.lower(),
+            "media_type": f"image/{format.lower()}"
+        }
     
-    async def _generate_pdf_certificate(self, template: CertificateTemplate, data: Dict[str, Any]) -> bytes:
+    def _preview_etag(self, template: CertificateTemplate, sample_data: Dict[str, Any], scale: float, format: str) -> str:
+        """ETag for a preview of this template version and sample data"""
+        sample_hash = json.dumps(sample_data, sort_keys=True, default=str)
+        key = f"{self._template_fingerprint(template)}:{sample_hash}:{scale}:{format}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+    
+    async def _generate_pdf_certificate(self, template: CertificateTemplate, data: Dict[str, Any],
+                                        timings: Optional[Dict[str, float]] = None) -> bytes:
         """Generate PDF certificate"""
-        buffer = io.BytesIO()
+        started = time.perf_counter()
+        layout = self._get_pdf_layout(template)
+        if timings is not None:
+            timings["compile"] = timings.get("compile", 0.0) + time.perf_counter() - started
         
-        # Determine page size
+        return layout.render(data, timings)
+    
+    def _get_page_size(self, template: CertificateTemplate) -> Tuple[float, float]:
+        """PDF page size in points, adjusted for orientation"""
         if template.page_size in self.page_sizes:
             page_size = self.page_sizes[template.page_size]
         else:
@@ -224,9 +356,17 @@ class CertificateCustomizer:
         elif template.orientation == "landscape" and page_size[0] < page_size[1]:
             page_size = (page_size[1], page_size[0])
         
-        # Create PDF
-        doc = SimpleDocTemplate(buffer, pagesize=page_size)
-        story = []
+        return page_size
+    
+    def _get_pdf_layout(self, template: CertificateTemplate) -> PdfCertificateLayout:
+        """Lay out the template once per version; variable text becomes overlay fields"""
+        # Field renderers capture this customizer's missing variable policy
+        key = f"pdf:{self._template_fingerprint(template)}:{self.missing_variable_policy}"
+        layout = self.assets.get_layer(key)
+        if layout is not None:
+            return layout
+        
+        layout = PdfCertificateLayout(self._get_page_size(template))
         
         # Add background if specified
         if template.background_image:
@@ -236,8 +376,6 @@ class CertificateCustomizer:
         # Process elements
         for element in sorted(template.elements, key=lambda x: x.z_index):
             if element.type == "text":
-                content = self._replace_variables(element.content, data)
-                
                 # Create paragraph style
                 style = ParagraphStyle(
                     name=f'style_{element.id}',
@@ -248,74 +386,157 @@ class CertificateCustomizer:
                     leading=element.line_height * (element.font_size or template.style.body_size)
                 )
                 
-                paragraph = Paragraph(content, style)
-                story.append(paragraph)
-                story.append(Spacer(1, 12))
+                if self._is_dynamic_element(element):
+                    layout.add_field(
+                        lambda data, content=element.content: self._replace_variables(content, data, escape=True),
+                        style,
+                        sample=element.content
+                    )
+                else:
+                    layout.add_static(Paragraph(element.content, style))
+                layout.add_static(Spacer(1, 12))
         
-        doc.build(story)
-        buffer.seek(0)
-        return buffer.read()
+        layout.compile()
+        self.assets.store_layer(key, layout)
+        return layout
     
-    async def _generate_image_certificate(self, template: CertificateTemplate, data: Dict[str, Any], format: str) -> bytes:
+    async def _generate_image_certificate(self, template: CertificateTemplate, data: Dict[str, Any], format: str,
+                                          timings: Optional[Dict[str, float]] = None) -> bytes:
         """Generate image certificate"""
-        # Determine dimensions
+        img = await self._render_certificate_image(template, data, timings)
+        
+        # Convert to bytes
+        started = time.perf_counter()
+        buffer = io.BytesIO()
+        img.save(buffer, format=format, quality=95 if format == "JPEG" else None)
+        if timings is not None:
+            timings["encode"] = timings.get("encode", 0.0) + time.perf_counter() - started
+        return buffer.getvalue()
+    
+    async def _render_certificate_image(self, template: CertificateTemplate, data: Dict[str, Any],
+                                        timings: Optional[Dict[str, float]] = None, scale: float = 1.0) -> Image.Image:
+        """Copy the cached static layer and draw only the variable fields on top"""
+        started = time.perf_counter()
+        static_elements, dynamic_elements = self._split_image_elements(template)
+        layer = await self._get_static_layer(template, static_elements, scale)
+        compiled = time.perf_counter()
+        
+        img = layer.copy()
+        draw = ImageDraw.Draw(img)
+        
+        for element in dynamic_elements:
+            await self._draw_element(img, draw, element, data, scale)
+        
+        if timings is not None:
+            timings["compile"] = timings.get("compile", 0.0) + compiled - started
+            timings["layout"] = timings.get("layout", 0.0) + time.perf_counter() - compiled
+        return img
+    
+    def _get_image_size(self, template: CertificateTemplate, scale: float = 1.0) -> Tuple[int, int]:
+        """Pixel dimensions for image certificates"""
         if template.page_size == "A4":
-            if template.orientation == "landscape":
-                width, height = 1123, 794  # A4 landscape at 96 DPI
-            else:
-                width, height = 794, 1123  # A4 portrait at 96 DPI
+            size = (1123, 794) if template.orientation == "landscape" else (794, 1123)  # A4 at 96 DPI
         elif template.page_size == "Letter":
-            if template.orientation == "landscape":
-                width, height = 1056, 816
-            else:
-                width, height = 816, 1056
+            size = (1056, 816) if template.orientation == "landscape" else (816, 1056)
         else:
-            width = int(template.custom_width or 800)
-            height = int(template.custom_height or 600)
+            size = (int(template.custom_width or 800), int(template.custom_height or 600))
+        return max(int(size[0] * scale), 1), max(int(size[1] * scale), 1)
+    
+    def _is_dynamic_element(self, element: CertificateElement) -> bool:
+        """Whether an element changes per certificate"""
+        return element.type == "text" and compile_content(element.content).has_variables
+    
+    def _split_image_elements(self, template: CertificateTemplate) -> Tuple[List[CertificateElement], List[CertificateElement]]:
+        """Split elements into the cached static layer and per-certificate overlay"""
+        elements = sorted(template.elements, key=lambda x: x.z_index)
+        dynamic_z = [e.z_index for e in elements if self._is_dynamic_element(e)]
+        
+        # Static elements stacked above a variable field must still be drawn after it
+        lowest_dynamic_z = min(dynamic_z) if dynamic_z else None
+        static_elements, overlay_elements = [], []
+        for element in elements:
+            if self._is_dynamic_element(element) or (lowest_dynamic_z is not None and element.z_index > lowest_dynamic_z):
+                overlay_elements.append(element)
+            else:
+                static_elements.append(element)
         
-        # Create image
+        return static_elements, overlay_elements
+    
+    def _template_fingerprint(self, template: CertificateTemplate) -> str:
+        """Fingerprint of everything that affects rendered static content"""
+        # Content only: unsaved builder templates get fresh ids and timestamps on every request
+        fingerprint = template.json(include={
+            "page_size", "orientation", "custom_width", "custom_height",
+            "style", "background_image", "watermark", "elements"
+        }, exclude={"elements": {"__all__": {"id"}}})
+        return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+    
+    async def _get_static_layer(self, template: CertificateTemplate, static_elements: List[CertificateElement],
+                                scale: float = 1.0) -> Image.Image:
+        """Rasterize background, border, static elements and watermark once per template version and scale"""
+        key = f"image:{self._template_fingerprint(template)}:{scale}"
+        preview = scale != 1.0
+        layer = self.assets.get_layer(key, preview)
+        if layer is not None:
+            return layer
+        
+        width, height = self._get_image_size(template, scale)
         img = Image.new('RGB', (width, height), template.style.background_color)
+        
+        if template.background_image:
+            background = self.assets.get_image(template.background_image, (width, height))
+            if background:
+                img.paste(background, (0, 0), background)
+        
         draw = ImageDraw.Draw(img)
         
         # Add border if specified
         if template.style.border_width > 0:
-            border_color = template.style.border_color
-            border_width = template.style.border_width
-            
-            # Draw border
-            for i in range(border_width):
-                draw.rectangle([i, i, width-1-i, height-1-i], outline=border_color)
+            draw.rectangle(
+                [0, 0, width - 1, height - 1],
+                outline=template.style.border_color,
+                width=max(round(template.style.border_width * scale), 1)
+            )
         
-        # Process elements
-        for element in sorted(template.elements, key=lambda x: x.z_index):
-            await self._draw_element(draw, element, data, img.size)
+        for element in static_elements:
+            await self._draw_element(img, draw, element, {}, scale)
         
-        # Add watermark if specified
         if template.watermark:
-            # Add watermark logic here
-            pass
+            img = self._draw_watermark(img, template)
         
-        # Convert to bytes
-        buffer = io.BytesIO()
-        img.save(buffer, format=format, quality=95 if format == "JPEG" else None)
-        buffer.seek(0)
-        return buffer.read()
+        self.assets.store_layer(key, img, preview)
+        return img
+    
+    def _draw_watermark(self, img: Image.Image, template: CertificateTemplate) -> Image.Image:
+        """Draw a faint rotated text watermark across the page"""
+        font = self.assets.get_font(template.style.title_font, max(img.size) // 12, "bold")
+        
+        overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
+        overlay_draw = ImageDraw.Draw(overlay)
+        left, top, right, bottom = overlay_draw.textbbox((0, 0), template.watermark, font=font)
+        position = ((img.size[0] - (right - left)) / 2, (img.size[1] - (bottom - top)) / 2)
+        
+        color = HexColor(template.style.primary_color)
+        fill = (int(color.red * 255), int(color.green * 255), int(color.blue * 255), 38)
+        overlay_draw.text(position, template.watermark, font=font, fill=fill)
+        overlay = overlay.rotate(30, resample=Image.BICUBIC)
+        
+        return Image.alpha_composite(img.convert('RGBA'), overlay).convert('RGB')
     
-    async def _draw_element(self, draw: ImageDraw.Draw, element: CertificateElement, data: Dict[str, Any], img_size: Tuple[int, int]):
-        """Draw individual element on certificate"""
+    async def _draw_element(self, img: Image.Image, draw: ImageDraw.Draw, element: CertificateElement, data: Dict[str, Any],
+                            scale: float = 1.0):
+        """Draw individual element on certificate; absolute positions and sizes are multiplied by scale"""
+        img_size = img.size
+        
         if element.type == "text":
             content = self._replace_variables(element.content, data)
             
-            # Get font
-            try:
-                font_size = element.font_size or 14
-                font = ImageFont.truetype("arial.ttf", font_size)
-            except:
-                font = ImageFont.load_default()
+            # Get font from the shared asset cache
+            font = self.assets.get_font(element.font_family, max(round((element.font_size or 14) * scale), 1), element.font_weight)
             
             # Calculate position
-            x = element.x if element.x >= 1 else element.x * img_size[0]
-            y = element.y if element.y >= 1 else element.y * img_size[1]
+            x = element.x * scale if element.x >= 1 else element.x * img_size[0]
+            y = element.y * scale if element.y >= 1 else element.y * img_size[1]
             
             # Draw text
             color = element.font_color or "#000000"
@@ -323,10 +544,10 @@ class CertificateCustomizer:
         
         elif element.type == "shape":
             # Draw shapes like rectangles, circles, etc.
-            x = element.x if element.x >= 1 else element.x * img_size[0]
-            y = element.y if element.y >= 1 else element.y * img_size[1]
-            width = element.width or 100
-            height = element.height or 100
+            x = element.x * scale if element.x >= 1 else element.x * img_size[0]
+            y = element.y * scale if element.y >= 1 else element.y * img_size[1]
+            width = (element.width or 100) * scale
+            height = (element.height or 100) * scale
             
             color = element.background_color or "#6366f1"
             
@@ -335,17 +556,19 @@ class CertificateCustomizer:
             elif "circle" in element.content.lower():
                 draw.ellipse([x, y, x + width, y + height], fill=color, outline=element.border_color)
         
-        elif element.type == "image":
-            # Handle image elements
-            # This would require loading and positioning images
-            pass
+        elif element.type in ("image", "logo"):
+            # Content holds a file path, data URI or base64 payload
+            x = element.x * scale if element.x >= 1 else element.x * img_size[0]
+            y = element.y * scale if element.y >= 1 else element.y * img_size[1]
+            size = (max(int(element.width * scale), 1), max(int(element.height * scale), 1)) if element.width and element.height else None
+            
+            image = self.assets.get_image(element.content, size)
+            if image:
+                img.paste(image, (int(x), int(y)), image)
     
-    def _replace_variables(self, content: str, data: Dict[str, Any]) -> str:
+    def _replace_variables(self, content: str, data: Dict[str, Any], escape: bool = False) -> str:
         """Replace template variables in content"""
-        for key, value in data.items():
-            placeholder = f"{{{{{key}}}}}"
-            content = content.replace(placeholder, str(value))
-        return content
+        return compile_content(content).render(data, missing=self.missing_variable_policy, escape=escape)
     
     def _get_alignment(self, align: str) -> int:
         """Convert alignment string to ReportLab constant"""
@@ -380,13 +603,24 @@ class CertificateCustomizer:
         
         return sample_data
     
-    async def get_certificate_analytics(self, template_id: str) -> Dict[str, Any]:
+    async def get_certificate_analytics(self, template_id: str, days: Optional[int] = None) -> Dict[str, Any]:
         """Get analytics for certificate template"""
         template_data = await self.db.certificate_templates.find_one({"id": template_id})
         
         if not template_data:
             return {"error": "Template not found"}
         
+        since = datetime.utcnow() - timedelta(days=days) if days else None
+        histograms, counters = await self.metrics.load(
+            self.db, template_id, {"output_bytes": SIZE_BUCKETS_BYTES}, since=since
+        )
+        
+        successes = counters.get("success", 0)
+        failures = counters.get("failure", 0)
+        attempts = successes + failures
+        format_counts = {fmt: counters.get(f"format_{fmt}", 0) for fmt in ("pdf", "png", "jpg")}
+        output_sizes = histograms.get("output_bytes")
+        
         # Get usage statistics
         analytics = {
             "template_id": template_id,
@@ -396,12 +630,18 @@ class CertificateCustomizer:
             "created_at": template_data.get("created_at"),
             "last_used": template_data.get("last_used"),
             "performance_metrics": {
-                "generation_time": 0.5,  # Average generation time in seconds
-                "success_rate": 99.2,
+                "generations": attempts,
+                "failures": failures,
+                "success_rate": round(successes / attempts * 100, 2) if attempts else None,
+                "generation_time_ms": histograms["total"].summary() if "total" in histograms else None,
+                "stage_times_ms": {
+                    stage: histograms[stage].summary()
+                    for stage in ("compile", "layout", "encode", "store") if stage in histograms
+                },
+                "average_output_bytes": round(output_sizes.total / output_sizes.count) if output_sizes and output_sizes.count else None,
                 "popular_formats": {
-                    "pdf": 75,
-                    "png": 20,
-                    "jpg": 5
+                    fmt: round(count / successes * 100, 2) if successes else 0
+                    for fmt, count in format_counts.items()
                 }
             }
         }
@@ -410,6 +650,7 @@ class CertificateCustomizer:
     
     async def create_certificate_builder_config(self) -> Dict[str, Any]:
         """Get configuration for the advanced certificate builder"""
+        fonts = await self._get_available_fonts()
         return {
             "elements": {
                 "text": {
@@ -417,7 +658,7 @@ class CertificateCustomizer:
                     "icon": "📝",
                     "properties": [
                         {"name": "content", "type": "textarea", "label": "Text Content"},
-                        {"name": "font_family", "type": "select", "label": "Font", "options": await self._get_available_fonts()},
+                        {"name": "font_family", "type": "select", "label": "Font", "options": fonts},
                         {"name": "font_size", "type": "number", "label": "Font Size", "min": 8, "max": 72},
                         {"name": "font_color", "type": "color", "label": "Text Color"},
                         {"name": "font_weight", "type": "select", "label": "Weight", "options": ["normal", "bold", "light"]},
@@ -439,7 +680,7 @@ class CertificateCustomizer:
                     "properties": [
                         {"name": "content", "type": "text", "label": "Heading Text"},
                         {"name": "level", "type": "select", "label": "Level", "options": ["1", "2", "3", "4", "5", "6"]},
-                        {"name": "font_family", "type": "select", "label": "Font", "options": await self._get_available_fonts()},
+                        {"name": "font_family", "type": "select", "label": "Font", "options": fonts},
                         {"name": "font_size", "type": "number", "label": "Font Size", "min": 16, "max": 72},
                         {"name": "font_color", "type": "color", "label": "Text Color"},
                         {"name": "text_align", "type": "select", "label": "Alignment", "options": ["left", "center", "right"]}
@@ -482,7 +723,7 @@ class CertificateCustomizer:
                     "default_props": {
                         "width": 150,
                         "height": 75,
-                        "maintain_aspect": true
+                        "maintain_aspect": True
                     }
                 },
                 "signature": {
@@ -498,7 +739,7 @@ class CertificateCustomizer:
                     "default_props": {
                         "name": "John Doe",
                         "title": "Director",
-                        "show_line": true,
+                        "show_line": True,
                         "line_width": 200
                     }
                 },
@@ -588,4 +829,40 @@ class CertificateCustomizer:
                     ]
                 }
             }
-        }
\ No newline at end of file
+        }
+
+    async def _get_available_fonts(self) -> List[str]:
+        """Fonts every output format can render: PDFs use ReportLab's built-in fonts by name"""
+        return [font for font in pdfmetrics.standardFonts if font not in ("Symbol", "ZapfDingbats")]
+    
+    async def _get_certificate_presets(self) -> List[Dict[str, Any]]:
+        """Get preset certificates for quick start"""
+        return [
+            {
+                "id": "participation",
+                "name": "Participation Certificate",
+                "description": "Clean certificate for every participant",
+                "category": "participation",
+                "preview": "/static/certificate-presets/participation.png",
+                "layout": "classic",
+                "style": {"primary_color": "#6366f1", "title_font": "Helvetica-Bold", "body_font": "Helvetica"}
+            },
+            {
+                "id": "winner",
+                "name": "Winner Certificate",
+                "description": "Award certificate for competition winners",
+                "category": "achievement",
+                "preview": "/static/certificate-presets/winner.png",
+                "layout": "classic",
+                "style": {"primary_color": "#f59e0b", "title_font": "Times-Bold", "body_font": "Times-Roman"}
+            },
+            {
+                "id": "mentor",
+                "name": "Mentor Appreciation",
+                "description": "Thank-you certificate for mentors and judges",
+                "category": "appreciation",
+                "preview": "/static/certificate-presets/mentor.png",
+                "layout": "classic",
+                "style": {"primary_color": "#10b981", "title_font": "Helvetica-Bold", "body_font": "Helvetica"}
+            }
+        ]
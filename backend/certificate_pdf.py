@@ -0,0 +1,230 @@
+"""
+PDF Certificate Layouts for Hackfinity
+Lays out a certificate once, captures its static content as a form XObject
+and overlays only the variable fields for each participant
+"""
+
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+import io
+import logging
+import threading
+import time
+from reportlab.pdfgen import canvas
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Flowable
+
+logger = logging.getLogger(__name__)
+
+STATIC_FORM_NAME = "certificate_static"
+
+# Smallest font size a variable field is shrunk to when its text overflows the slot
+MIN_FIELD_FONT_SIZE = 8
+
+
+class _RecordedFlowable(Flowable):
+    """Wraps a flowable during layout and records where the frame placed it"""
+
+    def __init__(self, flowable: Flowable):
+        super().__init__()
+        self.flowable = flowable
+        self.position: Optional[Tuple[float, float, float]] = None
+        self.page = 0
+        self.avail_width = 0.0
+        self.parts: List["_RecordedFlowable"] = []
+
+    def wrap(self, availWidth, availHeight):
+        self.avail_width = availWidth
+        # wrapOn hands the canvas to nested flowables that measure against it
+        self.width, self.height = self.flowable.wrapOn(self.canv, availWidth, availHeight)
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        """Split the wrapped flowable so content too tall for the page overflows instead of failing layout"""
+        self.parts = [_RecordedFlowable(part) for part in self.flowable.splitOn(self.canv, availWidth, availHeight)]
+        return self.parts
+
+    def placed(self) -> Iterable["_RecordedFlowable"]:
+        """This flowable, or the parts it was split into, as laid out"""
+        if not self.parts:
+            return [self]
+        return [placed for part in self.parts for placed in part.placed()]
+
+    def getSpaceBefore(self):
+        return self.flowable.getSpaceBefore()
+
+    def getSpaceAfter(self):
+        return self.flowable.getSpaceAfter()
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        self.position = (x, y, _sW)
+        self.page = canvas.getPageNumber()
+
+
+def _line_count(paragraph: Paragraph) -> int:
+    """Number of lines in a wrapped paragraph"""
+    return max(len(getattr(paragraph, "blPara").lines), 1)
+
+
+class _FieldSlot:
+    """Absolute position and style of a variable field"""
+
+    def __init__(self, render: Callable[[Dict[str, Any]], str], style: ParagraphStyle, recorded: _RecordedFlowable):
+        self.render = render
+        self.style = style
+        self.x, self.y, _ = recorded.position
+        self.width = recorded.avail_width
+        self.height = recorded.height
+        self.top = self.y + self.height
+        self.lines = _line_count(recorded.flowable)
+
+
+class PdfCertificateLayout:
+    """Certificate page laid out once; static content is reused for every render"""
+
+    def __init__(self, page_size: Tuple[float, float], **doc_kwargs):
+        self.page_size = page_size
+        self.doc_kwargs = doc_kwargs
+        self._story: List[Tuple[Flowable, Optional[Callable[[Dict[str, Any]], str]]]] = []
+        self._static: List[Tuple[Flowable, float, float, float]] = []
+        self._fields: List[_FieldSlot] = []
+        self._compiled = False
+        self._lock = threading.Lock()
+        # Content stream of the static form and the fonts it references, captured on first draw
+        self._static_form: Optional[Tuple[List[Tuple[str, str]], List[str]]] = None
+        self.stats = {"truncated_fields": 0, "static_form_draws": 0}
+
+    def add_static(self, flowable: Flowable):
+        """Add content that is identical on every certificate"""
+        self._story.append((flowable, None))
+
+    def add_field(self, render: Callable[[Dict[str, Any]], str], style: ParagraphStyle, sample: str):
+        """Add a variable paragraph; sample text reserves its slot during layout"""
+        self._story.append((Paragraph(sample, style), render))
+
+    def compile(self) -> "PdfCertificateLayout":
+        """Run the platypus layout once and record absolute positions"""
+        if self._compiled:
+            return self
+
+        recorded = [(_RecordedFlowable(flowable), render) for flowable, render in self._story]
+        doc = SimpleDocTemplate(io.BytesIO(), pagesize=self.page_size, **self.doc_kwargs)
+        doc.build([item for item, _ in recorded])
+
+        for recorded_item, render in recorded:
+            for item in recorded_item.placed():
+                if item.position is None or item.page != 1:
+                    # Content that overflowed the first page is not part of the certificate
+                    continue
+                if render is None:
+                    x, y, shift = item.position
+                    self._static.append((item.flowable, x, y, shift))
+                else:
+                    self._fields.append(_FieldSlot(render, item.flowable.style, item))
+
+        self._compiled = True
+        return self
+
+    def render(self, values: Dict[str, Any], timings: Optional[Dict[str, float]] = None) -> bytes:
+        """Render a single-page certificate PDF"""
+        return self.render_batch([values], timings)
+
+    def render_batch(self, rows: Iterable[Dict[str, Any]], timings: Optional[Dict[str, float]] = None) -> bytes:
+        """Render one page per row into a single PDF sharing one static form XObject"""
+        buffer = io.BytesIO()
+        self.write_batch(rows, buffer, timings)
+        return buffer.getvalue()
+
+    def write(self, values: Dict[str, Any], output: BinaryIO, timings: Optional[Dict[str, float]] = None):
+        """Render a single-page certificate PDF directly into a binary stream"""
+        self.write_batch([values], output, timings)
+
+    def write_batch(self, rows: Iterable[Dict[str, Any]], output: BinaryIO, timings: Optional[Dict[str, float]] = None):
+        """Render one page per row directly into a binary stream (response body, blob upload, file)
+
+        When a timings dict is given, seconds spent laying out pages and encoding the
+        PDF are added under "layout" and "encode".
+        """
+        self.compile()
+        started = time.perf_counter()
+        canv = canvas.Canvas(output, pagesize=self.page_size)
+
+        self._define_static_form(canv)
+        for values in rows:
+            canv.doForm(STATIC_FORM_NAME)
+            for field in self._fields:
+                self._draw_field(canv, field, values)
+            canv.showPage()
+
+        laid_out = time.perf_counter()
+        canv.save()
+
+        if timings is not None:
+            timings["layout"] = timings.get("layout", 0.0) + laid_out - started
+            timings["encode"] = timings.get("encode", 0.0) + time.perf_counter() - laid_out
+
+    def _define_static_form(self, canv: canvas.Canvas):
+        """Define the static content as a form XObject, replaying the cached content stream when possible"""
+        with self._lock:
+            canv.beginForm(STATIC_FORM_NAME)
+            if self._static_form is None or not self._replay_static_form(canv):
+                self._draw_static_form(canv)
+            canv.endForm()
+
+    def _replay_static_form(self, canv: canvas.Canvas) -> bool:
+        """Copy the cached form content into this canvas if its fonts map to the same resource names"""
+        fonts, code = self._static_form
+        if any(canv._doc.getInternalFontName(font) != internal for font, internal in fonts):
+            return False
+        for operation in code:
+            canv.addLiteral(operation)
+        return True
+
+    def _draw_static_form(self, canv: canvas.Canvas):
+        """Draw the pre-laid-out static flowables and cache the content stream if it only needs fonts"""
+        doc = canv._doc
+        fonts_before, delayed_fonts = dict(doc.fontMapping), len(doc.delayedFonts)
+        start = len(canv._code)
+        for flowable, x, y, shift in self._static:
+            flowable.drawOn(canv, x, y, _sW=shift)
+        self.stats["static_form_draws"] += 1
+
+        # Images, nested forms, transparency, spot colors and embedded TrueType subsets are
+        # resources of this document only, so such content is redrawn for every document
+        if (len(doc.delayedFonts) != delayed_fonts or canv._formsinuse or canv._annotationrefs
+                or canv._colorsUsed or canv._extgstate.getState()):
+            return
+        fonts = [(font, internal) for font, internal in doc.fontMapping.items() if font not in fonts_before]
+        self._static_form = (fonts, list(canv._code[start:]))
+
+    def _draw_field(self, canv: canvas.Canvas, field: _FieldSlot, values: Dict[str, Any]):
+        """Draw a variable field top-aligned in its slot, shrinking it if it wraps onto more lines
+
+        Text that still overflows at MIN_FIELD_FONT_SIZE is clipped to the slot so it
+        cannot cover the static content around it, and counted in stats.
+        """
+        style = field.style
+        paragraph = Paragraph(field.render(values), style)
+        _, height = paragraph.wrap(field.width, self.page_size[1])
+
+        while _line_count(paragraph) > field.lines and style.fontSize > MIN_FIELD_FONT_SIZE:
+            font_size = max(int(style.fontSize * 0.9), MIN_FIELD_FONT_SIZE)
+            style = ParagraphStyle(
+                name=f"{style.name}_fit",
+                parent=style,
+                fontSize=font_size,
+                leading=style.leading * font_size / style.fontSize
+            )
+            paragraph = Paragraph(field.render(values), style)
+            _, height = paragraph.wrap(field.width, self.page_size[1])
+
+        if _line_count(paragraph) > field.lines:
+            self.stats["truncated_fields"] += 1
+            logger.warning(f"Certificate field {field.style.name} overflows its slot at {style.fontSize}pt, clipping "
+                           f"{_line_count(paragraph) - field.lines} line(s)")
+
+        canv.saveState()
+        frame = canv.beginPath()
+        frame.rect(field.x, field.y, field.width, field.height)
+        canv.clipPath(frame, stroke=0, fill=0)
+        paragraph.drawOn(canv, field.x, field.top - height)
+        canv.restoreState()
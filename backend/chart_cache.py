@@ -0,0 +1,89 @@
+"""
+Chart Result Cache for Hackfinity
+LRU + TTL cache of built charts, keyed by the data version of their source collection
+"""
+
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from collections import OrderedDict
+import threading
+import time
+
+
+class DataVersions:
+    """Version counters bumped by every write to a collection"""
+
+    def __init__(self, collection_name: str = "data_versions"):
+        self.collection_name = collection_name
+        self._local: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    async def bump(self, db, collection: str) -> int:
+        """Mark a collection as changed; shared through MongoDB so every worker sees it"""
+        with self._lock:
+            self._local[collection] = self._local.get(collection, 0) + 1
+            version = self._local[collection]
+        if db is not None:
+            doc = await getattr(db, self.collection_name).find_one_and_update(
+                {"_id": collection}, {"$inc": {"version": 1}}, upsert=True, return_document=True
+            )
+            version = doc["version"] if doc else version
+        return version
+
+    async def get(self, db, collection: str) -> int:
+        """Current version of a collection"""
+        if db is not None:
+            doc = await getattr(db, self.collection_name).find_one({"_id": collection})
+            return doc["version"] if doc else 0
+        with self._lock:
+            return self._local.get(collection, 0)
+
+
+class ChartCache:
+    """Built chart payloads keyed by (chart type, data source, data version, parameters)"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[Hashable, ...], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(chart_type: str, data_source: str, version: int, params: Optional[Dict[str, Any]] = None) -> Tuple[Hashable, ...]:
+        return (chart_type, data_source, version, tuple(sorted((params or {}).items())))
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def store(self, key: Tuple[Hashable, ...], value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, key: Tuple[Hashable, ...], build: Callable[[], Any]) -> Any:
+        """Return a cached chart or build and cache it"""
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.store(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by every AnalyticsEngine and the write paths in server.py
+data_versions = DataVersions()
+chart_cache = ChartCache()
@@ -0,0 +1,174 @@
+"""
+Live Analytics Feed for Hackfinity
+Pushes counter deltas to connected dashboards over Server-Sent Events, fed by
+the write paths or, on a replica set, by a MongoDB change stream
+"""
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Set
+from datetime import datetime
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per client before it is told to resync
+CLIENT_QUEUE_SIZE = 64
+
+# Seconds between keep-alive comments so proxies keep idle streams open
+HEARTBEAT_INTERVAL = 15.0
+
+
+def insert_deltas(collection: str, doc: Dict[str, Any]) -> Dict[str, int]:
+    """Counter deltas for a newly stored document"""
+    deltas: Dict[str, int] = {}
+    if collection == "sponsors":
+        deltas["sponsors_added"] = 1
+        if doc.get('email_status') in ("generated", "sent"):
+            deltas["emails_generated"] = 1
+        if doc.get('email_status') == "sent":
+            deltas["emails_sent"] = 1
+    elif collection == "participants":
+        deltas["participants_added"] = 1
+        if doc.get('certificate_generated'):
+            deltas["certificates_generated"] = 1
+        if doc.get('certificate_sent'):
+            deltas["certificates_sent"] = 1
+    return deltas
+
+
+def change_deltas(collection: str, before: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, int]:
+    """Counter deltas for fields set on a stored document; before is empty when only the changes are known"""
+    deltas: Dict[str, int] = {}
+    if collection == "sponsors":
+        if changes.get('email_status') == "sent" and before.get('email_status') != "sent":
+            deltas["emails_sent"] = 1
+    elif collection == "participants":
+        if changes.get('certificate_generated') and not before.get('certificate_generated'):
+            deltas["certificates_generated"] = 1
+        if changes.get('certificate_sent') and not before.get('certificate_sent'):
+            deltas["certificates_sent"] = 1
+    return deltas
+
+
+def format_event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """Server-Sent Events message"""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, separators=(',', ':'), default=str)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+class LiveFeed:
+    """Merges counter deltas and broadcasts them to every subscriber once per interval"""
+
+    def __init__(self, queue_size: int = CLIENT_QUEUE_SIZE, heartbeat: float = HEARTBEAT_INTERVAL):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.sequence = 0
+        # Set while a change stream feeds the counters, so the write paths do not count twice
+        self.change_stream_active = False
+        self._pending: Dict[str, int] = {}
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, deltas: Dict[str, int]):
+        """Add deltas to the next broadcast"""
+        for counter, value in deltas.items():
+            self._pending[counter] = self._pending.get(counter, 0) + value
+
+    def record_insert(self, collection: str, doc: Dict[str, Any]):
+        if not self.change_stream_active:
+            self.publish(insert_deltas(collection, doc))
+
+    def record_change(self, collection: str, before: Dict[str, Any], changes: Dict[str, Any]):
+        if not self.change_stream_active:
+            self.publish(change_deltas(collection, before, changes))
+
+    def record_failure(self, counter: str):
+        """Count a failed send; failures are never written, so they always come from the write path"""
+        self.publish({counter: 1})
+
+    def subscribe(self) -> asyncio.Queue:
+        # Deltas from before the client connected belong to the existing clients only
+        self.broadcast()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def broadcast(self) -> int:
+        """Send merged deltas to every subscriber; returns the number of clients reached"""
+        if not self._pending:
+            return 0
+        deltas, self._pending = self._pending, {}
+        if not self._subscribers:
+            # New clients start from a snapshot, so nobody needs these
+            return 0
+
+        self.sequence += 1
+        # Serialized once and shared by every client
+        message = format_event("delta", {"at": datetime.utcnow().isoformat(), "deltas": deltas}, self.sequence)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A client that cannot keep up refetches its totals instead of replaying stale deltas
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(format_event("resync", {}, self.sequence))
+        return len(self._subscribers)
+
+    async def run(self, interval: float = 1.0):
+        """Broadcast pending deltas every interval seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.broadcast()
+            except Exception as e:
+                logger.warning(f"Live feed broadcast failed: {e}")
+
+    async def stream(self, snapshot: Callable[[], Awaitable[Dict[str, Any]]]) -> AsyncIterator[str]:
+        """Event stream for one client: a snapshot of the totals, then deltas and keep-alives"""
+        # Subscribe before reading the totals so no write falls between the snapshot and the first delta
+        queue = self.subscribe()
+        try:
+            yield format_event("snapshot", {"totals": await snapshot()}, self.sequence)
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+
+async def run_change_stream(feed: LiveFeed, db, collections: Iterable[str] = ("sponsors", "participants")):
+    """Feed deltas from a MongoDB change stream so clients of every worker see every write
+
+    Change streams need a replica set; on a standalone server the feed keeps
+    counting from the write paths of this process.
+    """
+    pipeline = [{"$match": {"ns.coll": {"$in": list(collections)}, "operationType": {"$in": ["insert", "update"]}}}]
+    try:
+        async with db.watch(pipeline) as stream:
+            feed.change_stream_active = True
+            logger.info("Live analytics feed is following the MongoDB change stream")
+            async for change in stream:
+                collection = change["ns"]["coll"]
+                if change["operationType"] == "insert":
+                    feed.publish(insert_deltas(collection, change["fullDocument"]))
+                else:
+                    feed.publish(change_deltas(collection, {}, change["updateDescription"]["updatedFields"]))
+    except Exception as e:
+        logger.info(f"Change stream unavailable, live analytics feed uses the write paths: {e}")
+    finally:
+        feed.change_stream_active = False
+
+
+# Shared by the write paths and the streaming endpoint
+live_feed = LiveFeed()
@@ -0,0 +1,220 @@
+"""
+In-Process Metrics Registry for Hackfinity
+Low-overhead histograms and counters, flushed to MongoDB in hourly buckets
+"""
+
+from typing import Dict, List, Optional, Any, Tuple
+from contextlib import contextmanager
+from datetime import datetime
+import asyncio
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of latency buckets in milliseconds (roughly 25% apart, 0.1 ms to 60 s)
+LATENCY_BUCKETS_MS = [round(0.1 * 1.25 ** i, 3) for i in range(60)]
+
+# Upper bounds of output size buckets in bytes (1 KB to 64 MB, doubling)
+SIZE_BUCKETS_BYTES = [1024 * 2 ** i for i in range(17)]
+
+
+class Histogram:
+    """Fixed-bucket histogram; mergeable and cheap to update"""
+
+    def __init__(self, boundaries: List[float], counts: Optional[List[int]] = None, total: float = 0.0):
+        self.boundaries = boundaries
+        # One extra bucket for values above the last boundary
+        self.counts = counts or [0] * (len(boundaries) + 1)
+        self.total = total
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.boundaries, value)] += 1
+        self.total += value
+
+    def merge(self, other: "Histogram"):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.total += other.total
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Estimate a percentile by interpolating inside the matching bucket"""
+        count = self.count
+        if not count:
+            return None
+
+        rank = percent / 100 * count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.boundaries[i - 1] if i > 0 else 0.0
+                upper = self.boundaries[i] if i < len(self.boundaries) else self.boundaries[-1]
+                return round(lower + (upper - lower) * (rank - seen) / n, 3)
+            seen += n
+        return self.boundaries[-1]
+
+    def summary(self) -> Dict[str, Any]:
+        count = self.count
+        return {
+            "count": count,
+            "mean": round(self.total / count, 3) if count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """Per-scope (e.g. per-template) histograms and counters kept in memory until flushed"""
+
+    def __init__(self, collection_name: str, max_scopes: int = 1000):
+        self.collection_name = collection_name
+        self.max_scopes = max_scopes
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str], int] = {}
+        self._scopes: set = set()
+        self._lock = threading.Lock()
+
+    def _scope_allowed(self, scope: str) -> bool:
+        """Bound memory when many distinct scopes report between flushes (caller holds the lock)"""
+        if scope in self._scopes:
+            return True
+        if len(self._scopes) >= self.max_scopes:
+            return False
+        self._scopes.add(scope)
+        return True
+
+    def observe(self, scope: str, name: str, value: float, boundaries: List[float] = LATENCY_BUCKETS_MS):
+        with self._lock:
+            if not self._scope_allowed(scope):
+                return
+            histogram = self._histograms.get((scope, name))
+            if histogram is None:
+                histogram = self._histograms[(scope, name)] = Histogram(boundaries)
+            histogram.observe(value)
+
+    def increment(self, scope: str, name: str, amount: int = 1):
+        with self._lock:
+            if not self._scope_allowed(scope):
+                return
+            self._counters[(scope, name)] = self._counters.get((scope, name), 0) + amount
+
+    @contextmanager
+    def timer(self, scope: str, stage: str):
+        """Record the wall time of a block in milliseconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(scope, stage, (time.perf_counter() - started) * 1000)
+
+    def record_timings(self, scope: str, timings: Dict[str, float]):
+        """Record stage timings given in seconds"""
+        for stage, seconds in timings.items():
+            self.observe(scope, stage, seconds * 1000)
+
+    def _drain(self) -> Tuple[Dict[Tuple[str, str], Histogram], Dict[Tuple[str, str], int]]:
+        with self._lock:
+            histograms, counters = self._histograms, self._counters
+            self._histograms, self._counters, self._scopes = {}, {}, set()
+        return histograms, counters
+
+    def pending(self, scope: str) -> Tuple[Dict[str, Histogram], Dict[str, int]]:
+        """Unflushed histograms and counters for one scope"""
+        with self._lock:
+            histograms = {name: Histogram(h.boundaries, list(h.counts), h.total)
+                          for (s, name), h in self._histograms.items() if s == scope}
+            counters = {name: n for (s, name), n in self._counters.items() if s == scope}
+        return histograms, counters
+
+    async def flush(self, db) -> int:
+        """Write pending metrics as one $inc upsert per scope into the current hourly bucket"""
+        histograms, counters = self._drain()
+        if not histograms and not counters:
+            return 0
+
+        bucket = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        updates: Dict[str, Dict[str, Any]] = {}
+
+        for (scope, name), histogram in histograms.items():
+            inc = updates.setdefault(scope, {})
+            inc[f"histograms.{name}.total"] = histogram.total
+            for i, n in enumerate(histogram.counts):
+                if n:
+                    inc[f"histograms.{name}.counts.{i}"] = n
+        for (scope, name), amount in counters.items():
+            updates.setdefault(scope, {})[f"counters.{name}"] = amount
+
+        collection = getattr(db, self.collection_name)
+        written = set()
+        try:
+            for scope, inc in updates.items():
+                await collection.update_one(
+                    {"scope": scope, "bucket": bucket},
+                    {"$inc": inc, "$setOnInsert": {"scope": scope, "bucket": bucket}},
+                    upsert=True
+                )
+                written.add(scope)
+        except Exception as e:
+            logger.warning(f"Metrics flush to {self.collection_name} failed: {e}")
+            self._restore(
+                {key: h for key, h in histograms.items() if key[0] not in written},
+                {key: n for key, n in counters.items() if key[0] not in written}
+            )
+
+        return len(written)
+
+    def _restore(self, histograms: Dict[Tuple[str, str], Histogram], counters: Dict[Tuple[str, str], int]):
+        """Put drained metrics back after a failed flush"""
+        with self._lock:
+            self._scopes.update(key[0] for key in list(histograms) + list(counters))
+            for key, histogram in histograms.items():
+                current = self._histograms.setdefault(key, Histogram(histogram.boundaries))
+                current.merge(histogram)
+            for key, amount in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + amount
+
+    async def load(self, db, scope: str, boundaries: Dict[str, List[float]],
+                   since: Optional[datetime] = None) -> Tuple[Dict[str, Histogram], Dict[str, int]]:
+        """Merge stored buckets for a scope with metrics that are not flushed yet"""
+        histograms, counters = self.pending(scope)
+
+        query: Dict[str, Any] = {"scope": scope}
+        if since:
+            query["bucket"] = {"$gte": since}
+
+        if db is not None:
+            cursor = getattr(db, self.collection_name).find(query, {"_id": 0, "histograms": 1, "counters": 1})
+            async for doc in cursor:
+                for name, stored in doc.get("histograms", {}).items():
+                    bounds = boundaries.get(name, LATENCY_BUCKETS_MS)
+                    counts = [0] * (len(bounds) + 1)
+                    for index, n in stored.get("counts", {}).items():
+                        counts[int(index)] += n
+                    histogram = histograms.setdefault(name, Histogram(bounds))
+                    histogram.merge(Histogram(bounds, counts, stored.get("total", 0.0)))
+                for name, amount in doc.get("counters", {}).items():
+                    counters[name] = counters.get(name, 0) + amount
+
+        return histograms, counters
+
+
+async def run_periodic_flush(registry: MetricsRegistry, db, interval: float = 60.0):
+    """Flush a registry (or anything with the same flush method) every interval seconds until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await registry.flush(db)
+        except Exception as e:
+            # A failed flush must not end the loop that drives every later flush
+            logger.warning(f"Periodic flush of {type(registry).__name__} failed: {e}")
+
+
+# Certificate generation metrics, scoped by template id
+certificate_metrics = MetricsRegistry("certificate_metrics")
@@ -0,0 +1,369 @@
+"""
+Materialized Analytics Rollups for Hackfinity
+Hourly counters by status, country, institution and skill, kept up to date on
+every write so dashboards read O(buckets) instead of O(documents)
+"""
+
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import threading
+import uuid
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Keys looked up on the document and then in the uploaded CSV row (additional_info)
+COUNTRY_KEYS = ['country', 'location']
+INSTITUTION_KEYS = ['institution', 'college', 'university', 'organization']
+SKILL_KEYS = ['skills', 'skill']
+
+# Named leases so one worker at a time rebuilds rollups and sketches from the source documents
+LEASE_COLLECTION = "reconcile_leases"
+RECONCILE_LEASE_SECONDS = 3000.0
+
+# Source fields needed to rebuild rollups from scratch
+SOURCE_PROJECTION = {
+    "_id": 0, "timestamp": 1, "created_at": 1, "status": 1, "email_status": 1,
+    "certificate_generated": 1, "certificate_sent": 1, "additional_info": 1,
+    "country": 1, "location": 1, "institution": 1, "skills": 1
+}
+
+
+def lookup_field(doc: Dict[str, Any], keys: List[str]) -> Optional[str]:
+    """First non-empty value for any of the keys, case-insensitively, on the document or its CSV row"""
+    for source in (doc, doc.get('additional_info') or {}):
+        lowered = {str(k).lower(): v for k, v in source.items()}
+        for key in keys:
+            value = lowered.get(key)
+            if value not in (None, ""):
+                return str(value).strip()
+    return None
+
+
+def sponsor_dimensions(doc: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Rollup dimension values for a sponsor document"""
+    dimensions = {"status": [doc.get('email_status') or doc.get('status') or "unknown"]}
+    country = lookup_field(doc, COUNTRY_KEYS)
+    if country:
+        dimensions["country"] = [country]
+    return dimensions
+
+
+def participant_dimensions(doc: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Rollup dimension values for a participant document"""
+    if doc.get('certificate_sent'):
+        status = "sent"
+    elif doc.get('certificate_generated'):
+        status = "generated"
+    else:
+        status = doc.get('status') or "pending"
+
+    dimensions = {"status": [status]}
+    country = lookup_field(doc, COUNTRY_KEYS)
+    if country:
+        dimensions["country"] = [country]
+    institution = lookup_field(doc, INSTITUTION_KEYS)
+    if institution:
+        dimensions["institution"] = [institution]
+    skills = lookup_field(doc, SKILL_KEYS)
+    if skills:
+        dimensions["skill"] = [skill.strip() for skill in skills.split(',') if skill.strip()]
+    return dimensions
+
+
+# Collections with rollups and how their documents map to dimension values
+ROLLUP_DIMENSIONS = {
+    "sponsors": sponsor_dimensions,
+    "participants": participant_dimensions,
+}
+
+
+def _encode_key(value: str) -> str:
+    """Make a dimension value safe to use as a MongoDB field name"""
+    value = value.replace('.', '．')
+    return '＄' + value[1:] if value.startswith('$') else value
+
+
+def _decode_key(value: str) -> str:
+    value = value.replace('．', '.')
+    return '$' + value[1:] if value.startswith('＄') else value
+
+
+async def acquire_lease(db, name: str, holder: str, seconds: float = RECONCILE_LEASE_SECONDS) -> bool:
+    """Take or renew a named lease; False while another holder's lease has not expired"""
+    now = datetime.utcnow()
+    try:
+        await getattr(db, LEASE_COLLECTION).update_one(
+            {"_id": name, "$or": [{"holder": holder}, {"expires": {"$lte": now}}]},
+            {"$set": {"holder": holder, "expires": now + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease exists and is held by another worker
+        return False
+    return True
+
+
+def _bucket_of(doc: Dict[str, Any]) -> datetime:
+    """Hour bucket of a document's creation time"""
+    created = doc.get('created_at') or doc.get('timestamp')
+    if isinstance(created, str):
+        try:
+            created = datetime.fromisoformat(created)
+        except ValueError:
+            created = None
+    if not isinstance(created, datetime):
+        created = datetime.utcnow()
+    return created.replace(tzinfo=None, minute=0, second=0, microsecond=0)
+
+
+def _add_counters(target: Dict[str, Any], counters: Dict[str, Any]):
+    """Sum nested counters into target"""
+    for key, value in counters.items():
+        if isinstance(value, dict):
+            _add_counters(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def _prune(counters: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop zero counts left behind by status changes and decode field names"""
+    pruned = {}
+    for key, value in counters.items():
+        if isinstance(value, dict):
+            value = _prune(value)
+            if value:
+                pruned[_decode_key(key)] = value
+        elif value:
+            pruned[_decode_key(key)] = value
+    return pruned
+
+
+class AnalyticsRollups:
+    """Per-collection hourly counters, buffered in memory and flushed as $inc upserts"""
+
+    def __init__(self, collection_name: str = "analytics_rollups"):
+        self.collection_name = collection_name
+        # (collection, bucket) -> nested counters not yet written
+        self._pending: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+        # (collection, bucket) -> when its pending counters received their first change
+        self._since: Dict[Tuple[str, datetime], datetime] = {}
+        # Flushed counters when running without MongoDB
+        self._memory: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # Lease holder id of this worker
+        self.worker_id = uuid.uuid4().hex
+
+    def _deltas(self, collection: str, doc: Dict[str, Any], sign: int) -> Dict[str, Any]:
+        counters: Dict[str, Any] = {"total": sign}
+        for dimension, values in ROLLUP_DIMENSIONS[collection](doc).items():
+            group = counters.setdefault(dimension, {})
+            for value in values:
+                key = _encode_key(value)
+                group[key] = group.get(key, 0) + sign
+        return counters
+
+    def _apply(self, collection: str, bucket: datetime, counters: Dict[str, Any]):
+        with self._lock:
+            if (collection, bucket) not in self._pending:
+                self._since[(collection, bucket)] = datetime.utcnow()
+            _add_counters(self._pending.setdefault((collection, bucket), {}), counters)
+
+    def record_insert(self, collection: str, doc: Dict[str, Any]):
+        """Count a newly stored document"""
+        if collection not in ROLLUP_DIMENSIONS:
+            return
+        self._apply(collection, _bucket_of(doc), self._deltas(collection, doc, 1))
+
+    def record_change(self, collection: str, before: Dict[str, Any], after: Dict[str, Any]):
+        """Move a document's counts from its old dimension values to its new ones"""
+        if collection not in ROLLUP_DIMENSIONS:
+            return
+        counters = self._deltas(collection, before, -1)
+        _add_counters(counters, self._deltas(collection, after, 1))
+        # Counts stay in the document's creation bucket
+        self._apply(collection, _bucket_of(before), counters)
+
+    def _drain(self) -> Tuple[Dict[Tuple[str, datetime], Dict[str, Any]], Dict[Tuple[str, datetime], datetime]]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            since, self._since = self._since, {}
+        return pending, since
+
+    async def ensure_indexes(self, db):
+        await getattr(db, self.collection_name).create_index([("collection", 1), ("bucket", 1)], unique=True)
+
+    async def flush(self, db) -> int:
+        """Write pending counters as one $inc per hourly bucket, inserting buckets that do not exist yet
+
+        Counters that started before their bucket was last rebuilt are already in it
+        and are dropped.
+        """
+        pending, since = self._drain()
+        if not pending:
+            return 0
+
+        if db is None:
+            with self._lock:
+                for key, counters in pending.items():
+                    _add_counters(self._memory.setdefault(key, {}), counters)
+            return len(pending)
+
+        collection = getattr(db, self.collection_name)
+        written = set()
+        try:
+            for (name, bucket), counters in pending.items():
+                inc = {}
+                for key, value in counters.items():
+                    if isinstance(value, dict):
+                        inc.update({f"counters.{key}.{k}": v for k, v in value.items() if v})
+                    elif value:
+                        inc[f"counters.{key}"] = value
+                if inc:
+                    result = await collection.update_one(
+                        {"collection": name, "bucket": bucket, "rebuilt_at": {"$not": {"$gte": since[(name, bucket)]}}},
+                        {"$inc": inc}
+                    )
+                    if not result.matched_count:
+                        try:
+                            await collection.insert_one({"collection": name, "bucket": bucket, "counters": counters})
+                        except DuplicateKeyError:
+                            # The bucket was rebuilt from documents read after these changes were recorded
+                            pass
+                written.add((name, bucket))
+        except Exception as e:
+            logger.warning(f"Rollup flush to {self.collection_name} failed: {e}")
+            with self._lock:
+                for key, counters in pending.items():
+                    if key not in written:
+                        _add_counters(self._pending.setdefault(key, {}), counters)
+                        self._since[key] = min(since[key], self._since.get(key, since[key]))
+
+        return len(written)
+
+    async def read(self, db, collection: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   granularity: str = "hour") -> List[Dict[str, Any]]:
+        """Counters per hour or day bucket, including writes that are not flushed yet"""
+        buckets: Dict[datetime, Dict[str, Any]] = {}
+
+        def in_range(bucket: datetime) -> bool:
+            return (since is None or bucket >= since) and (until is None or bucket < until)
+
+        if db is not None:
+            query: Dict[str, Any] = {"collection": collection}
+            if since or until:
+                query["bucket"] = {}
+                if since:
+                    query["bucket"]["$gte"] = since
+                if until:
+                    query["bucket"]["$lt"] = until
+            cursor = getattr(db, self.collection_name).find(query, {"_id": 0, "bucket": 1, "counters": 1})
+            async for doc in cursor:
+                _add_counters(buckets.setdefault(doc["bucket"], {}), doc.get("counters", {}))
+
+        with self._lock:
+            sources = [self._pending] if db is not None else [self._memory, self._pending]
+            for source in sources:
+                for (name, bucket), counters in source.items():
+                    if name == collection and in_range(bucket):
+                        _add_counters(buckets.setdefault(bucket, {}), counters)
+
+        if granularity == "day":
+            days: Dict[datetime, Dict[str, Any]] = {}
+            for bucket, counters in buckets.items():
+                _add_counters(days.setdefault(bucket.replace(hour=0), {}), counters)
+            buckets = days
+
+        return [{"bucket": bucket, "counters": _prune(buckets[bucket])} for bucket in sorted(buckets)]
+
+    async def totals(self, db, collection: str) -> Dict[str, Any]:
+        """Counters summed over every bucket"""
+        totals: Dict[str, Any] = {}
+        for row in await self.read(db, collection):
+            _add_counters(totals, row["counters"])
+        return totals
+
+    async def reconcile(self, db, memory_storage: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                        lease_seconds: float = RECONCILE_LEASE_SECONDS):
+        """Rebuild buckets from the source documents to repair drift
+
+        With MongoDB only buckets before the current hour are rebuilt; the current
+        hour keeps its incremental counters, so documents stored while the rebuild
+        reads the collection are not counted by both. Rebuilt buckets are stamped
+        with the rebuild time so every worker's flush drops changes they already
+        contain, and only the worker holding the reconcile lease rebuilds; the
+        others just flush.
+        """
+        if db is not None and not await acquire_lease(db, self.collection_name, self.worker_id, lease_seconds):
+            await self.flush(db)
+            return
+
+        for collection in ROLLUP_DIMENSIONS:
+            if db is None:
+                # No await until the counters are replaced, so no write can interleave
+                documents = (memory_storage or {}).get(collection, [])
+                rebuilt: Dict[datetime, Dict[str, Any]] = {}
+                for doc in documents:
+                    _add_counters(rebuilt.setdefault(_bucket_of(doc), {}), self._deltas(collection, doc, 1))
+                with self._lock:
+                    for key in [key for key in self._memory if key[0] == collection]:
+                        del self._memory[key]
+                    for key in [key for key in self._pending if key[0] == collection]:
+                        del self._pending[key]
+                        self._since.pop(key, None)
+                    for bucket, counters in rebuilt.items():
+                        self._memory[(collection, bucket)] = counters
+                continue
+
+            rebuilt_at = datetime.utcnow()
+            cutoff = rebuilt_at.replace(minute=0, second=0, microsecond=0)
+            # Counters written before the rebuild must not be added on top of it
+            await self.flush(db)
+            documents = await getattr(db, collection).find({}, SOURCE_PROJECTION).to_list(length=None)
+            with self._lock:
+                # Changes to rebuilt buckets recorded since the flush are already in the documents read
+                for key in [key for key in self._pending if key[0] == collection and key[1] < cutoff]:
+                    del self._pending[key]
+                    self._since.pop(key, None)
+
+            rebuilt = {}
+            for doc in documents:
+                bucket = _bucket_of(doc)
+                if bucket < cutoff:
+                    _add_counters(rebuilt.setdefault(bucket, {}), self._deltas(collection, doc, 1))
+
+            target = getattr(db, self.collection_name)
+            for bucket, counters in rebuilt.items():
+                await target.replace_one(
+                    {"collection": collection, "bucket": bucket},
+                    {"collection": collection, "bucket": bucket, "counters": counters, "rebuilt_at": rebuilt_at},
+                    upsert=True
+                )
+            await target.delete_many({"collection": collection, "bucket": {"$lt": cutoff, "$nin": list(rebuilt)}})
+
+
+async def run_periodic_rollups(rollups: AnalyticsRollups, db, flush_interval: float = 60.0,
+                               reconcile_interval: float = 3600.0):
+    """Flush rollups every flush_interval seconds and rebuild them every reconcile_interval seconds
+
+    Also drives the analytics sketches, which share the flush/reconcile interface.
+    """
+    since_reconcile = 0.0
+    while True:
+        await asyncio.sleep(flush_interval)
+        since_reconcile += flush_interval
+        try:
+            if since_reconcile >= reconcile_interval:
+                since_reconcile = 0.0
+                # The lease expires before the next interval, so the next due worker takes over
+                await rollups.reconcile(db, lease_seconds=reconcile_interval * 0.9)
+            else:
+                await rollups.flush(db)
+        except Exception as e:
+            logger.warning(f"Rollup maintenance failed: {e}")
+
+
+# Shared by every request handler in the process
+analytics_rollups = AnalyticsRollups()
@@ -4,8 +4,8 @@ Hackfinity Platform - Clean Server Implementation
 Core functionality for email scheduling, file uploads, and basic analytics
 """
 
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Form, Header, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -13,7 +13,7 @@ import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 import uuid
 from datetime import datetime
 import pandas as pd
@@ -24,9 +24,21 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 import asyncio
-import tempfile
 import json
+import time
 import base64
+import gzip
+import re
+import unicodedata
+from urllib.parse import quote
+from xml.sax.saxutils import escape as escape_markup
+from metrics import certificate_metrics, run_periodic_flush, SIZE_BUCKETS_BYTES
+from rollups import analytics_rollups, run_periodic_rollups
+from chart_cache import data_versions
+from live_feed import live_feed, run_change_stream
+from sketches import analytics_sketches
+from template_usage import template_usage
+from analytics_store import naive_utc
 
 # PDF Generation imports
 try:
@@ -35,13 +47,51 @@ try:
     from reportlab.lib.colors import HexColor
     from reportlab.lib.units import inch
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.platypus import Paragraph, Spacer
     from reportlab.lib.enums import TA_CENTER
+    from certificate_pdf import PdfCertificateLayout
     PDF_AVAILABLE = True
 except ImportError:
     PDF_AVAILABLE = False
     logging.warning("ReportLab not available. PDF generation will be disabled.")
 
+# Certificate customizer (needs Pillow and ReportLab)
+try:
+    from certificate_customizer import CertificateCustomizer, CertificateTemplate
+    CUSTOMIZER_AVAILABLE = True
+except ImportError:
+    CUSTOMIZER_AVAILABLE = False
+    logging.warning("Certificate customizer not available. Certificate previews will be disabled.")
+
+# Message templates and the template builder (need Jinja2)
+try:
+    from template_engine import TemplateEngine
+    TEMPLATES_AVAILABLE = True
+except ImportError:
+    TEMPLATES_AVAILABLE = False
+    logging.warning("Template engine not available. The template builder will be disabled.")
+
+# Analytics dashboards and charts (need pandas and Plotly)
+try:
+    from analytics import AnalyticsEngine, chart_template
+    ANALYTICS_AVAILABLE = True
+except ImportError:
+    ANALYTICS_AVAILABLE = False
+    logging.warning("Analytics engine not available. Dashboard charts will be disabled.")
+
+# Faster JSON serialization and brotli compression for analytics responses
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -82,6 +132,9 @@ app.add_middleware(
 # Create API router
 api_router = APIRouter(prefix="/api")
 
+certificate_customizer = CertificateCustomizer(db) if CUSTOMIZER_AVAILABLE else None
+template_engine = TemplateEngine(db) if TEMPLATES_AVAILABLE else None
+
 # Data Models
 class SponsorData(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -101,8 +154,15 @@ class ParticipantData(BaseModel):
     certificate_generated: bool = False
     certificate_sent: bool = False
     certificate_data: Optional[str] = None
+    issued_on: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+class CertificatePreviewRequest(BaseModel):
+    template: Dict[str, Any]
+    sample_data: Optional[Dict[str, Any]] = None
+    scale: float = 0.5
+    format: str = "webp"
+
 class EmailTemplate(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -117,6 +177,16 @@ EMAIL_PASSWORD = os.environ.get('EMAIL_PASSWORD', '')
 SMTP_SERVER = "smtp.gmail.com"
 SMTP_PORT = 587
 
+# Participation certificate layout, compiled on first use
+_certificate_layout = None
+
+# Metrics scope for the built-in participation certificate
+PARTICIPATION_CERTIFICATE = "participation"
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '60'))
+ROLLUP_RECONCILE_INTERVAL = float(os.environ.get('ROLLUP_RECONCILE_INTERVAL', '3600'))
+LIVE_FEED_INTERVAL = float(os.environ.get('LIVE_FEED_INTERVAL', '1'))
+LIVE_FEED_CHANGE_STREAM = os.environ.get('LIVE_FEED_CHANGE_STREAM', 'true').lower() == 'true'
+
 # In-memory storage (fallback when MongoDB is not available)
 memory_storage = {
     "sponsors": [],
@@ -124,7 +194,64 @@ memory_storage = {
     "templates": []
 }
 
+analytics_engine = AnalyticsEngine(
+    db if MONGO_AVAILABLE else None, memory_storage, sketches=analytics_sketches
+) if ANALYTICS_AVAILABLE else None
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+
 # Helper Functions
+def compact_json_response(request: Request, payload: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serialize without whitespace and compress with br or gzip when the client accepts it"""
+    if ORJSON_AVAILABLE:
+        body = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS, default=str)
+    else:
+        body = json.dumps(payload, separators=(',', ':'), default=str).encode()
+    
+    headers = dict(headers or {}, Vary="Accept-Encoding")
+    accepted = request.headers.get("accept-encoding", "")
+    if len(body) >= COMPRESS_MIN_BYTES:
+        if BROTLI_AVAILABLE and "br" in accepted:
+            body = brotli.compress(body, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+    
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def precomputed_json_response(request: Request, config: Any) -> Response:
+    """Serve a PrecomputedConfig like a static file: stored bytes, ETag revalidation and stored gzip"""
+    await config.load()
+    headers = {"ETag": f'"{config.etag}"', "Cache-Control": "public, max-age=300, must-revalidate", "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match and config.etag in if_none_match:
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(content=config.gzip_body, media_type="application/json", headers=dict(headers, **{"Content-Encoding": "gzip"}))
+    return Response(content=config.body, media_type="application/json", headers=headers)
+
+def attachment_disposition(filename: str) -> str:
+    """Content-Disposition with an ASCII fallback name and the RFC 5987 UTF-8 name"""
+    # Accents are dropped; other non-ASCII, quotes and backslashes would break the quoted string
+    fallback = "".join(ch for ch in unicodedata.normalize("NFKD", filename) if not unicodedata.combining(ch))
+    fallback = re.sub(r'[^\x20-\x7e]|["\\]', "_", fallback)
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename, safe="")}'
+
+def require_analytics():
+    if not ANALYTICS_AVAILABLE:
+        raise HTTPException(status_code=500, detail="Analytics not available")
+
+def check_window(since: Optional[datetime], until: Optional[datetime], granularity: str = "day"):
+    """Reject time windows and granularities the analytics queries cannot serve"""
+    if granularity not in ("hour", "day"):
+        raise HTTPException(status_code=400, detail="Granularity must be 'hour' or 'day'")
+    # Aware (e.g. ...Z) and naive bounds cannot be compared until both are naive UTC
+    since, until = naive_utc(since), naive_utc(until)
+    if since and until and since >= until:
+        raise HTTPException(status_code=400, detail="since must be earlier than until")
+
 async def store_data(collection: str, data: dict):
     """Store data in MongoDB or memory"""
     if MONGO_AVAILABLE:
@@ -132,6 +259,24 @@ async def store_data(collection: str, data: dict):
         await collection_obj.insert_one(data)
     else:
         memory_storage[collection].append(data)
+    analytics_rollups.record_insert(collection, data)
+    analytics_sketches.record_insert(collection, data)
+    live_feed.record_insert(collection, data)
+
+async def update_data(collection: str, document: dict, changes: dict):
+    """Update a stored document by id in MongoDB or memory"""
+    # In memory mode the document may be the stored dict itself, so snapshot it first
+    before = dict(document)
+    if MONGO_AVAILABLE:
+        collection_obj = getattr(db, collection)
+        await collection_obj.update_one({"id": document['id']}, {"$set": changes})
+    else:
+        for stored in memory_storage.get(collection, []):
+            if stored.get('id') == document['id']:
+                stored.update(changes)
+    analytics_rollups.record_change(collection, before, {**before, **changes})
+    live_feed.record_change(collection, before, changes)
+    await data_versions.bump(db if MONGO_AVAILABLE else None, collection)
 
 async def get_data(collection: str, query: dict = None):
     """Get data from MongoDB or memory"""
@@ -206,87 +351,112 @@ async def generate_email_content(sponsor_data: dict) -> str:
     </html>
     """
 
-async def generate_certificate(participant_name: str, event_name: str = "Hackfinity 2025") -> str:
-    """Generate certificate PDF and return as base64"""
+def get_certificate_layout() -> "PdfCertificateLayout":
+    """Lay out the participation certificate once per process"""
+    global _certificate_layout
+    if _certificate_layout is not None:
+        return _certificate_layout
+    
+    styles = getSampleStyleSheet()
+    
+    # Custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=36,
+        textColor=HexColor('#4A90E2'),
+        alignment=TA_CENTER,
+        spaceAfter=30
+    )
+    
+    subtitle_style = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Heading2'],
+        fontSize=18,
+        textColor=HexColor('#666666'),
+        alignment=TA_CENTER,
+        spaceAfter=20
+    )
+    
+    name_style = ParagraphStyle(
+        'CustomName',
+        parent=styles['Heading1'],
+        fontSize=48,
+        textColor=HexColor('#2C3E50'),
+        alignment=TA_CENTER,
+        spaceAfter=30
+    )
+    
+    content_style = ParagraphStyle(
+        'CustomContent',
+        parent=styles['Normal'],
+        fontSize=16,
+        textColor=HexColor('#333333'),
+        alignment=TA_CENTER,
+        spaceAfter=20
+    )
+    
+    # Certificate content; only the name, event and issue date vary per participant
+    layout = PdfCertificateLayout(A4)
+    layout.add_static(Spacer(1, 1*inch))
+    layout.add_static(Paragraph("🚀 CERTIFICATE OF PARTICIPATION", title_style))
+    layout.add_static(Spacer(1, 0.5*inch))
+    
+    layout.add_static(Paragraph("This is to certify that", subtitle_style))
+    layout.add_field(lambda v: f"<b>{escape_markup(v['participant_name'])}</b>", name_style, sample="<b>Participant</b>")
+    layout.add_static(Paragraph("has successfully participated in", content_style))
+    layout.add_field(lambda v: f"<b>{escape_markup(v['event_name'])}</b>", title_style, sample="<b>Hackfinity 2025</b>")
+    layout.add_static(Paragraph("The World's Biggest Agentic AI Hackathon", subtitle_style))
+    
+    layout.add_static(Spacer(1, 0.5*inch))
+    layout.add_static(Paragraph("Demonstrating excellence in AI innovation, collaboration,", content_style))
+    layout.add_static(Paragraph("and cutting-edge technology development", content_style))
+    
+    layout.add_static(Spacer(1, 1*inch))
+    layout.add_field(lambda v: f"Issued on: {v['issued_on']}", content_style, sample="Issued on: September 30, 2025")
+    layout.add_static(Paragraph("Hackfinity Team", content_style))
+    
+    _certificate_layout = layout.compile()
+    return _certificate_layout
+
+def certificate_issue_date() -> str:
+    """Issue date printed on a participation certificate"""
+    return datetime.now().strftime('%B %d, %Y')
+
+async def generate_certificate(participant_name: str, event_name: str = "Hackfinity 2025", as_base64: bool = True,
+                               issued_on: Optional[str] = None, record_metrics: bool = True) -> Union[str, bytes]:
+    """Generate certificate PDF in memory; returns base64 text, or raw bytes for binary consumers"""
     if not PDF_AVAILABLE:
         raise HTTPException(status_code=500, detail="PDF generation not available")
     
+    started = time.perf_counter()
+    timings = {}
     try:
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-            doc = SimpleDocTemplate(tmp_file.name, pagesize=A4)
-            styles = getSampleStyleSheet()
-            story = []
-            
-            # Custom styles
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=36,
-                textColor=HexColor('#4A90E2'),
-                alignment=TA_CENTER,
-                spaceAfter=30
-            )
-            
-            subtitle_style = ParagraphStyle(
-                'CustomSubtitle',
-                parent=styles['Heading2'],
-                fontSize=18,
-                textColor=HexColor('#666666'),
-                alignment=TA_CENTER,
-                spaceAfter=20
-            )
-            
-            name_style = ParagraphStyle(
-                'CustomName',
-                parent=styles['Heading1'],
-                fontSize=48,
-                textColor=HexColor('#2C3E50'),
-                alignment=TA_CENTER,
-                spaceAfter=30
-            )
-            
-            content_style = ParagraphStyle(
-                'CustomContent',
-                parent=styles['Normal'],
-                fontSize=16,
-                textColor=HexColor('#333333'),
-                alignment=TA_CENTER,
-                spaceAfter=20
-            )
-            
-            # Certificate content
-            story.append(Spacer(1, 1*inch))
-            story.append(Paragraph("🚀 CERTIFICATE OF PARTICIPATION", title_style))
-            story.append(Spacer(1, 0.5*inch))
-            
-            story.append(Paragraph("This is to certify that", subtitle_style))
-            story.append(Paragraph(f"<b>{participant_name}</b>", name_style))
-            story.append(Paragraph(f"has successfully participated in", content_style))
-            story.append(Paragraph(f"<b>{event_name}</b>", title_style))
-            story.append(Paragraph("The World's Biggest Agentic AI Hackathon", subtitle_style))
-            
-            story.append(Spacer(1, 0.5*inch))
-            story.append(Paragraph("Demonstrating excellence in AI innovation, collaboration,", content_style))
-            story.append(Paragraph("and cutting-edge technology development", content_style))
-            
-            story.append(Spacer(1, 1*inch))
-            story.append(Paragraph(f"Issued on: {datetime.now().strftime('%B %d, %Y')}", content_style))
-            story.append(Paragraph("Hackfinity Team", content_style))
-            
-            doc.build(story)
-            
-            with open(tmp_file.name, 'rb') as pdf_file:
-                pdf_content = pdf_file.read()
-                base64_pdf = base64.b64encode(pdf_content).decode('utf-8')
-            
-            os.unlink(tmp_file.name)
-            return base64_pdf
+        pdf_content = get_certificate_layout().render({
+            "participant_name": participant_name,
+            "event_name": event_name,
+            "issued_on": issued_on or certificate_issue_date()
+        }, timings)
+        
+        # Re-renders of an issued certificate (downloads) are not new generations
+        if record_metrics:
+            timings["total"] = time.perf_counter() - started
+            certificate_metrics.record_timings(PARTICIPATION_CERTIFICATE, timings)
+            certificate_metrics.observe(PARTICIPATION_CERTIFICATE, "output_bytes", len(pdf_content), SIZE_BUCKETS_BYTES)
+            certificate_metrics.increment(PARTICIPATION_CERTIFICATE, "success")
+            certificate_metrics.increment(PARTICIPATION_CERTIFICATE, "format_pdf")
+        
+        if not as_base64:
+            return pdf_content
+        return base64.b64encode(pdf_content).decode('utf-8')
             
     except Exception as e:
+        if record_metrics:
+            certificate_metrics.increment(PARTICIPATION_CERTIFICATE, "failure")
         logger.error(f"Error generating certificate for {participant_name}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Certificate generation failed: {str(e)}")
 
-async def send_email(to_email: str, subject: str, html_content: str, attachment_data: str = None, attachment_name: str = None) -> bool:
+async def send_email(to_email: str, subject: str, html_content: str, attachment_data: Union[str, bytes] = None, attachment_name: str = None) -> bool:
     """Send email using Gmail SMTP"""
     try:
         if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
@@ -305,7 +475,10 @@ async def send_email(to_email: str, subject: str, html_content: str, attachment_
         # Add attachment if provided
         if attachment_data and attachment_name:
             attachment = MIMEBase('application', 'octet-stream')
-            attachment.set_payload(base64.b64decode(attachment_data))
+            # Stored certificates are base64 text; freshly rendered ones are raw bytes
+            if isinstance(attachment_data, str):
+                attachment_data = base64.b64decode(attachment_data)
+            attachment.set_payload(attachment_data)
             encoders.encode_base64(attachment)
             attachment.add_header('Content-Disposition', f'attachment; filename="{attachment_name}"')
             msg.attach(attachment)
@@ -377,6 +550,9 @@ async def upload_sponsors(file: UploadFile = File(...)):
             sponsors.append(sponsor)
             await store_data("sponsors", sponsor.dict())
         
+        # Invalidate cached sponsor charts once per upload
+        await data_versions.bump(db if MONGO_AVAILABLE else None, "sponsors")
+        
         return {
             "message": "Sponsors uploaded successfully",
             "sponsors": [s.dict() for s in sponsors],
@@ -405,9 +581,11 @@ async def upload_participants(file: UploadFile = File(...)):
             # Generate certificate if PDF is available
             certificate_data = None
             certificate_generated = False
+            issued_on = None
             if PDF_AVAILABLE:
                 try:
-                    certificate_data = await generate_certificate(participant_name)
+                    issued_on = certificate_issue_date()
+                    certificate_data = await generate_certificate(participant_name, issued_on=issued_on)
                     certificate_generated = True
                 except Exception as cert_error:
                     logger.error(f"Error generating certificate for {participant_name}: {cert_error}")
@@ -417,12 +595,16 @@ async def upload_participants(file: UploadFile = File(...)):
                 email=participant_data.get('Email', participant_data.get('email', '')),
                 additional_info=participant_data,
                 certificate_generated=certificate_generated,
-                certificate_data=certificate_data
+                certificate_data=certificate_data,
+                issued_on=issued_on
             )
             
             participants.append(participant)
             await store_data("participants", participant.dict())
         
+        # Invalidate cached participant charts once per upload
+        await data_versions.bump(db if MONGO_AVAILABLE else None, "participants")
+        
         return {
             "message": "Participants uploaded successfully",
             "participants": [p.dict() for p in participants],
@@ -466,10 +648,14 @@ async def send_sponsor_email_task(sponsor: dict):
         subject = f"Partnership Opportunity with Hackfinity - {sponsor['organization']}"
         success = await send_email(sponsor['email'], subject, sponsor['email_content'])
         
-        # Update status (simplified for now)
+        if success:
+            await update_data("sponsors", sponsor, {"email_status": "sent"})
+        else:
+            live_feed.record_failure("emails_failed")
         logger.info(f"Email {'sent' if success else 'failed'} to {sponsor['email']}")
         
     except Exception as e:
+        live_feed.record_failure("emails_failed")
         logger.error(f"Error in sponsor email task: {str(e)}")
 
 async def send_certificate_task(participant: dict):
@@ -500,9 +686,14 @@ async def send_certificate_task(participant: dict):
             f"{participant['name']}_Hackfinity_Certificate.pdf"
         )
         
+        if success:
+            await update_data("participants", participant, {"certificate_sent": True})
+        else:
+            live_feed.record_failure("certificates_failed")
         logger.info(f"Certificate {'sent' if success else 'failed'} to {participant['email']}")
         
     except Exception as e:
+        live_feed.record_failure("certificates_failed")
         logger.error(f"Error in certificate task: {str(e)}")
 
 @api_router.get("/sponsors")
@@ -517,22 +708,101 @@ async def get_participants():
     participants = await get_data("participants")
     return participants
 
+@api_router.get("/participants/{participant_id}/certificate")
+async def download_certificate(participant_id: str):
+    """Download a participant's certificate as a PDF file"""
+    participants = await get_data("participants", {"id": participant_id})
+    participant = next((p for p in participants if p.get('id') == participant_id), None)
+    
+    if not participant:
+        raise HTTPException(status_code=404, detail="Participant not found")
+    
+    if participant.get('certificate_data'):
+        # Serve the certificate that was issued rather than rendering a new one
+        pdf_content = base64.b64decode(participant['certificate_data'])
+    else:
+        # Keep the first issue date so repeated downloads produce the same certificate
+        issued_on = participant.get('issued_on')
+        if not issued_on:
+            issued_on = certificate_issue_date()
+            await update_data("participants", participant, {"issued_on": issued_on})
+        pdf_content = await generate_certificate(
+            participant['name'], as_base64=False, issued_on=issued_on, record_metrics=False
+        )
+    filename = f"{participant['name']}_Hackfinity_Certificate.pdf"
+    
+    return Response(
+        content=pdf_content,
+        media_type="application/pdf",
+        headers={"Content-Disposition": attachment_disposition(filename)}
+    )
+
+@api_router.post("/certificates/preview")
+async def preview_certificate(request: CertificatePreviewRequest, if_none_match: Optional[str] = Header(None)):
+    """Render a low-resolution certificate preview for the template builder"""
+    if not CUSTOMIZER_AVAILABLE:
+        raise HTTPException(status_code=500, detail="Certificate previews not available")
+    
+    try:
+        template = CertificateTemplate(**request.template)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid certificate template: {str(e)}")
+    
+    preview = await certificate_customizer.render_preview(template, request.sample_data, request.scale, request.format)
+    headers = {"ETag": f'"{preview["etag"]}"', "Cache-Control": "private, no-cache"}
+    
+    # Unchanged template and sample data: the client's copy is still valid
+    if if_none_match and preview["etag"] in if_none_match:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=preview["image"], media_type=preview["media_type"], headers=headers)
+
+@api_router.get("/certificates/builder-config")
+async def get_certificate_builder_config(request: Request):
+    """Get the certificate builder configuration"""
+    if not CUSTOMIZER_AVAILABLE:
+        raise HTTPException(status_code=500, detail="Certificate builder not available")
+    return await precomputed_json_response(request, certificate_customizer.builder_config)
+
+@api_router.get("/templates/builder-config")
+async def get_template_builder_config(request: Request):
+    """Get the message template builder configuration"""
+    if not TEMPLATES_AVAILABLE:
+        raise HTTPException(status_code=500, detail="Template builder not available")
+    return await precomputed_json_response(request, template_engine.builder_config)
+
 @api_router.get("/analytics")
 async def get_analytics():
     """Get basic analytics"""
-    sponsors = await get_data("sponsors")
-    participants = await get_data("participants")
+    # Read from the materialized rollups instead of scanning the collections
+    rollup_db = db if MONGO_AVAILABLE else None
+    sponsors = await analytics_rollups.totals(rollup_db, "sponsors")
+    participants = await analytics_rollups.totals(rollup_db, "participants")
+    participant_status = participants.get("status", {})
+    histograms, counters = await certificate_metrics.load(
+        db if MONGO_AVAILABLE else None, PARTICIPATION_CERTIFICATE, {"output_bytes": SIZE_BUCKETS_BYTES}
+    )
+    attempts = counters.get("success", 0) + counters.get("failure", 0)
     
     return {
         "sponsors": {
-            "total": len(sponsors),
-            "emails_generated": len([s for s in sponsors if s.get('email_status') == 'generated']),
-            "emails_sent": len([s for s in sponsors if s.get('email_status') == 'sent'])
+            "total": sponsors.get("total", 0),
+            "emails_generated": sponsors.get("status", {}).get("generated", 0),
+            "emails_sent": sponsors.get("status", {}).get("sent", 0),
+            # Approximate distinct counts and most common values from the ingest sketches
+            "estimates": await analytics_sketches.estimates(rollup_db, "sponsors")
         },
         "participants": {
-            "total": len(participants),
-            "certificates_generated": len([p for p in participants if p.get('certificate_generated')]),
-            "certificates_sent": len([p for p in participants if p.get('certificate_sent')])
+            "total": participants.get("total", 0),
+            "certificates_generated": participant_status.get("generated", 0) + participant_status.get("sent", 0),
+            "certificates_sent": participant_status.get("sent", 0),
+            "estimates": await analytics_sketches.estimates(rollup_db, "participants")
+        },
+        "certificate_generation": {
+            "generated": counters.get("success", 0),
+            "failed": counters.get("failure", 0),
+            "success_rate": round(counters.get("success", 0) / attempts * 100, 2) if attempts else None,
+            "generation_time_ms": histograms["total"].summary() if "total" in histograms else None
         },
         "system": {
             "mongodb_available": MONGO_AVAILABLE,
@@ -541,6 +811,106 @@ async def get_analytics():
         }
     }
 
+@api_router.get("/analytics/live")
+async def stream_live_analytics():
+    """Stream counter deltas to a dashboard as Server-Sent Events"""
+    async def snapshot() -> Dict[str, int]:
+        # Starting totals come from the rollups, so connecting never scans the collections
+        rollup_db = db if MONGO_AVAILABLE else None
+        sponsors = await analytics_rollups.totals(rollup_db, "sponsors")
+        participants = await analytics_rollups.totals(rollup_db, "participants")
+        sponsor_status = sponsors.get("status", {})
+        participant_status = participants.get("status", {})
+        return {
+            "sponsors_added": sponsors.get("total", 0),
+            "emails_generated": sponsor_status.get("generated", 0) + sponsor_status.get("sent", 0),
+            "emails_sent": sponsor_status.get("sent", 0),
+            "participants_added": participants.get("total", 0),
+            "certificates_generated": participant_status.get("generated", 0) + participant_status.get("sent", 0),
+            "certificates_sent": participant_status.get("sent", 0)
+        }
+    
+    return StreamingResponse(
+        live_feed.stream(snapshot),
+        media_type="text/event-stream",
+        # Proxies must not buffer or cache the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/analytics/rollups/{collection}")
+async def get_analytics_rollups(collection: str, granularity: str = "day", since: Optional[datetime] = None,
+                                until: Optional[datetime] = None):
+    """Get hourly or daily counters by status, country, institution and skill"""
+    if collection not in ("sponsors", "participants"):
+        raise HTTPException(status_code=404, detail="No rollups for this collection")
+    check_window(since, until, granularity)
+    
+    buckets = await analytics_rollups.read(
+        db if MONGO_AVAILABLE else None, collection, naive_utc(since), naive_utc(until), granularity
+    )
+    return {"collection": collection, "granularity": granularity, "buckets": buckets}
+
+@api_router.get("/analytics/sponsors")
+async def get_sponsor_analytics(request: Request, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                                granularity: str = "day"):
+    """Get sponsor dashboard analytics with compact chart payloads, optionally for a time window"""
+    require_analytics()
+    check_window(since, until, granularity)
+    return compact_json_response(request, await analytics_engine.get_sponsor_analytics(since, until, granularity))
+
+@api_router.get("/analytics/certificates")
+async def get_certificate_analytics(request: Request, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                                    granularity: str = "day"):
+    """Get certificate dashboard analytics with compact chart payloads, optionally for a time window"""
+    require_analytics()
+    check_window(since, until, granularity)
+    return compact_json_response(request, await analytics_engine.get_certificate_analytics(since, until, granularity))
+
+@api_router.get("/analytics/dashboard")
+async def get_dashboard_analytics(request: Request, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                                  granularity: str = "day"):
+    """Get combined sponsor and certificate analytics for the main dashboard, optionally for a time window"""
+    require_analytics()
+    check_window(since, until, granularity)
+    sponsors, certificates = await asyncio.gather(
+        analytics_engine.get_sponsor_analytics(since, until, granularity),
+        analytics_engine.get_certificate_analytics(since, until, granularity)
+    )
+    sponsor_overview = sponsors.get("overview", {})
+    certificate_overview = certificates.get("overview", {})
+    
+    return compact_json_response(request, {
+        "sponsors": sponsors,
+        "certificates": certificates,
+        "summary": {
+            "total_sponsors": sponsor_overview.get("total_sponsors", 0),
+            "total_participants": certificate_overview.get("total_participants", 0),
+            "completion_rate": certificate_overview.get("completion_rate", 0),
+            "conversion_rate": sponsor_overview.get("conversion_rate", 0)
+        }
+    })
+
+@api_router.get("/charts/advanced/{chart_type}")
+async def get_advanced_chart(request: Request, chart_type: str, data_source: str = "sponsors",
+                             since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Get an advanced chart visualization, optionally for a time window"""
+    require_analytics()
+    check_window(since, until)
+    result = await analytics_engine.get_advanced_charts(chart_type, data_source, since, until)
+    if "error" in result and not result.get("pending"):
+        raise HTTPException(status_code=400, detail=result["error"])
+    return compact_json_response(request, result)
+
+@api_router.get("/charts/templates/{name}")
+async def get_chart_template(request: Request, name: str):
+    """Get a Plotly layout template referenced by chart payloads"""
+    require_analytics()
+    template = chart_template(name)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Chart template not found")
+    # Templates only change with the Plotly version, so clients may keep them
+    return compact_json_response(request, template, {"Cache-Control": "public, max-age=86400"})
+
 @api_router.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -566,11 +936,69 @@ async def startup_event():
     logger.info(f"MongoDB: {'Connected' if MONGO_AVAILABLE else 'Not available'}")
     logger.info(f"PDF Generation: {'Available' if PDF_AVAILABLE else 'Not available'}")
     logger.info(f"Email: {'Configured' if EMAIL_ADDRESS and EMAIL_PASSWORD else 'Not configured'}")
+    
+    # Builder configurations are serialized once, before the first builder loads
+    for config in (certificate_customizer.builder_config if CUSTOMIZER_AVAILABLE else None,
+                   template_engine.builder_config if TEMPLATES_AVAILABLE else None):
+        if config is not None:
+            await config.load()
+    
+    app.state.live_feed_tasks = [asyncio.create_task(live_feed.run(LIVE_FEED_INTERVAL))]
+    if MONGO_AVAILABLE and LIVE_FEED_CHANGE_STREAM:
+        app.state.live_feed_tasks.append(asyncio.create_task(run_change_stream(live_feed, db)))
+    
+    if MONGO_AVAILABLE:
+        app.state.metrics_flush_task = asyncio.create_task(
+            run_periodic_flush(certificate_metrics, db, METRICS_FLUSH_INTERVAL)
+        )
+        try:
+            await template_usage.ensure_indexes(db)
+        except Exception as e:
+            logger.warning(f"Template usage indexes could not be created: {e}")
+        # Template render events share the metrics flush interval
+        app.state.usage_flush_task = asyncio.create_task(
+            run_periodic_flush(template_usage, db, METRICS_FLUSH_INTERVAL)
+        )
+        try:
+            await analytics_rollups.ensure_indexes(db)
+            await analytics_rollups.reconcile(db)
+        except Exception as e:
+            logger.warning(f"Analytics rollups could not be rebuilt: {e}")
+        app.state.rollup_task = asyncio.create_task(
+            run_periodic_rollups(analytics_rollups, db, METRICS_FLUSH_INTERVAL, ROLLUP_RECONCILE_INTERVAL)
+        )
+        try:
+            await analytics_sketches.ensure_indexes(db)
+            await analytics_sketches.reconcile(db)
+        except Exception as e:
+            logger.warning(f"Analytics sketches could not be rebuilt: {e}")
+        # Same flush and rebuild cycle as the rollups
+        app.state.sketch_task = asyncio.create_task(
+            run_periodic_rollups(analytics_sketches, db, METRICS_FLUSH_INTERVAL, ROLLUP_RECONCILE_INTERVAL)
+        )
+        if ANALYTICS_AVAILABLE:
+            try:
+                await analytics_engine.ensure_indexes()
+            except Exception as e:
+                logger.warning(f"Analytics time indexes could not be created: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown"""
     logger.info("Hackfinity Platform API shutting down...")
+    
+    for task in app.state.live_feed_tasks:
+        task.cancel()
+    
+    if MONGO_AVAILABLE:
+        app.state.metrics_flush_task.cancel()
+        app.state.usage_flush_task.cancel()
+        app.state.rollup_task.cancel()
+        app.state.sketch_task.cancel()
+        await certificate_metrics.flush(db)
+        await template_usage.flush(db)
+        await analytics_rollups.flush(db)
+        await analytics_sketches.flush(db)
 
 if __name__ == "__main__":
     import uvicorn
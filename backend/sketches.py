@@ -0,0 +1,346 @@
+"""
+Streaming Analytics Sketches for Hackfinity
+HyperLogLog distinct counts and Space-Saving heavy hitters, kept up to date on
+ingest with bounded memory and merged across workers through MongoDB
+"""
+
+from typing import Dict, List, Optional, Any, Tuple
+from collections import Counter
+from datetime import datetime
+import hashlib
+import logging
+import math
+import threading
+import uuid
+import numpy as np
+from pymongo.errors import DuplicateKeyError
+from rollups import RECONCILE_LEASE_SECONDS, ROLLUP_DIMENSIONS, SOURCE_PROJECTION, acquire_lease
+
+logger = logging.getLogger(__name__)
+
+# Sketched fields per collection: distinct counts and most common values
+SKETCH_FIELDS = {
+    "sponsors": {"distinct": ["country", "email"], "top": ["country"]},
+    "participants": {"distinct": ["institution", "country", "email"], "top": ["institution", "skill", "country"]},
+}
+
+# Attempts at merging a sketch into its stored copy before it is kept for the next flush
+FLUSH_RETRIES = 5
+
+
+class HyperLogLog:
+    """Distinct count estimate in 2^precision one-byte registers (~1.04 / sqrt(2^precision) error)"""
+
+    def __init__(self, precision: int = 12, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.registers = (np.frombuffer(registers, dtype=np.uint8).copy() if registers is not None
+                          else np.zeros(1 << precision, dtype=np.uint8))
+
+    def add(self, value: str):
+        x = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        # Position of the first 1-bit after the index bits
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small cardinalities: linear counting is more accurate
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_state(self) -> Dict[str, Any]:
+        return {"precision": self.precision, "registers": self.registers.tobytes()}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "HyperLogLog":
+        return cls(state["precision"], bytes(state["registers"]))
+
+
+class SpaceSaving:
+    """Most common values with at most capacity counters; counts overestimate by at most their error"""
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        # value -> [count, error]
+        self.counters: Dict[str, List[int]] = {}
+
+    def add(self, value: str, weight: int = 1):
+        counter = self.counters.get(value)
+        if counter is not None:
+            counter[0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[value] = [weight, 0]
+        else:
+            # Replace the smallest counter; the new value inherits its count as error
+            smallest = min(self.counters, key=lambda item: self.counters[item][0])
+            floor = self.counters.pop(smallest)[0]
+            self.counters[value] = [floor + weight, floor]
+
+    def _floor(self) -> int:
+        """Upper bound on the count of any value without a counter"""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        floors = (self._floor(), other._floor())
+        merged: Dict[str, List[int]] = {}
+        for value in set(self.counters) | set(other.counters):
+            count, error = 0, 0
+            for sketch, floor in zip((self, other), floors):
+                counter = sketch.counters.get(value)
+                if counter is not None:
+                    count += counter[0]
+                    error += counter[1]
+                else:
+                    count += floor
+                    error += floor
+            merged[value] = [count, error]
+        kept = sorted(merged, key=lambda value: merged[value][0], reverse=True)[:self.capacity]
+        self.counters = {value: merged[value] for value in kept}
+        return self
+
+    def top(self, k: int = 10) -> List[Tuple[str, int]]:
+        ranked = sorted(self.counters.items(), key=lambda item: item[1][0], reverse=True)
+        return [(value, counter[0]) for value, counter in ranked[:k]]
+
+    def to_state(self) -> Dict[str, Any]:
+        # A list, since values are not safe to use as MongoDB field names
+        return {"capacity": self.capacity, "items": [[value, c[0], c[1]] for value, c in self.counters.items()]}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "SpaceSaving":
+        sketch = cls(state["capacity"])
+        sketch.counters = {value: [count, error] for value, count, error in state["items"]}
+        return sketch
+
+    @classmethod
+    def from_counts(cls, counts: Counter, capacity: int = 100) -> "SpaceSaving":
+        """Exact summary of known counts, used when rebuilding from the source documents"""
+        sketch = cls(capacity)
+        sketch.counters = {value: [count, 0] for value, count in counts.most_common(capacity)}
+        return sketch
+
+
+SKETCH_TYPES = {"distinct": HyperLogLog, "top": SpaceSaving}
+
+
+def sketch_values(collection: str, doc: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Values of each sketched field of a document"""
+    values = ROLLUP_DIMENSIONS[collection](doc)
+    email = str(doc.get('email') or "").strip().lower()
+    if email:
+        values["email"] = [email]
+    return values
+
+
+class AnalyticsSketches:
+    """Per-collection sketches, buffered in memory and merged into MongoDB on flush"""
+
+    def __init__(self, collection_name: str = "analytics_sketches", precision: int = 12, capacity: int = 100):
+        self.collection_name = collection_name
+        self.precision = precision
+        self.capacity = capacity
+        # (collection, kind, field) -> sketch of writes not merged yet
+        self._pending: Dict[Tuple[str, str, str], Any] = {}
+        # (collection, kind, field) -> when its pending sketch received its first value
+        self._since: Dict[Tuple[str, str, str], datetime] = {}
+        # Merged sketches when running without MongoDB
+        self._memory: Dict[Tuple[str, str, str], Any] = {}
+        self._lock = threading.Lock()
+        # Lease holder id of this worker
+        self.worker_id = uuid.uuid4().hex
+
+    def _new(self, kind: str):
+        return HyperLogLog(self.precision) if kind == "distinct" else SpaceSaving(self.capacity)
+
+    def _keys(self, collection: str) -> List[Tuple[str, str, str]]:
+        fields = SKETCH_FIELDS[collection]
+        return [(collection, kind, field) for kind in ("distinct", "top") for field in fields[kind]]
+
+    def record_insert(self, collection: str, doc: Dict[str, Any]):
+        """Add a newly stored document to the sketches"""
+        if collection not in SKETCH_FIELDS:
+            return
+        values = sketch_values(collection, doc)
+        with self._lock:
+            for key in self._keys(collection):
+                for value in values.get(key[2], []):
+                    sketch = self._pending.get(key)
+                    if sketch is None:
+                        sketch = self._pending[key] = self._new(key[1])
+                        self._since[key] = datetime.utcnow()
+                    sketch.add(value)
+
+    def _drain(self) -> Tuple[Dict[Tuple[str, str, str], Any], Dict[Tuple[str, str, str], datetime]]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            since, self._since = self._since, {}
+        return pending, since
+
+    def _requeue(self, key: Tuple[str, str, str], sketch, since: datetime):
+        with self._lock:
+            current = self._pending.get(key)
+            self._pending[key] = sketch.merge(current) if current is not None else sketch
+            self._since[key] = min(since, self._since.get(key, since))
+
+    def _discard(self, collection: str):
+        """Drop a collection's pending sketches, e.g. once a rebuild has read its documents"""
+        with self._lock:
+            for key in self._keys(collection):
+                self._pending.pop(key, None)
+                self._since.pop(key, None)
+
+    @staticmethod
+    def _doc_id(key: Tuple[str, str, str]) -> str:
+        return ":".join(key)
+
+    async def ensure_indexes(self, db):
+        await getattr(db, self.collection_name).create_index([("collection", 1)])
+
+    async def _merge_stored(self, db, key: Tuple[str, str, str], sketch, since: Optional[datetime] = None,
+                            rebuilt_at: Optional[datetime] = None) -> bool:
+        """Merge a sketch into its stored copy with optimistic versioning
+
+        With rebuilt_at the sketch replaces the stored copy instead, as a rebuild
+        from documents read at that time. Pending heavy-hitter counts that started
+        before the stored copy was rebuilt are already in it and are dropped;
+        distinct sketches merge idempotently and are always merged.
+        """
+        target = getattr(db, self.collection_name)
+        collection, kind, field = key
+        for _ in range(FLUSH_RETRIES):
+            stored = await target.find_one({"_id": self._doc_id(key)})
+            version = stored["version"] if stored else 0
+            fields = {"collection": collection, "kind": kind, "field": field}
+            if rebuilt_at is not None:
+                fields.update(state=sketch.to_state(), rebuilt_at=rebuilt_at)
+            elif stored and kind == "top" and since is not None and stored.get("rebuilt_at") and since <= stored["rebuilt_at"]:
+                return True
+            else:
+                merged = SKETCH_TYPES[kind].from_state(stored["state"]).merge(sketch) if stored else sketch
+                fields["state"] = merged.to_state()
+            try:
+                result = await target.update_one(
+                    {"_id": self._doc_id(key), "version": version},
+                    {"$set": dict(fields, version=version + 1)},
+                    upsert=stored is None
+                )
+            except DuplicateKeyError:
+                # Another worker created the document first
+                continue
+            if stored is None or result.matched_count:
+                return True
+        return False
+
+    async def flush(self, db) -> int:
+        """Merge pending sketches into the stored ones"""
+        pending, since = self._drain()
+        if db is None:
+            with self._lock:
+                for key, sketch in pending.items():
+                    current = self._memory.get(key)
+                    self._memory[key] = current.merge(sketch) if current is not None else sketch
+            return len(pending)
+
+        merged = 0
+        for key, sketch in pending.items():
+            try:
+                if await self._merge_stored(db, key, sketch, since[key]):
+                    merged += 1
+                    continue
+                logger.warning(f"Sketch {self._doc_id(key)} kept changing, retrying on the next flush")
+            except Exception as e:
+                logger.warning(f"Sketch flush to {self.collection_name} failed: {e}")
+            self._requeue(key, sketch, since[key])
+        return merged
+
+    async def read(self, db, collection: str) -> Dict[Tuple[str, str], Any]:
+        """Sketches of a collection by (kind, field), including writes that are not flushed yet"""
+        sketches: Dict[Tuple[str, str], Any] = {}
+        if db is not None:
+            async for doc in getattr(db, self.collection_name).find({"collection": collection}):
+                sketches[(doc["kind"], doc["field"])] = SKETCH_TYPES[doc["kind"]].from_state(doc["state"])
+
+        with self._lock:
+            sources = [self._pending] if db is not None else [self._memory, self._pending]
+            for source in sources:
+                for (name, kind, field), sketch in source.items():
+                    if name != collection:
+                        continue
+                    # Merge into a copy so the buffered sketch is not changed by reading
+                    copy = SKETCH_TYPES[kind].from_state(sketch.to_state())
+                    current = sketches.get((kind, field))
+                    sketches[(kind, field)] = current.merge(copy) if current is not None else copy
+        return sketches
+
+    async def estimates(self, db, collection: str, top: int = 10) -> Dict[str, Any]:
+        """Approximate distinct counts and most common values of a collection"""
+        sketches = await self.read(db, collection)
+        fields = SKETCH_FIELDS[collection]
+        return {
+            "distinct": {field: sketches[("distinct", field)].count() if ("distinct", field) in sketches else 0
+                         for field in fields["distinct"]},
+            "top": {field: sketches[("top", field)].top(top) if ("top", field) in sketches else []
+                    for field in fields["top"]},
+        }
+
+    async def reconcile(self, db, memory_storage: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                        lease_seconds: float = RECONCILE_LEASE_SECONDS):
+        """Rebuild every sketch from the source documents, exactly for the top values
+
+        With MongoDB only the worker holding the reconcile lease rebuilds; the others just flush.
+        """
+        if db is not None and not await acquire_lease(db, self.collection_name, self.worker_id, lease_seconds):
+            await self.flush(db)
+            return
+
+        for collection in SKETCH_FIELDS:
+            if db is not None:
+                rebuilt_at = datetime.utcnow()
+                await self.flush(db)
+                projection = dict(SOURCE_PROJECTION, email=1)
+                documents = await getattr(db, collection).find({}, projection).to_list(length=None)
+                # Values recorded since the flush belong to documents the rebuild has just read
+                self._discard(collection)
+            else:
+                documents = (memory_storage or {}).get(collection, [])
+
+            distinct = {key: HyperLogLog(self.precision) for key in self._keys(collection) if key[1] == "distinct"}
+            counts = {key: Counter() for key in self._keys(collection) if key[1] == "top"}
+            for doc in documents:
+                values = sketch_values(collection, doc)
+                for key, sketch in distinct.items():
+                    for value in values.get(key[2], []):
+                        sketch.add(value)
+                for key, counter in counts.items():
+                    counter.update(values.get(key[2], []))
+            rebuilt = {**distinct, **{key: SpaceSaving.from_counts(counter, self.capacity)
+                                      for key, counter in counts.items()}}
+
+            if db is None:
+                with self._lock:
+                    for key in self._keys(collection):
+                        self._pending.pop(key, None)
+                        self._since.pop(key, None)
+                    self._memory.update(rebuilt)
+                continue
+
+            for key, sketch in rebuilt.items():
+                if not await self._merge_stored(db, key, sketch, rebuilt_at=rebuilt_at):
+                    logger.warning(f"Sketch {self._doc_id(key)} kept changing, rebuilding it on the next reconcile")
+
+
+# Shared by every request handler in the process
+analytics_sketches = AnalyticsSketches()
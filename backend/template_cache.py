@@ -0,0 +1,182 @@
+"""
+Template Caches for Hackfinity
+LRU of compiled Jinja templates keyed by stored template id and version, so a
+mail merge parses and compiles each template once instead of once per recipient,
+read-through catalogs of active templates indexed by category and type, and
+builder configurations serialized once per process
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from chart_cache import DataVersions, data_versions
+
+# Template fields rendered for every recipient
+TEMPLATE_PARTS = ("subject", "content", "html_content")
+
+
+class CompiledTemplate:
+    """Compiled subject, text and HTML parts of one stored template version"""
+
+    def __init__(self, key: Tuple[Hashable, ...], template: Any, parts: Dict[str, Any]):
+        self.key = key
+        self.template = template
+        self.parts = parts
+
+    def render(self, variables: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        """Render every part; parts the template does not have are None"""
+        return {name: compiled.render(variables) if compiled is not None else None
+                for name, compiled in self.parts.items()}
+
+
+class CompiledTemplateCache:
+    """Compiled templates keyed by (template id, version, updated_at)"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Hashable, ...], CompiledTemplate]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(template: Dict[str, Any]) -> Tuple[Hashable, ...]:
+        updated_at = template.get("updated_at")
+        return (template["id"], template.get("version"), updated_at.isoformat() if hasattr(updated_at, "isoformat") else updated_at)
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[CompiledTemplate]:
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return compiled
+
+    def store(self, key: Tuple[Hashable, ...], compiled: CompiledTemplate):
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, template_id: str) -> int:
+        """Drop every cached version of a template; returns the number of entries removed"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == template_id]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TemplateCatalog:
+    """Validated active templates of a collection, reloaded when its data version changes
+    
+    Writes bump the collection's version through DataVersions, so other workers
+    reload within check_interval seconds. Usage counters are not writes to the
+    catalog and may lag until the next reload. Returned models are shared and
+    must not be modified.
+    """
+
+    def __init__(self, collection: str, model: Callable[..., Any], index_fields: Tuple[str, ...],
+                 versions: Optional[DataVersions] = None, check_interval: float = 1.0):
+        self.collection = collection
+        self.model = model
+        self.index_fields = index_fields
+        self.versions = versions or data_versions
+        self.check_interval = check_interval
+        self._version: Optional[int] = None
+        self._checked = 0.0
+        self._templates: List[Any] = []
+        self._indexes: Dict[str, Dict[Any, List[Any]]] = {}
+        self._lock: Optional[asyncio.Lock] = None
+        self.stats = {"hits": 0, "reloads": 0}
+
+    async def _current(self, db) -> List[Any]:
+        """Catalog for the current data version, reloading it from the collection if stale"""
+        now = time.monotonic()
+        if self._version is not None and now - self._checked < self.check_interval:
+            self.stats["hits"] += 1
+            return self._templates
+
+        version = await self.versions.get(db, self.collection)
+        if version == self._version:
+            self._checked = now
+            self.stats["hits"] += 1
+            return self._templates
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another request may have reloaded while this one waited
+            if version != self._version:
+                documents = await getattr(db, self.collection).find({"is_active": True}).to_list(length=None)
+                templates = [self.model(**document) for document in documents]
+                indexes: Dict[str, Dict[Any, List[Any]]] = {field: {} for field in self.index_fields}
+                for template in templates:
+                    for field in self.index_fields:
+                        indexes[field].setdefault(getattr(template, field), []).append(template)
+                self._templates, self._indexes, self._version = templates, indexes, version
+                self.stats["reloads"] += 1
+            self._checked = time.monotonic()
+        return self._templates
+
+    async def find(self, db, **filters: Optional[str]) -> List[Any]:
+        """Active templates matching every given indexed field; None filters are ignored"""
+        templates = await self._current(db)
+        for field, value in filters.items():
+            if value is None:
+                continue
+            if field not in self._indexes:
+                raise ValueError(f"{field} is not an indexed catalog field")
+            matches = self._indexes[field].get(value, [])
+            templates = matches if templates is self._templates else [t for t in templates if getattr(t, field) == value]
+        return list(templates)
+
+    async def invalidate(self, db):
+        """Mark the catalog changed after a write, for this worker and every other"""
+        await self.versions.bump(db, self.collection)
+        self._checked = 0.0
+
+
+class PrecomputedConfig:
+    """JSON configuration built once and kept as serialized bytes, a gzip copy and an ETag"""
+
+    def __init__(self, build: Callable[[], Awaitable[Dict[str, Any]]]):
+        self._build = build
+        self.body: Optional[bytes] = None
+        self.gzip_body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def load(self) -> "PrecomputedConfig":
+        """Build and serialize the configuration unless it is already built"""
+        if self.body is not None:
+            return self
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.body is None:
+                body = json.dumps(await self._build(), separators=(',', ':'), ensure_ascii=False, default=str).encode()
+                self.gzip_body = gzip.compress(body, compresslevel=9)
+                self.etag = hashlib.sha256(body).hexdigest()[:16]
+                self.body = body
+        return self
+
+    def invalidate(self):
+        """Rebuild on the next request, e.g. after fonts or presets change"""
+        self.body = None
+
+
+# Shared by every TemplateEngine in the process
+compiled_templates = CompiledTemplateCache(int(os.environ.get('TEMPLATE_CACHE_SIZE', '256')))
@@ -3,13 +3,39 @@ Advanced Template Management System for Hackfinity
 Supports various template types, customization, and dynamic content
 """
 
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterable, AsyncIterator, Deque, Dict, Hashable, Iterable, List, Optional, Any, Tuple, Union
 from pydantic import BaseModel, Field
-from datetime import datetime
+from datetime import date, datetime
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool as BrokenExecutor
+import asyncio
 import json
-from jinja2 import Environment, BaseLoader, meta
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from jinja2 import Environment, BaseLoader, FileSystemBytecodeCache, Template, meta, select_autoescape
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import uuid
+from template_cache import TEMPLATE_PARTS, CompiledTemplate, PrecomputedConfig, TemplateCatalog, compiled_templates
+from template_usage import template_usage
+
+logger = logging.getLogger(__name__)
+
+# Directory for compiled template bytecode; shared across restarts and workers when set
+TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR', '')
+
+# Bulk rendering: rows per pool task, pool sizes, and the batch size that moves rendering to processes
+RENDER_CHUNK_SIZE = 200
+RENDER_THREAD_WORKERS = int(os.environ.get('TEMPLATE_RENDER_THREAD_WORKERS', '4'))
+RENDER_PROCESS_WORKERS = int(os.environ.get('TEMPLATE_RENDER_PROCESS_WORKERS', '2'))
+RENDER_PROCESS_THRESHOLD = int(os.environ.get('TEMPLATE_RENDER_PROCESS_THRESHOLD', '5000'))
+
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+BOOLEAN_VALUES = {"true", "false", "yes", "no", "1", "0"}
 
 class TemplateVariable(BaseModel):
     """Represents a template variable"""
@@ -67,12 +93,146 @@ class AdvancedTemplate(BaseModel):
     rating: float = 0.0
     reviews: List[Dict[str, Any]] = []
 
+# Active message templates, shared by every TemplateEngine in the process
+template_catalog = TemplateCatalog("templates", AdvancedTemplate, ("category_id", "template_type"))
+
+
+def validate_variables(variables: List[TemplateVariable], row: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Row values with defaults applied, and the errors of values that do not fit their declared variable"""
+    values = dict(row)
+    errors = []
+    for variable in variables:
+        value = values.get(variable.name)
+        if value is None or value == "":
+            if variable.default_value is not None:
+                values[variable.name] = variable.default_value
+            elif variable.required:
+                errors.append(f"{variable.name} is required")
+            continue
+        
+        text = str(value).strip()
+        if variable.type == "email" and not EMAIL_PATTERN.match(text):
+            errors.append(f"{variable.name} is not a valid email address")
+        elif variable.type == "number" and not isinstance(value, (int, float)):
+            try:
+                float(text)
+            except ValueError:
+                errors.append(f"{variable.name} is not a number")
+        elif variable.type == "boolean" and not isinstance(value, bool) and text.lower() not in BOOLEAN_VALUES:
+            errors.append(f"{variable.name} is not a boolean")
+        elif variable.type == "date" and not isinstance(value, (date, datetime)):
+            try:
+                datetime.fromisoformat(text)
+            except ValueError:
+                errors.append(f"{variable.name} is not an ISO date")
+        elif variable.type == "select" and variable.options and text not in variable.options:
+            errors.append(f"{variable.name} must be one of: {', '.join(variable.options)}")
+        
+        if variable.validation_regex and not re.fullmatch(variable.validation_regex, text):
+            errors.append(f"{variable.name} does not match the required format")
+    return values, errors
+
+
+def render_rows(compiled: CompiledTemplate, start: int, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Validate and render a chunk of rows; failures are reported per row"""
+    results = []
+    for index, row in enumerate(rows, start):
+        started = time.perf_counter()
+        try:
+            values, errors = validate_variables(compiled.template.variables, row)
+            if errors:
+                results.append({"index": index, "success": False, "errors": errors})
+                continue
+            results.append({"index": index, "success": True, **compiled.render(values),
+                            "render_ms": round((time.perf_counter() - started) * 1000, 3)})
+        except Exception as e:
+            results.append({"index": index, "success": False, "errors": [f"Render failed: {e}"]})
+    return results
+
+
+_render_executors: Dict[bool, Executor] = {}
+_render_executor_lock = threading.Lock()
+
+
+def get_render_executor(heavy: bool = False) -> Executor:
+    """Shared process pool for large batches, thread pool for everything else"""
+    heavy = heavy and RENDER_PROCESS_WORKERS > 0
+    with _render_executor_lock:
+        executor = _render_executors.get(heavy)
+        if executor is None:
+            if heavy:
+                # Spawned workers do not inherit the server's threads and client connections
+                executor = ProcessPoolExecutor(max_workers=RENDER_PROCESS_WORKERS,
+                                               mp_context=multiprocessing.get_context("spawn"))
+            else:
+                executor = ThreadPoolExecutor(max_workers=RENDER_THREAD_WORKERS, thread_name_prefix="template-render")
+            _render_executors[heavy] = executor
+        return executor
+
+
+def reset_render_executor(heavy: bool = False):
+    """Drop a broken pool so the next batch creates a fresh one"""
+    with _render_executor_lock:
+        executor = _render_executors.pop(heavy and RENDER_PROCESS_WORKERS > 0, None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def template_part_name(template_id: str, part: str) -> str:
+    """Name a template part is compiled under; the HTML part gets a .html name so it is autoescaped"""
+    return f"{template_id}/{part}.html" if part == "html_content" else f"{template_id}/{part}"
+
+
+# Engine of a render worker process, created by its first chunk and reused by the rest
+_worker_engine: Optional["TemplateEngine"] = None
+
+
+def _render_rows_in_process(template: AdvancedTemplate, key: Tuple[Hashable, ...], start: int,
+                            rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Worker process entry point: compiling only needs an engine without a database"""
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = TemplateEngine(None)
+    return render_rows(_worker_engine.compile_template(template, key), start, rows)
+
+
+async def _chunks(rows: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]], size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Group a sync or async stream of rows into lists of at most size rows"""
+    chunk = []
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    else:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
 class TemplateEngine:
     """Advanced template engine with Jinja2 and custom features"""
     
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, bytecode_cache_dir: Optional[str] = None):
         self.db = db
-        self.jinja_env = Environment(loader=BaseLoader())
+        bytecode_cache_dir = bytecode_cache_dir if bytecode_cache_dir is not None else TEMPLATE_BYTECODE_CACHE_DIR
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+        self.jinja_env = Environment(
+            loader=BaseLoader(),
+            # Only parts compiled under a .html name escape variables; subject and text stay verbatim
+            autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=False, default=False),
+            bytecode_cache=FileSystemBytecodeCache(bytecode_cache_dir) if bytecode_cache_dir else None
+        )
+        self.compiled = compiled_templates
+        self.catalog = template_catalog
+        self.usage = template_usage
+        # Static, so it is built and serialized once per engine
+        self.builder_config = PrecomputedConfig(self.get_template_builder_config)
         
         # Add custom filters
         self.jinja_env.filters['format_date'] = self._format_date
@@ -130,17 +290,7 @@ class TemplateEngine:
     
     async def get_templates(self, category_id: Optional[str] = None, template_type: Optional[str] = None) -> List[AdvancedTemplate]:
         """Get templates with optional filtering"""
-        query = {"is_active": True}
-        
-        if category_id:
-            query["category_id"] = category_id
-        if template_type:
-            query["template_type"] = template_type
-            
-        cursor = self.db.templates.find(query)
-        templates = await cursor.to_list(length=None)
-        
-        return [AdvancedTemplate(**template) for template in templates]
+        return await self.catalog.find(self.db, category_id=category_id or None, template_type=template_type or None)
     
     async def create_template(self, template: AdvancedTemplate) -> AdvancedTemplate:
         """Create a new template"""
@@ -150,6 +300,7 @@ class TemplateEngine:
         # Save to database
         template_dict = template.dict()
         await self.db.templates.insert_one(template_dict)
+        await self.catalog.invalidate(self.db)
         
         return template
     
@@ -163,6 +314,8 @@ class TemplateEngine:
         )
         
         if result.modified_count:
+            self.compiled.invalidate(template_id)
+            await self.catalog.invalidate(self.db)
             template_data = await self.db.templates.find_one({"id": template_id})
             return AdvancedTemplate(**template_data)
         
@@ -175,8 +328,111 @@ class TemplateEngine:
             {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
         )
         
+        self.compiled.invalidate(template_id)
+        if result.modified_count:
+            await self.catalog.invalidate(self.db)
         return result.modified_count > 0
     
+    def _compile_source(self, name: str, source: str) -> Template:
+        """Compile template source, reusing bytecode from the on-disk cache when configured"""
+        bytecode_cache = self.jinja_env.bytecode_cache
+        if bytecode_cache is None:
+            # Compiled under its name, which from_string drops, so autoescape can select on it
+            code = self.jinja_env.compile(source, name)
+        else:
+            # Same steps as BaseLoader.load, which from_string skips
+            bucket = bytecode_cache.get_bucket(self.jinja_env, name, None, source)
+            code = bucket.code
+            if code is None:
+                code = self.jinja_env.compile(source, name)
+                bucket.code = code
+                bytecode_cache.set_bucket(bucket)
+        return self.jinja_env.template_class.from_code(self.jinja_env, code, self.jinja_env.make_globals(None))
+    
+    def compile_template(self, template: AdvancedTemplate, key: Tuple[Hashable, ...]) -> CompiledTemplate:
+        """Compiled parts of a template version, from the cache or compiled now"""
+        compiled = self.compiled.get(key)
+        if compiled is None:
+            parts = {part: self._compile_source(template_part_name(template.id, part), getattr(template, part)) if getattr(template, part) else None
+                     for part in TEMPLATE_PARTS}
+            compiled = CompiledTemplate(key, template, parts)
+            self.compiled.store(key, compiled)
+        return compiled
+    
+    async def get_compiled_template(self, template_id: str) -> CompiledTemplate:
+        """Compiled parts of an active stored template, compiled once per template version"""
+        template_data = await self.db.templates.find_one({"id": template_id, "is_active": True})
+        if not template_data:
+            raise ValueError(f"Template {template_id} not found")
+        return self.compile_template(AdvancedTemplate(**template_data), self.compiled.make_key(template_data))
+    
+    async def render_template(self, template_id: str, variables: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Optional[str]]:
+        """Render the subject, text and HTML of a stored template"""
+        compiled = await self.get_compiled_template(template_id)
+        started = time.perf_counter()
+        try:
+            rendered = compiled.render(variables)
+        except Exception:
+            self.usage.record(template_id, success=False, user_id=user_id)
+            raise
+        self.usage.record(template_id, True, (time.perf_counter() - started) * 1000, user_id)
+        return rendered
+    
+    async def render_batch(self, template_id: str, rows: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+                           chunk_size: int = RENDER_CHUNK_SIZE, user_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Render a template for every row of variables, yielding results in row order
+        
+        The template is loaded and compiled once. Rows are rendered in chunks on the
+        render pools, in worker processes once the batch passes RENDER_PROCESS_THRESHOLD
+        rows. A row that fails validation or rendering yields its errors instead of
+        stopping the batch. Every row is counted in the template's usage rollups.
+        """
+        compiled = await self.get_compiled_template(template_id)
+        in_flight: Deque[Tuple[int, List[Dict[str, Any]], asyncio.Future]] = deque()
+        max_in_flight = 2 * max(RENDER_THREAD_WORKERS, RENDER_PROCESS_WORKERS, 1)
+        start = 0
+        
+        async for chunk in _chunks(rows, chunk_size):
+            heavy = start + len(chunk) > RENDER_PROCESS_THRESHOLD
+            in_flight.append((start, chunk, asyncio.wrap_future(self._submit_render(compiled, start, chunk, heavy))))
+            start += len(chunk)
+            # Bounded so a long stream of rows is never held in memory all at once
+            while len(in_flight) >= max_in_flight:
+                for result in await self._chunk_results(compiled, *in_flight.popleft()):
+                    self.usage.record(template_id, result["success"], result.get("render_ms"), user_id)
+                    yield result
+        
+        while in_flight:
+            for result in await self._chunk_results(compiled, *in_flight.popleft()):
+                self.usage.record(template_id, result["success"], result.get("render_ms"), user_id)
+                yield result
+    
+    def _submit_render(self, compiled: CompiledTemplate, start: int, rows: List[Dict[str, Any]], heavy: bool = False) -> Future:
+        """Render a chunk of rows in the worker pools instead of on the event loop"""
+        if heavy:
+            try:
+                # Compiled templates cannot be pickled; workers compile the template once per process
+                return get_render_executor(heavy=True).submit(_render_rows_in_process, compiled.template, compiled.key, start, rows)
+            except RuntimeError:
+                # BrokenProcessPool, or a pool already shut down by a reset
+                logger.warning("Template render process pool unavailable, rendering in threads")
+                reset_render_executor(heavy=True)
+        try:
+            return get_render_executor().submit(render_rows, compiled, start, rows)
+        except RuntimeError:
+            # The thread pool was shut down; retry once on a fresh one
+            reset_render_executor()
+            return get_render_executor().submit(render_rows, compiled, start, rows)
+    
+    async def _chunk_results(self, compiled: CompiledTemplate, start: int, rows: List[Dict[str, Any]],
+                             waiting: asyncio.Future) -> List[Dict[str, Any]]:
+        try:
+            return await waiting
+        except BrokenExecutor:
+            # A worker process died; rebuild the pool and render this chunk in a thread
+            reset_render_executor(heavy=True)
+            return await asyncio.wrap_future(self._submit_render(compiled, start, rows))
+    
     async def create_advanced_template(self, template_data: Dict[str, Any]) -> AdvancedTemplate:
         """Create a new advanced template with rich features"""
         template = AdvancedTemplate(**template_data)
@@ -281,7 +537,7 @@ class TemplateEngine:
                 "card_layout": {
                     "name": "Card Layout",
                     "preview": "/static/layouts/card.png",
-                    "structure": {"style": "card", "padding": "40px", "border_radius": "12px", "shadow": true}
+                    "structure": {"style": "card", "padding": "40px", "border_radius": "12px", "shadow": True}
                 }
             },
             "color_schemes": {
@@ -413,30 +669,18 @@ class TemplateEngine:
         if not template:
             raise ValueError(f"Template {template_id} not found")
         
-        # Get usage statistics
-        usage_stats = await self.db.template_usage.aggregate([
-            {"$match": {"template_id": template_id}},
-            {"$group": {
-                "_id": "$template_id",
-                "total_uses": {"$sum": 1},
-                "unique_users": {"$addToSet": "$user_id"},
-                "avg_generation_time": {"$avg": "$generation_time_ms"},
-                "success_rate": {"$avg": {"$cond": [{"$eq": ["$status", "success"]}, 1, 0]}}
-            }}
-        ]).to_list(length=1)
+        # Daily rollups: one document per day of use, unique users from merged sketches
+        usage_stats = await self.usage.summary(self.db, template_id)
         
         return {
             "template_id": template_id,
             "template_name": template["name"],
-            "usage_statistics": usage_stats[0] if usage_stats else {},
+            "usage_statistics": usage_stats,
             "performance_metrics": {
                 "avg_rating": template.get("rating", 0),
                 "total_reviews": len(template.get("reviews", [])),
-                "last_used": await self._get_last_usage_date(template_id),
-                "conversion_rate": await self._calculate_conversion_rate(template_id)
-            },
-            "popular_variables": await self._get_popular_variables(template_id),
-            "geographic_usage": await self._get_geographic_usage(template_id)
+                "last_used": usage_stats["last_used"]
+            }
         }
     
     async def export_template(self, template_id: str, format: str = "json") -> Dict[str, Any]:
@@ -454,4 +698,27 @@ class TemplateEngine:
         else:
             raise ValueError(f"Unsupported export format: {format}")
 
-    # ...existing helper methods continue...
+    @staticmethod
+    def _format_date(value: Any, format: str = "%B %d, %Y") -> str:
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                return value
+        return value.strftime(format) if hasattr(value, "strftime") else str(value)
+    
+    @staticmethod
+    def _format_currency(value: Any, symbol: str = "$") -> str:
+        try:
+            return f"{symbol}{float(value):,.2f}"
+        except (TypeError, ValueError):
+            return str(value)
+    
+    @staticmethod
+    def _capitalize_words(value: Any) -> str:
+        return " ".join(word.capitalize() for word in str(value).split())
+    
+    @staticmethod
+    def _truncate_text(value: Any, length: int = 100, suffix: str = "...") -> str:
+        text = str(value)
+        return text if len(text) <= length else text[:length - len(suffix)].rstrip() + suffix
@@ -0,0 +1,219 @@
+"""
+Template Usage Rollups for Hackfinity
+Render events buffered in memory and flushed in batches into per-template daily
+rollups, so template analytics read one document per day of usage
+"""
+
+from typing import Dict, Optional, Any, Tuple
+from datetime import datetime
+import logging
+import math
+import threading
+from pymongo.errors import DuplicateKeyError
+from sketches import FLUSH_RETRIES, HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+# HyperLogLog precision of the per-day user sketches (1 KB, ~3% error)
+USAGE_HLL_PRECISION = 10
+
+# Numeric fields of a daily rollup, merged by addition
+USAGE_COUNTERS = ("count", "successes", "time_count", "time_sum", "time_sq_sum")
+
+
+def _day_of(at: datetime) -> datetime:
+    return at.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+class DailyUsage:
+    """Usage of one template on one day: counts, render time moments and distinct users"""
+
+    def __init__(self, precision: int = USAGE_HLL_PRECISION):
+        self.count = 0
+        self.successes = 0
+        self.time_count = 0
+        self.time_sum = 0.0
+        self.time_sq_sum = 0.0
+        self.users = HyperLogLog(precision)
+        self.last_used: Optional[datetime] = None
+
+    def add(self, success: bool, generation_time_ms: Optional[float], user_id: Optional[str], at: datetime):
+        self.count += 1
+        self.successes += int(success)
+        if generation_time_ms is not None:
+            self.time_count += 1
+            self.time_sum += generation_time_ms
+            self.time_sq_sum += generation_time_ms * generation_time_ms
+        if user_id:
+            self.users.add(str(user_id))
+        if self.last_used is None or at > self.last_used:
+            self.last_used = at
+
+    def merge(self, other: "DailyUsage") -> "DailyUsage":
+        for field in USAGE_COUNTERS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.users.merge(other.users)
+        if other.last_used is not None and (self.last_used is None or other.last_used > self.last_used):
+            self.last_used = other.last_used
+        return self
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "DailyUsage":
+        usage = cls()
+        for field in USAGE_COUNTERS:
+            setattr(usage, field, doc.get(field, 0))
+        usage.users = HyperLogLog.from_state(doc["users"])
+        usage.last_used = doc.get("last_used")
+        return usage
+
+
+def usage_summary(days: Dict[datetime, DailyUsage]) -> Dict[str, Any]:
+    """Totals over daily rollups, plus the per-day series"""
+    total = DailyUsage()
+    for usage in days.values():
+        total.merge(usage)
+    mean = total.time_sum / total.time_count if total.time_count else None
+    # Population variance from the summed squares; clamped against rounding below zero
+    variance = max(total.time_sq_sum / total.time_count - mean * mean, 0.0) if total.time_count else None
+    return {
+        "total_uses": total.count,
+        "unique_users": total.users.count(),
+        "success_rate": round(total.successes / total.count, 4) if total.count else None,
+        "avg_generation_time": round(mean, 3) if mean is not None else None,
+        "generation_time_stddev": round(math.sqrt(variance), 3) if variance is not None else None,
+        "last_used": total.last_used,
+        "daily": [{
+            "day": day.strftime('%Y-%m-%d'),
+            "uses": usage.count,
+            "successes": usage.successes,
+            "unique_users": usage.users.count(),
+            "avg_generation_time": round(usage.time_sum / usage.time_count, 3) if usage.time_count else None
+        } for day, usage in sorted(days.items())]
+    }
+
+
+class TemplateUsage:
+    """Per-template daily usage rollups, buffered in memory and merged into MongoDB on flush"""
+
+    def __init__(self, collection_name: str = "template_usage_daily", max_pending: int = 1000):
+        self.collection_name = collection_name
+        self.max_pending = max_pending
+        # (template id, day) -> usage not merged yet
+        self._pending: Dict[Tuple[str, datetime], DailyUsage] = {}
+        # Merged rollups when running without MongoDB
+        self._memory: Dict[Tuple[str, datetime], DailyUsage] = {}
+        # Renders not counted because the buffer was full, in total and since the last flush
+        self.dropped = 0
+        self._dropped_since_flush = 0
+        self._lock = threading.Lock()
+
+    def record(self, template_id: str, success: bool = True, generation_time_ms: Optional[float] = None,
+               user_id: Optional[str] = None, at: Optional[datetime] = None):
+        """Count one render of a template"""
+        at = at or datetime.utcnow()
+        key = (template_id, _day_of(at))
+        with self._lock:
+            usage = self._pending.get(key)
+            if usage is None:
+                # Bound memory when many templates are used between flushes
+                if len(self._pending) >= self.max_pending:
+                    self.dropped += 1
+                    self._dropped_since_flush += 1
+                    if self._dropped_since_flush == 1:
+                        logger.warning(f"Template usage buffer is full ({self.max_pending} template days), "
+                                       f"dropping renders until the next flush")
+                    return
+                usage = self._pending[key] = DailyUsage()
+            usage.add(success, generation_time_ms, user_id, at)
+
+    def _drain(self) -> Dict[Tuple[str, datetime], DailyUsage]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            dropped, self._dropped_since_flush = self._dropped_since_flush, 0
+        if dropped:
+            logger.warning(f"Dropped {dropped} template renders from usage rollups since the last flush")
+        return pending
+
+    def _requeue(self, key: Tuple[str, datetime], usage: DailyUsage):
+        with self._lock:
+            current = self._pending.get(key)
+            self._pending[key] = usage.merge(current) if current is not None else usage
+
+    async def ensure_indexes(self, db):
+        await getattr(db, self.collection_name).create_index([("template_id", 1), ("day", 1)], unique=True)
+
+    async def _merge_stored(self, db, key: Tuple[str, datetime], usage: DailyUsage) -> bool:
+        """Add counters and merge the user sketch into the stored day with optimistic versioning"""
+        target = getattr(db, self.collection_name)
+        template_id, day = key
+        for _ in range(FLUSH_RETRIES):
+            stored = await target.find_one({"template_id": template_id, "day": day}, {"users": 1, "version": 1, "last_used": 1})
+            version = stored["version"] if stored else 0
+            users = HyperLogLog.from_state(stored["users"]).merge(usage.users) if stored else usage.users
+            last_used = max(filter(None, [usage.last_used, stored.get("last_used") if stored else None]), default=None)
+            try:
+                result = await target.update_one(
+                    {"template_id": template_id, "day": day, "version": version},
+                    {"$inc": {field: getattr(usage, field) for field in USAGE_COUNTERS},
+                     "$set": {"users": users.to_state(), "last_used": last_used, "version": version + 1}},
+                    upsert=stored is None
+                )
+            except DuplicateKeyError:
+                # Another worker created the day first
+                continue
+            if stored is None or result.matched_count:
+                return True
+        return False
+
+    async def flush(self, db) -> int:
+        """Merge buffered usage into the stored daily rollups"""
+        pending = self._drain()
+        if db is None:
+            with self._lock:
+                for key, usage in pending.items():
+                    current = self._memory.get(key)
+                    self._memory[key] = current.merge(usage) if current is not None else usage
+            return len(pending)
+
+        merged = 0
+        for key, usage in pending.items():
+            try:
+                if await self._merge_stored(db, key, usage):
+                    merged += 1
+                    continue
+                logger.warning(f"Usage of template {key[0]} kept changing, retrying on the next flush")
+            except Exception as e:
+                logger.warning(f"Template usage flush to {self.collection_name} failed: {e}")
+            self._requeue(key, usage)
+        return merged
+
+    async def read(self, db, template_id: str, since: Optional[datetime] = None) -> Dict[datetime, DailyUsage]:
+        """Daily usage of a template, including renders that are not flushed yet"""
+        days: Dict[datetime, DailyUsage] = {}
+        since = _day_of(since) if since else None
+        if db is not None:
+            query: Dict[str, Any] = {"template_id": template_id}
+            if since:
+                query["day"] = {"$gte": since}
+            async for doc in getattr(db, self.collection_name).find(query):
+                days[doc["day"]] = DailyUsage.from_doc(doc)
+
+        with self._lock:
+            sources = [self._pending] if db is not None else [self._memory, self._pending]
+            for source in sources:
+                for (name, day), usage in source.items():
+                    if name != template_id or (since and day < since):
+                        continue
+                    # Merge into a copy so the buffered usage is not changed by reading
+                    copy = DailyUsage().merge(usage)
+                    current = days.get(day)
+                    days[day] = current.merge(copy) if current is not None else copy
+        return days
+
+    async def summary(self, db, template_id: str, since: Optional[datetime] = None) -> Dict[str, Any]:
+        """Usage totals and daily series of a template"""
+        return usage_summary(await self.read(db, template_id, since))
+
+
+# Shared by every TemplateEngine in the process
+template_usage = TemplateUsage()
@@ -24,7 +24,6 @@ def test_imports():
         
         # Test data processing libraries
         import pandas as pd
-        import matplotlib.pyplot as plt
         import plotly.express as px
         print("✓ Data processing libraries imported successfully")
         
@@ -0,0 +1,52 @@
+"""
+Time-windowed analytics over records stored by the server
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server
+from analytics import SPONSOR_SUMMARY
+from analytics_store import MemoryAnalyticsStore, MongoAnalyticsStore
+
+
+def store_sponsors(names):
+    for name in names:
+        sponsor = server.SponsorData(name=name, email=f"{name}@example.com", organization=name)
+        asyncio.run(server.store_data("sponsors", sponsor.dict()))
+
+
+def test_windowed_summary_reads_stored_sponsors(monkeypatch):
+    storage = {"sponsors": [], "participants": []}
+    monkeypatch.setattr(server, "MONGO_AVAILABLE", False)
+    monkeypatch.setattr(server, "memory_storage", storage)
+    store_sponsors(["acme", "globex"])
+
+    now = datetime.now(timezone.utc)
+    store = MemoryAnalyticsStore(storage)
+    summary = asyncio.run(store.summarize("sponsors", SPONSOR_SUMMARY, since=now - timedelta(hours=1),
+                                          until=now + timedelta(hours=1), granularity="hour"))
+    assert summary["total"] == 2
+    assert sum(n for _, n in summary["timeline"]) == 2
+    assert sum(map(sum, summary["heatmap"])) == 2
+
+    past = asyncio.run(store.summarize("sponsors", SPONSOR_SUMMARY, until=now - timedelta(days=1)))
+    assert past["total"] == 0
+
+
+def test_windowed_mongo_query_matches_stored_sponsors(monkeypatch):
+    mongomock_motor = __import__("pytest").importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["analytics_window"]
+    monkeypatch.setattr(server, "MONGO_AVAILABLE", True)
+    monkeypatch.setattr(server, "db", db)
+    store_sponsors(["initech"])
+
+    now = datetime.now(timezone.utc)
+    store = MongoAnalyticsStore(db)
+    frame = asyncio.run(store.load_frame("sponsors", ["email_status"], since=now - timedelta(hours=1)))
+    assert len(frame) == 1
+    assert len(asyncio.run(store.load_frame("sponsors", ["email_status"], until=now - timedelta(days=1)))) == 0
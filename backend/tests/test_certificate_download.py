@@ -0,0 +1,64 @@
+"""
+Certificate downloads: stored bytes, a stable issue date and the attachment header
+"""
+
+import asyncio
+import base64
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server
+from metrics import MetricsRegistry
+
+
+@pytest.fixture
+def memory_server(monkeypatch):
+    storage = {"sponsors": [], "participants": []}
+    metrics = MetricsRegistry("certificate_metrics_test")
+    monkeypatch.setattr(server, "MONGO_AVAILABLE", False)
+    monkeypatch.setattr(server, "memory_storage", storage)
+    monkeypatch.setattr(server, "certificate_metrics", metrics)
+    return storage, metrics
+
+
+def generations(metrics):
+    return metrics.pending(server.PARTICIPATION_CERTIFICATE)[1].get("success", 0)
+
+
+def test_download_serves_the_stored_certificate(memory_server):
+    storage, metrics = memory_server
+    stored = b"%PDF-1.4 issued certificate"
+    storage["participants"].append(server.ParticipantData(
+        name="Ada", email="ada@example.com", certificate_data=base64.b64encode(stored).decode()
+    ).dict())
+
+    response = asyncio.run(server.download_certificate(storage["participants"][0]["id"]))
+    assert response.body == stored
+    assert generations(metrics) == 0
+
+
+def test_download_keeps_the_first_issue_date(memory_server):
+    if not server.PDF_AVAILABLE:
+        pytest.skip("PDF generation not available")
+    storage, metrics = memory_server
+    participant = server.ParticipantData(name="Alan", email="alan@example.com").dict()
+    storage["participants"].append(participant)
+
+    first = asyncio.run(server.download_certificate(participant["id"]))
+    issued_on = storage["participants"][0]["issued_on"]
+    assert issued_on
+
+    second = asyncio.run(server.download_certificate(participant["id"]))
+    assert storage["participants"][0]["issued_on"] == issued_on
+    assert first.body[:4] == second.body[:4] == b"%PDF"
+    assert generations(metrics) == 0
+
+
+def test_attachment_disposition_escapes_the_fallback_name():
+    header = server.attachment_disposition('Zoë "O\'Neil" 张.pdf')
+    assert header.startswith('attachment; filename="Zoe _O\'Neil_ _.pdf"')
+    assert header.endswith("filename*=UTF-8''Zo%C3%AB%20%22O%27Neil%22%20%E5%BC%A0.pdf")
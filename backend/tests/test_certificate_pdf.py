@@ -0,0 +1,58 @@
+"""
+Precompiled PDF certificate layouts: field fitting, static form reuse and overflow
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+pytest.importorskip("reportlab")
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A6
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import Paragraph, Spacer
+
+from certificate_pdf import PdfCertificateLayout
+
+NAME_STYLE = ParagraphStyle("name", fontName="Helvetica-Bold", fontSize=24, leading=28)
+BODY_STYLE = ParagraphStyle("body", fontName="Helvetica", fontSize=12, leading=14)
+
+
+def layout(*static):
+    pdf = PdfCertificateLayout(A6)
+    pdf.add_static(Paragraph("Certificate of Participation", BODY_STYLE))
+    pdf.add_field(lambda v: v["name"], NAME_STYLE, sample="Ada Lovelace")
+    for flowable in static:
+        pdf.add_static(flowable)
+    return pdf.compile()
+
+
+def test_long_fields_shrink_before_they_are_clipped():
+    pdf = layout()
+    # Wraps at 24pt but fits on one line once shrunk
+    assert pdf.render({"name": "Augusta Ada King Lovelace"})[:4] == b"%PDF"
+    assert pdf.stats["truncated_fields"] == 0
+
+    pdf.render({"name": " ".join(["Wolfeschlegelsteinhausen"] * 8)})
+    assert pdf.stats["truncated_fields"] == 1
+
+
+def test_static_form_is_drawn_once_and_replayed(monkeypatch):
+    monkeypatch.setattr(rl_config, "invariant", 1)
+    pdf = layout(Paragraph("Hackfinity Team", BODY_STYLE))
+    first = pdf.render({"name": "Ada"})
+    second = pdf.render_batch([{"name": "Ada"}])
+    assert pdf.stats["static_form_draws"] == 1
+    assert first == second
+
+
+def test_static_content_taller_than_the_page_overflows():
+    text = " ".join(["Demonstrating excellence in AI innovation."] * 200)
+    pdf = layout(Spacer(1, 12), Paragraph(text, BODY_STYLE))
+    # The part that fits on the first page is kept, the rest is dropped
+    assert len(pdf._static) == 3
+    assert pdf.render({"name": "Ada"})[:4] == b"%PDF"
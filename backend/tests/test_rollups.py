@@ -0,0 +1,113 @@
+"""
+Hourly rollups: $inc flushes, status changes and reconcile across workers
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rollups import AnalyticsRollups
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+YESTERDAY = datetime.utcnow() - timedelta(days=1)
+
+
+def sponsor(status, at=YESTERDAY, **fields):
+    return dict({"timestamp": at, "email_status": status}, **fields)
+
+
+@pytest.fixture
+def db():
+    database = mongomock_motor.AsyncMongoMockClient()["rollups"]
+    asyncio.run(AnalyticsRollups().ensure_indexes(database))
+    return database
+
+
+def store(db, rollups, doc):
+    asyncio.run(db.sponsors.insert_one(dict(doc)))
+    rollups.record_insert("sponsors", doc)
+
+
+def test_flush_increments_buckets_and_moves_status_changes(db):
+    rollups = AnalyticsRollups()
+    store(db, rollups, sponsor("pending", country="India"))
+    store(db, rollups, sponsor("pending", additional_info={"Country": "Japan"}))
+    asyncio.run(rollups.flush(db))
+
+    rollups.record_change("sponsors", sponsor("pending"), sponsor("sent"))
+    totals = asyncio.run(rollups.totals(db, "sponsors"))
+    assert totals == {"total": 2, "status": {"pending": 1, "sent": 1}, "country": {"India": 1, "Japan": 1}}
+
+    asyncio.run(rollups.flush(db))
+    rows = asyncio.run(rollups.read(db, "sponsors", granularity="day"))
+    assert len(rows) == 1 and rows[0]["counters"]["status"] == {"pending": 1, "sent": 1}
+
+
+def test_reconcile_does_not_double_count_writes_during_rebuild(db):
+    rollups = AnalyticsRollups()
+    store(db, rollups, sponsor("pending"))
+    real_flush = rollups.flush
+
+    async def flush_then_change(target):
+        written = await real_flush(target)
+        # A status change stored after the pre-rebuild flush, before the documents are read
+        rollups.flush = real_flush
+        await db.sponsors.update_one({}, {"$set": {"email_status": "sent"}})
+        rollups.record_change("sponsors", sponsor("pending"), sponsor("sent"))
+        return written
+
+    rollups.flush = flush_then_change
+    asyncio.run(rollups.reconcile(db))
+    asyncio.run(rollups.flush(db))
+
+    assert asyncio.run(rollups.totals(db, "sponsors")) == {"total": 1, "status": {"sent": 1}}
+
+
+def test_other_workers_changes_already_in_a_rebuild_are_dropped(db):
+    rebuilding, other = AnalyticsRollups(), AnalyticsRollups()
+    store(db, rebuilding, sponsor("pending"))
+    asyncio.run(rebuilding.flush(db))
+
+    # Another worker changes the status and has not flushed when the rebuild reads the documents
+    asyncio.run(db.sponsors.update_one({}, {"$set": {"email_status": "sent"}}))
+    other.record_change("sponsors", sponsor("pending"), sponsor("sent"))
+    asyncio.run(rebuilding.reconcile(db))
+    asyncio.run(other.flush(db))
+
+    assert asyncio.run(rebuilding.totals(db, "sponsors")) == {"total": 1, "status": {"sent": 1}}
+
+    # Changes recorded after the rebuild are still applied
+    asyncio.run(db.sponsors.update_one({}, {"$set": {"email_status": "bounced"}}))
+    other.record_change("sponsors", sponsor("sent"), sponsor("bounced"))
+    asyncio.run(other.flush(db))
+    assert asyncio.run(rebuilding.totals(db, "sponsors")) == {"total": 1, "status": {"bounced": 1}}
+
+
+def test_only_the_lease_holder_rebuilds(db):
+    first, second = AnalyticsRollups(), AnalyticsRollups()
+    store(db, first, sponsor("pending"))
+    asyncio.run(first.reconcile(db))
+
+    # Drift the stored bucket; the second worker must not rebuild while the lease is held
+    asyncio.run(db.analytics_rollups.update_one({}, {"$inc": {"counters.total": 5}}))
+    asyncio.run(second.reconcile(db))
+    assert asyncio.run(second.totals(db, "sponsors"))["total"] == 6
+
+    asyncio.run(db.reconcile_leases.update_many({}, {"$set": {"expires": datetime.utcnow() - timedelta(seconds=1)}}))
+    asyncio.run(second.reconcile(db))
+    assert asyncio.run(second.totals(db, "sponsors"))["total"] == 1
+
+
+def test_memory_reconcile_replaces_counters():
+    rollups = AnalyticsRollups()
+    storage = {"sponsors": [sponsor("sent")], "participants": []}
+    rollups.record_insert("sponsors", sponsor("pending"))
+    rollups.record_insert("sponsors", sponsor("pending"))
+    asyncio.run(rollups.reconcile(None, storage))
+    assert asyncio.run(rollups.totals(None, "sponsors")) == {"total": 1, "status": {"sent": 1}}
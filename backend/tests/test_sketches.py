@@ -0,0 +1,130 @@
+"""
+Ingest sketches: institution values, merges and reconcile
+"""
+
+import asyncio
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server
+from analytics import CERTIFICATE_SUMMARY
+from analytics_store import MemoryAnalyticsStore, MongoAnalyticsStore
+from sketches import AnalyticsSketches, HyperLogLog, SpaceSaving
+
+
+def store_participants(rows):
+    """Store participants the way the CSV upload does, with the row kept in additional_info"""
+    for row in rows:
+        participant = server.ParticipantData(name=row["Name"], email=row["Email"], additional_info=row)
+        asyncio.run(server.store_data("participants", participant.dict()))
+
+
+@pytest.fixture
+def memory_server(monkeypatch):
+    storage = {"sponsors": [], "participants": []}
+    sketches = AnalyticsSketches()
+    monkeypatch.setattr(server, "MONGO_AVAILABLE", False)
+    monkeypatch.setattr(server, "memory_storage", storage)
+    monkeypatch.setattr(server, "analytics_sketches", sketches)
+    return storage, sketches
+
+
+def test_csv_institutions_reach_estimates_and_top_list(memory_server):
+    storage, sketches = memory_server
+    store_participants([
+        {"Name": "Ada", "Email": "ada@example.com", "Institution": "MIT"},
+        {"Name": "Alan", "Email": "alan@example.com", "Institution": " MIT "},
+        {"Name": "Grace", "Email": "grace@example.com", "College": "Yale"},
+    ])
+
+    estimates = asyncio.run(sketches.estimates(None, "participants"))
+    assert estimates["distinct"]["institution"] == 2
+    assert estimates["top"]["institution"][0] == ("MIT", 2)
+
+    # The windowed summary reads institutions the same way
+    summary = asyncio.run(MemoryAnalyticsStore(storage).summarize("participants", CERTIFICATE_SUMMARY))
+    assert summary["distinct"]["institution"] == 2
+    assert summary["top"]["institution"][0] == ("MIT", 2)
+
+
+def test_mongo_frame_resolves_csv_institutions():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["sketch_institutions"]
+    asyncio.run(db.participants.insert_many([
+        {"name": "Ada", "additional_info": {"Institution": "MIT"}},
+        {"name": "Grace", "institution": "Yale"},
+        {"name": "Alan"},
+    ]))
+    frame = asyncio.run(MongoAnalyticsStore(db).load_frame("participants", ["institution"]))
+    assert sorted(frame["institution"].dropna()) == ["MIT", "Yale"]
+
+
+def test_hyperloglog_merge_is_idempotent_and_close():
+    left, right = HyperLogLog(10), HyperLogLog(10)
+    for i in range(3000):
+        left.add(f"user-{i}")
+    for i in range(2000, 5000):
+        right.add(f"user-{i}")
+    merged = HyperLogLog.from_state(left.to_state()).merge(right)
+    assert abs(merged.count() - 5000) < 5000 * 0.1
+    assert merged.count() == HyperLogLog.from_state(merged.to_state()).merge(right).count()
+
+
+def test_space_saving_keeps_heavy_hitters():
+    sketch = SpaceSaving(capacity=5)
+    for value, count in [("a", 50), ("b", 30), ("c", 20)]:
+        sketch.add(value, count)
+    for i in range(40):
+        sketch.add(f"rare-{i}")
+    assert [value for value, _ in sketch.top(3)] == ["a", "b", "c"]
+    assert SpaceSaving.from_counts(Counter({"a": 3, "b": 1}), 5).top(1) == [("a", 3)]
+
+
+def test_reconcile_does_not_double_count_writes_during_rebuild():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["sketch_reconcile"]
+    sketches = AnalyticsSketches()
+    first = {"email": "ada@example.com", "additional_info": {"Institution": "MIT"}}
+    asyncio.run(db.participants.insert_one(dict(first)))
+    sketches.record_insert("participants", first)
+
+    real_flush = sketches.flush
+
+    async def flush_then_store(target):
+        merged = await real_flush(target)
+        # Stored after the pre-rebuild flush but before the rebuild reads the collection
+        late = {"email": "alan@example.com", "additional_info": {"Institution": "MIT"}}
+        await db.participants.insert_one(dict(late))
+        sketches.record_insert("participants", late)
+        return merged
+
+    sketches.flush = flush_then_store
+    asyncio.run(sketches.reconcile(db))
+    sketches.flush = real_flush
+    asyncio.run(sketches.flush(db))
+
+    documents = asyncio.run(db.participants.count_documents({}))
+    estimates = asyncio.run(sketches.estimates(db, "participants"))
+    assert estimates["top"]["institution"] == [("MIT", documents)]
+
+
+def test_other_workers_pending_counts_are_not_added_to_a_rebuild():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["sketch_workers"]
+    rebuilding, other = AnalyticsSketches(), AnalyticsSketches()
+    doc = {"email": "ada@example.com", "additional_info": {"Institution": "MIT"}}
+    asyncio.run(db.participants.insert_one(dict(doc)))
+    # Recorded by another worker that has not flushed when the rebuild reads the documents
+    other.record_insert("participants", doc)
+
+    asyncio.run(rebuilding.reconcile(db))
+    asyncio.run(other.flush(db))
+
+    estimates = asyncio.run(rebuilding.estimates(db, "participants"))
+    assert estimates["top"]["institution"] == [("MIT", 1)]
+    assert estimates["distinct"]["institution"] == 1
@@ -0,0 +1,104 @@
+"""
+Template caches: compiled template LRU, active template catalogs and precomputed configs
+"""
+
+import asyncio
+import gzip
+import sys
+from pathlib import Path
+
+import pytest
+from pydantic import BaseModel
+from starlette.requests import Request
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chart_cache import DataVersions
+from template_cache import CompiledTemplate, CompiledTemplateCache, PrecomputedConfig, TemplateCatalog
+
+
+class StoredTemplate(BaseModel):
+    id: str
+    category_id: str
+    is_active: bool = True
+
+
+def compiled(template_id, version=1):
+    key = CompiledTemplateCache.make_key({"id": template_id, "version": version})
+    return key, CompiledTemplate(key, {"id": template_id}, {})
+
+
+def test_compiled_templates_are_evicted_least_recently_used():
+    cache = CompiledTemplateCache(max_entries=2)
+    (welcome, welcome_template), (reminder, reminder_template), (receipt, receipt_template) = (
+        compiled("welcome"), compiled("reminder"), compiled("receipt")
+    )
+    cache.store(welcome, welcome_template)
+    cache.store(reminder, reminder_template)
+    assert cache.get(welcome) is welcome_template
+
+    cache.store(receipt, receipt_template)
+    assert cache.get(reminder) is None
+    assert cache.get(welcome) is welcome_template
+    assert cache.stats == {"hits": 2, "misses": 1}
+
+
+def test_invalidate_drops_every_version_of_a_template():
+    cache = CompiledTemplateCache()
+    for key, template in [compiled("welcome", 1), compiled("welcome", 2), compiled("reminder")]:
+        cache.store(key, template)
+
+    assert cache.invalidate("welcome") == 2
+    assert cache.get(compiled("welcome", 2)[0]) is None
+    assert cache.get(compiled("reminder")[0]) is not None
+
+
+def test_catalog_reloads_only_after_a_version_bump():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["template_catalog"]
+    asyncio.run(db.templates.insert_many([
+        {"id": "welcome", "category_id": "onboarding", "is_active": True},
+        {"id": "retired", "category_id": "onboarding", "is_active": False},
+    ]))
+    catalog = TemplateCatalog("templates", StoredTemplate, ("category_id",), versions=DataVersions(), check_interval=0)
+
+    assert [t.id for t in asyncio.run(catalog.find(db, category_id="onboarding"))] == ["welcome"]
+
+    # Written without a bump: still served from the catalog
+    asyncio.run(db.templates.insert_one({"id": "reminder", "category_id": "onboarding", "is_active": True}))
+    assert len(asyncio.run(catalog.find(db, category_id="onboarding"))) == 1
+
+    asyncio.run(catalog.invalidate(db))
+    assert [t.id for t in asyncio.run(catalog.find(db, category_id="onboarding"))] == ["welcome", "reminder"]
+    assert catalog.stats["reloads"] == 2
+    with pytest.raises(ValueError):
+        asyncio.run(catalog.find(db, name="welcome"))
+
+
+def request(**headers):
+    return Request({"type": "http", "method": "GET", "path": "/",
+                    "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]})
+
+
+def test_precomputed_config_is_built_once_and_revalidated_by_etag():
+    server = pytest.importorskip("server")
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return {"fonts": ["Helvetica"], "presets": {"name": "Zoë"}}
+
+    config = PrecomputedConfig(build)
+    full = asyncio.run(server.precomputed_json_response(request(accept_encoding="gzip"), config))
+    etag = full.headers["etag"]
+    assert gzip.decompress(full.body) == config.body
+    assert full.headers["content-encoding"] == "gzip"
+
+    revalidated = asyncio.run(server.precomputed_json_response(request(if_none_match=etag), config))
+    assert revalidated.status_code == 304 and not revalidated.body
+    assert len(builds) == 1
+
+    config.invalidate()
+    plain = asyncio.run(server.precomputed_json_response(request(), config))
+    assert plain.body == config.body and plain.headers["etag"] == etag
+    assert len(builds) == 2
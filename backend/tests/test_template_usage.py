@@ -0,0 +1,67 @@
+"""
+Template usage rollups and the template analytics built on them
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from template_engine import TemplateEngine
+from template_usage import TemplateUsage
+
+
+def test_template_analytics_reads_daily_rollups():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["template_usage"]
+    asyncio.run(db.advanced_templates.insert_one({"id": "welcome", "name": "Welcome", "rating": 4.5}))
+
+    engine = TemplateEngine(db)
+    engine.usage = usage = TemplateUsage()
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    usage.record("welcome", True, 10.0, "ada", at=yesterday)
+    usage.record("welcome", False, None, "alan", at=yesterday)
+    asyncio.run(usage.flush(db))
+    # Not flushed yet, still included
+    usage.record("welcome", True, 30.0, "ada")
+
+    analytics = asyncio.run(engine.get_template_analytics("welcome"))
+    stats = analytics["usage_statistics"]
+    assert stats["total_uses"] == 3
+    assert stats["unique_users"] == 2
+    assert stats["avg_generation_time"] == 20.0
+    assert [day["uses"] for day in stats["daily"]] == [2, 1]
+    assert analytics["performance_metrics"]["last_used"] == stats["last_used"]
+
+
+def test_flush_merges_into_stored_days():
+    usage = TemplateUsage()
+    usage.record("welcome", True, 5.0, "ada")
+    asyncio.run(usage.flush(None))
+    usage.record("welcome", True, 15.0, "alan")
+    asyncio.run(usage.flush(None))
+
+    summary = asyncio.run(usage.summary(None, "welcome"))
+    assert summary["total_uses"] == 2
+    assert summary["success_rate"] == 1.0
+    assert summary["generation_time_stddev"] == 5.0
+
+
+def test_full_buffer_counts_and_warns_about_dropped_renders(caplog):
+    usage = TemplateUsage(max_pending=1)
+    usage.record("welcome")
+    with caplog.at_level("WARNING", logger="template_usage"):
+        usage.record("certificate")
+        usage.record("badge")
+    assert usage.dropped == 2
+    assert len(caplog.records) == 1
+
+    with caplog.at_level("WARNING", logger="template_usage"):
+        asyncio.run(usage.flush(None))
+    assert "Dropped 2 template renders" in caplog.records[-1].getMessage()
+    usage.record("certificate")
+    assert usage.dropped == 2
@@ -38,6 +38,7 @@ function App() {
 
   // New state for enhanced features
   const [analytics, setAnalytics] = useState(null);
+  const [chartTemplates, setChartTemplates] = useState({});
   const [charts, setCharts] = useState({});
   const [templateCategories, setTemplateCategories] = useState([]);
   const [advancedTemplates, setAdvancedTemplates] = useState([]);
@@ -88,6 +89,24 @@ function App() {
     fetchCertificateTemplates();
   }, []);
 
+  // Live counter deltas keep the dashboard totals current without polling
+  useEffect(() => {
+    const source = new EventSource(`${API}/analytics/live`);
+    source.addEventListener('delta', (event) => {
+      const { deltas } = JSON.parse(event.data);
+      setAnalytics(prev => prev?.summary ? {
+        ...prev,
+        summary: {
+          ...prev.summary,
+          total_sponsors: (prev.summary.total_sponsors || 0) + (deltas.sponsors_added || 0),
+          total_participants: (prev.summary.total_participants || 0) + (deltas.participants_added || 0)
+        }
+      } : prev);
+    });
+    source.addEventListener('resync', () => fetchDashboardData());
+    return () => source.close();
+  }, []);
+
   const fetchDashboardData = async () => {
     try {
       const [analyticsRes, sponsorsRes, participantsRes] = await Promise.all([
@@ -101,11 +120,39 @@ function App() {
       setParticipants(participantsRes.data);
       setSponsorStats(analyticsRes.data.sponsors?.overview || {});
       setCertificateStats(analyticsRes.data.certificates?.overview || {});
+      fetchChartTemplates(analyticsRes.data.sponsors?.charts);
     } catch (error) {
       console.error('Error fetching dashboard data:', error);
     }
   };
 
+  // Charts reference a shared Plotly layout template instead of embedding it
+  const fetchChartTemplates = async (charts) => {
+    const refs = [...new Set(Object.values(charts || {}).map(chart => chart?.layout_ref).filter(Boolean))];
+    const missing = refs.filter(ref => !chartTemplates[ref]);
+    if (missing.length === 0) return;
+    try {
+      const responses = await Promise.all(missing.map(ref => axios.get(`${API}/charts/templates/${ref}`)));
+      setChartTemplates(prev => {
+        const next = { ...prev };
+        missing.forEach((ref, index) => { next[ref] = responses[index].data; });
+        return next;
+      });
+    } catch (error) {
+      console.error('Error fetching chart templates:', error);
+    }
+  };
+
+  const chartFigure = (chartData) => {
+    if (typeof chartData === 'string') return JSON.parse(chartData);
+    const template = chartTemplates[chartData.layout_ref];
+    return {
+      data: chartData.data,
+      layout: template ? { ...chartData.layout, template } : chartData.layout,
+      frames: chartData.frames
+    };
+  };
+
   const fetchTemplateCategories = async () => {
     try {
       const response = await axios.get(`${API}/templates/categories`);
@@ -297,10 +344,9 @@ function App() {
         <div className="charts-grid">
           {analytics.sponsors?.charts && Object.entries(analytics.sponsors.charts).map(([key, chartData]) => (
             <div key={key} className="chart-container">
-              {typeof chartData === 'string' && (
+              {chartData && (
                 <Plot
-                  data={JSON.parse(chartData).data}
-                  layout={JSON.parse(chartData).layout}
+                  {...chartFigure(chartData)}
                   config={{ responsive: true }}
                   style={{ width: '100%', height: '400px' }}
                 />